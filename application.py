@@ -1,24 +1,34 @@
+import argparse
+import glob
+import logging
 import multiprocessing
+import os
+import sys
+import time
 from enum import unique, Enum
+from functools import partial
 
 from pandas import DataFrame
-from tabulate import tabulate
 
-from source.arima.simulator import ArimaSimulator
+from source.common.decomposition import DecompositionStage
 from source.common.io import DatasetLoader, DataWriter
+from source.common.output import ArtifactSink, BatchArtifactSink, configure_logging
+from source.common.registry import ModelRegistry
+from source.common.resampling import TIMEFRAMES, TimeframeCache
+from source.common.results import ResultsStore
+from source.common.runner import ExperimentRunner, ForecastJob, ForecastResult
+from source.common.series import ForexSeries
+from source.common.validation import DEFAULT_REPAIRS, REPAIRS
 from source.common.simulator import Simulator
-from source.garch.base import ModelParams
-from source.garch.simulator import GarchSimulator
-from source.prophet_.simuator import ProphetSimulator
 
 multiprocessing.set_start_method("fork")
 
-garch_arma_parameters = { 
-    "eur_cad": ModelParams(ar=2, ma=1),  
-    "eur_gbp": ModelParams(ar=3, ma=2), 
-    "eur_jpy": ModelParams(ar=1, ma=2), 
-    "eur_usd": ModelParams(ar=1, ma=2)  
-}
+logger = logging.getLogger(__name__)
+
+# per-pair ARMA-GARCH orders, filled from the searched parameter table before any job runs
+garch_arma_parameters = {}
+# per-pair ARIMA orders for the fast/fixed search modes, filled from intermediates/arima_orders[_<timeframe>].json
+arima_orders = {}
 
 
 @unique
@@ -26,63 +36,349 @@ class ForecastModel(Enum):
     ARIMA = 1
     GARCH = 2
     PROPHET = 3
+    ENSEMBLE = 4
+
+
+# investing.com exports saved as input/<pair>_trading_data.csv,
+# e.g. https://uk.investing.com/currencies/eur-usd-historical-data
+DATA_FILE_SUFFIX = "_trading_data.csv"
+
+
+def create_simulator(trading_data: DataFrame = None, currencies: str = None,
+                     model: ForecastModel = ForecastModel.PROPHET, registry: ModelRegistry = None,
+                     holdout: int = None, sink: ArtifactSink = None, arima_search: str = "auto",
+                     ensemble_weighting: str = "equal", timeframe: str = None, arima_workers: int = None) -> Simulator:
+    # backends are imported on first use, so a run only pays for the models it needs
+    if ForecastModel.ENSEMBLE == model:
+        from source.ensemble.simulator import EnsembleSimulator
+        members = [create_simulator(trading_data, currencies, member, registry, holdout, sink, arima_search,
+                                    timeframe=timeframe, arima_workers=arima_workers)
+                   for member in [ForecastModel.ARIMA, ForecastModel.GARCH, ForecastModel.PROPHET]]
+        return EnsembleSimulator(members=members, trading_data=trading_data, currency_pair=currencies,
+                                 weighting=ensemble_weighting, registry=registry, holdout=holdout, sink=sink,
+                                 timeframe=timeframe)
+    elif ForecastModel.PROPHET == model:
+        from source.prophet_.simuator import ProphetSimulator
+        return ProphetSimulator(trading_data=trading_data, currency_pair=currencies, registry=registry,
+                                holdout=holdout, sink=sink, timeframe=timeframe)
+    elif ForecastModel.GARCH == model:
+        from source.garch.simulator import GarchSimulator
+        from source.garch.base import ModelParams
+        # a pair whose parameter search failed runs with the default orders
+        return GarchSimulator(trading_data=trading_data,
+                              currency_pair=currencies,
+                              params=garch_arma_parameters.get(
+                                  currencies, ModelParams()), registry=registry, holdout=holdout, sink=sink,
+                              timeframe=timeframe)
+    from source.arima.simulator import ArimaSimulator
+    return ArimaSimulator(trading_data=trading_data, currency_pair=currencies, registry=registry, holdout=holdout,
+                          sink=sink, order=arima_orders.get(currencies) if arima_search != "auto" else None,
+                          search=arima_search, workers=arima_workers, timeframe=timeframe)
+
+
+def run_forecast(job: ForecastJob, trading_data: ForexSeries, registry: ModelRegistry = None,
+                 batch_artifacts: bool = False, profiler: str = None, arima_search: str = "auto",
+                 ensemble_weighting: str = "equal", timeframe: str = None) -> dict:
+    # batched artifacts travel back with the result and are written once by the parent
+    sink = BatchArtifactSink() if batch_artifacts else None
+    # the runner already keeps every core busy: a window search that missed the parent's runs in-process
+    simulator = create_simulator(trading_data=trading_data, currencies=job.currency_pair, model=job.model,
+                                 registry=registry, holdout=job.holdout, sink=sink, arima_search=arima_search,
+                                 ensemble_weighting=ensemble_weighting, timeframe=timeframe, arima_workers=1)
+    simulator.timings.profiler = profiler
+    output = simulator.run(job.forecast_horizon).to_dict()
+    if sink is not None:
+        output["artifacts"] = sink.frames
+    return output
+
+
+def write_evaluation(result: ForecastResult, sink: BatchArtifactSink = None):
+    job = result.job
+    name = f"{job.currency_pair}__{result.output['model_name'].lower()}__{job.forecast_horizon}__evaluation"
+    if sink is not None:
+        sink.frames.extend(result.output.get("artifacts", []))
+        sink.write(name, DataFrame({"metric": list(result.metrics.keys()), "value": list(result.metrics.values())}))
+        return
+    DataWriter.write(f"output/{name}.txt",
+                     "\n".join([f"{key}\t{value:0.6f}" for key, value in result.metrics.items()]))
+
+
+def performance_report(results: list, load_times: dict = None) -> DataFrame:
+    # one row per job: per-stage seconds, total resident-memory delta and the model counters
+    load_times = load_times if load_times is not None else {}
+    rows = []
+    for result in results:
+        stages = result.timings.get("stages", {})
+        row = {"model": result.job.model.name, "currency_pair": result.job.currency_pair,
+               "forecast_horizon": result.job.forecast_horizon, "status": result.status,
+               "duration": result.duration, "load": load_times.get(result.job.currency_pair)}
+        row.update({stage: values["seconds"] for stage, values in stages.items()})
+        row["memory_delta_mb"] = sum(values["memory_delta"] for values in stages.values()) / 2 ** 20
+        row.update(result.timings.get("counters", {}))
+        rows.append(row)
+    return DataFrame(rows)
 
 
 def forecast_trading_data(file_name: str = None, currencies: str = None, model: ForecastModel = ForecastModel.PROPHET,
                           forecast_horizon: int = 96):
+    from tabulate import tabulate
     try:
-        raw_data = DatasetLoader.load(file_name)
-        trading_data = DataFrame.from_records([item.to_dict() for item in raw_data])
+        trading_data = DatasetLoader.load_frame(file_name)
 
         # run forecast model
-        simulator: Simulator
-        if ForecastModel.PROPHET == model:
-            simulator = ProphetSimulator(trading_data=trading_data, currency_pair=currencies)
-        elif ForecastModel.GARCH == model:
-            simulator = GarchSimulator(trading_data=trading_data,
-                                       currency_pair=currencies,
-                                       params=garch_arma_parameters[
-                                           currencies])
-
-        else:
-            simulator = ArimaSimulator(trading_data=trading_data, currency_pair=currencies)
-
+        simulator = create_simulator(trading_data=trading_data, currencies=currencies, model=model)
         simulator.forecast(forecast_horizon)
 
-        print("forecasts:")
-        print(simulator.forecasts)
+        logger.debug("forecasts:\n%s", simulator.forecasts)
 
         simulator.evaluate_forecast()
         # simulator.plot_source_dataset()
 
-        print("\n\nForecast Evaluation:")
-        print("Regression Metrics: {} Forecasts for {}".format(simulator.model_name, simulator.currency_pair.upper()))
         DataWriter.write(
             f"output/{simulator.currency_pair}__{simulator.model_name.lower()}__{forecast_horizon}__evaluation.txt",
             "\n".join([f"{key}\t{value:0.6f}" for key, value in simulator.metrics.items()]))
-        print(tabulate([[_key, f"{value:0.6f}"] for _key, value in simulator.metrics.items()]))
-    except Exception as e:
-        print(
+        logger.info("Forecast Evaluation:\nRegression Metrics: %s Forecasts for %s\n%s", simulator.model_name,
+                    simulator.currency_pair.upper(),
+                    tabulate([[_key, f"{value:0.6f}"] for _key, value in simulator.metrics.items()]))
+        return simulator.result()
+    except Exception:
+        logger.exception(
             f"Error running forecast for model {model} and currency-pair: {currencies} with forecast-horizon: {forecast_horizon}")
 
 
+def table_file(name: str, timeframe: str = None) -> str:
+    # searched parameters are kept per timeframe: orders found on daily bars do not carry over to hourly ones
+    return f"intermediates/{name}.json" if timeframe is None else f"intermediates/{name}_{timeframe}.json"
+
+
+def decompose_windows(currency_pairs: list, horizons: list, holdout: int = None, timeframe: str = None):
+    # every training window the jobs will decompose, in one batched call before they fork. ARIMA, GARCH and
+    # Prophet jobs on the same pair and window then read it from DecompositionStage.cache
+    windows = {}
+    for currency_pair in currency_pairs:
+        for horizon in horizons:
+            simulator = Simulator(ExperimentRunner.datasets[currency_pair], currency_pair, holdout=holdout,
+                                  sink=ArtifactSink(), timeframe=timeframe)
+            simulator.split_dataset(horizon)
+            if (currency_pair, len(simulator.training_series)) not in windows:
+                windows[(currency_pair, len(simulator.training_series))] = simulator.training_data
+    if not windows:
+        return
+    try:
+        DecompositionStage.decompose_many(windows, simulator.seasonal_period, simulator.decomposition_model)
+    except Exception:
+        # e.g. no period can be inferred from the dates: each job then reports the error itself
+        logger.warning("Decomposing the training windows before the jobs failed", exc_info=True)
+
+
+def search_arima_windows(currency_pairs: list, horizons: list, registry: ModelRegistry = None,
+                         holdout: int = None, timeframe: str = None):
+    # every training window the ARIMA jobs will fit is searched here, before they fork, with the whole machine.
+    # The jobs then find their orders in ArimaOrderSearch.results instead of each running its own pool
+    searched = set()
+    for currency_pair in currency_pairs:
+        for horizon in horizons:
+            simulator = create_simulator(ExperimentRunner.datasets[currency_pair], currency_pair, ForecastModel.ARIMA,
+                                         registry, holdout, ArtifactSink(), "fast", timeframe=timeframe)
+            simulator.split_dataset(horizon)
+            if (currency_pair, len(simulator.training_series)) in searched:
+                continue
+            searched.add((currency_pair, len(simulator.training_series)))
+            training_data = simulator.training_data
+            if registry is not None and os.path.exists(registry.model_file(ModelRegistry.make_key(
+                    simulator.model_name, currency_pair, simulator.hyperparameters(),
+                    ModelRegistry.window_hash(training_data)))):
+                # the fitted pipeline is reused, so the job never searches
+                continue
+            search = simulator.order_search(training_data)
+            search.find_optimal_order()
+            search.log_results()
+
+
+def run_experiments(trading_data_files: dict, models: list, horizons: list, workers: int = None,
+                    timeout: float = None, registry: ModelRegistry = None, holdout: int = None,
+                    batch_artifacts: bool = False, profiler: str = None, load_times: dict = None,
+                    arima_search: str = "auto", window: dict = None, ensemble_weighting: str = "equal",
+                    timeframe: str = None) -> list:
+    # window: start/end dates and/or a tail size, read in chunks instead of loading whole files. Each pair is held
+    # once, as a ForexSeries the forked jobs share; simulators split it into views
+    for currency_pair, data_file in trading_data_files.items():
+        start = time.perf_counter()
+        series = DatasetLoader.load_series(data_file, currency_pair, **(window or {}))
+        if timeframe is not None:
+            # aggregated once here; the jobs' simulators take the resampled series as it is
+            series = ForexSeries.from_frame(TimeframeCache.level(currency_pair, series.to_frame(), timeframe),
+                                            currency_pair, timeframe)
+        ExperimentRunner.load(currency_pair, series)
+        if load_times is not None:
+            load_times[currency_pair] = time.perf_counter() - start
+
+    # the ensemble runs every backend, so it needs their parameter tables too
+    backends = set(models) | ({ForecastModel.ARIMA, ForecastModel.GARCH} if ForecastModel.ENSEMBLE in models else set())
+    # the parameter searches take frames of the bars the jobs fit (the timeframe's level); they are dropped again
+    # before the jobs fork
+    frames = {currency_pair: ExperimentRunner.datasets[currency_pair].to_frame()
+              for currency_pair in trading_data_files.keys()} \
+        if ForecastModel.GARCH in backends or (ForecastModel.ARIMA in backends and arima_search != "auto") else {}
+    if ForecastModel.GARCH in backends:
+        from source.garch.parameter_estimator import estimate_parameter_table
+        garch_arma_parameters.update(estimate_parameter_table(frames, table_file("garch_parameters", timeframe),
+                                                              registry=registry))
+
+    if ForecastModel.ARIMA in backends and arima_search != "auto":
+        # orders are searched once per pair and remembered; later runs start from (fast) or reuse (fixed) them
+        from source.arima.order_search import estimate_order_table
+        m = TIMEFRAMES[timeframe]["arima_m"] if timeframe is not None else 12
+        arima_orders.update(estimate_order_table(frames, table_file("arima_orders", timeframe), m=m))
+    del frames
+    if ForecastModel.ARIMA in backends and arima_search == "fast":
+        search_arima_windows(list(trading_data_files.keys()), horizons, registry, holdout, timeframe)
+
+    decompose_windows(list(trading_data_files.keys()), horizons, holdout, timeframe)
+
+    jobs = [ForecastJob(model=model, currency_pair=currency_pair, forecast_horizon=horizon, holdout=holdout)
+            for model in models for currency_pair in trading_data_files.keys() for horizon in horizons]
+    runner = ExperimentRunner(target=partial(run_forecast, registry=registry, batch_artifacts=batch_artifacts,
+                                             profiler=profiler, arima_search=arima_search,
+                                             ensemble_weighting=ensemble_weighting, timeframe=timeframe),
+                              workers=workers, timeout=timeout)
+    return runner.run(jobs)
+
+
+def find_trading_data_files(data_files: list = None, input_directory: str = "input") -> dict:
+    # PAIR=PATH entries, or paths named <pair>_trading_data.csv; without any, every such file in the input directory
+    if not data_files:
+        data_files = sorted(glob.glob(os.path.join(input_directory, f"*{DATA_FILE_SUFFIX}")))
+    trading_data_files = {}
+    for entry in data_files:
+        currency_pair, separator, data_file = entry.partition("=")
+        if not separator:
+            data_file = entry
+            currency_pair = os.path.basename(entry)
+            currency_pair = currency_pair[:-len(DATA_FILE_SUFFIX)] if currency_pair.endswith(DATA_FILE_SUFFIX) \
+                else os.path.splitext(currency_pair)[0]
+        trading_data_files[currency_pair.lower()] = data_file
+    return trading_data_files
+
+
+def parse_arguments(arguments: list = None):
+    parser = argparse.ArgumentParser(description="Forecast FX closing prices with ARIMA, GARCH and Prophet models.")
+    parser.add_argument("-m", "--model", nargs="+", choices=[model.name.lower() for model in ForecastModel],
+                        default=["prophet", "garch", "arima"], help="models to run (default: all)")
+    parser.add_argument("-p", "--pair", nargs="+", default=None,
+                        help="currency pairs to run, e.g. eur_usd (default: every pair with a data file)")
+    parser.add_argument("-H", "--horizon", nargs="+", type=int, default=[100, 200, 500],
+                        help="forecast horizons in bars (trading days for daily data)")
+    parser.add_argument("-f", "--data-file", nargs="+", default=None,
+                        help=f"PAIR=PATH, or PATH named <pair>{DATA_FILE_SUFFIX}")
+    parser.add_argument("--input-directory", default="input",
+                        help=f"where to look for *{DATA_FILE_SUFFIX} when no data file is given")
+    parser.add_argument("--holdout", type=int, default=None,
+                        help="rows held back from training; e.g. 500 shares one fit across all horizons")
+    parser.add_argument("--start", default=None, help="first date to load, e.g. 2015-01-01")
+    parser.add_argument("--end", default=None, help="last date to load (inclusive)")
+    parser.add_argument("--tail", type=int, default=None, help="load only the last TAIL bars of the window")
+    parser.add_argument("--arima-search", choices=["auto", "fast", "fixed"], default="auto",
+                        help="auto: AutoARIMA stepwise; fast: cached tests and a parallel search from the remembered "
+                             "order; fixed: the remembered order without a search")
+    parser.add_argument("--repair", nargs="*", choices=REPAIRS, default=DEFAULT_REPAIRS,
+                        help="data-quality repairs applied before fitting (none: report only); "
+                             "fill adds flat bars on missing business days")
+    parser.add_argument("--spike-threshold", type=float, default=10.0,
+                        help="robust z-score of a log return above which a bar is clipped as a spike")
+    parser.add_argument("--no-validation", action="store_true", help="skip the data-quality stage")
+    parser.add_argument("--timeframe", choices=list(TIMEFRAMES), default=None,
+                        help="resample the loaded bars (e.g. minute or daily files) to this resolution; "
+                             "the seasonal period and ARIMA m follow it")
+    parser.add_argument("--ensemble-weighting", choices=["equal", "inverse_error", "stacked"], default="equal",
+                        help="how the ensemble model combines ARIMA, GARCH and Prophet forecasts")
+    parser.add_argument("--results-store", default="intermediates/results.sqlite",
+                        help="SQLite file every run's metrics, forecasts and timings are appended to ('' disables)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=None, help="seconds per job")
+    parser.add_argument("--quiet", action="store_true",
+                        help="warnings only, and all artifacts of the run in one file instead of per-job CSVs")
+    parser.add_argument("--profile", action="store_true", help="cProfile every job and log the top functions")
+    parser.add_argument("--list", action="store_true", help="print the resolved configuration and exit")
+    options = parser.parse_args(arguments)
+
+    options.trading_data_files = find_trading_data_files(options.data_file, options.input_directory)
+    if options.pair is not None:
+        missing = [pair for pair in options.pair if pair.lower() not in options.trading_data_files]
+        if missing:
+            parser.error(f"no data file for currency pair(s): {', '.join(missing)}")
+        options.trading_data_files = {pair.lower(): options.trading_data_files[pair.lower()] for pair in options.pair}
+    if not options.trading_data_files:
+        parser.error(f"no *{DATA_FILE_SUFFIX} files found in {options.input_directory}")
+    options.models = [ForecastModel[model.upper()] for model in options.model]
+    return options
+
+
+def main(arguments: list = None) -> int:
+    options = parse_arguments(arguments)
+    from tabulate import tabulate
+
+    if options.list:
+        print(tabulate([[currency_pair, data_file] for currency_pair, data_file in options.trading_data_files.items()],
+                       headers=["currency-pair", "data file"]))
+        print(f"\nmodels: {', '.join(model.name for model in options.models)}; "
+              f"horizons: {', '.join(map(str, options.horizon))}")
+        return 0
+
+    configure_logging(logging.WARNING if options.quiet else logging.INFO)
+    sink = BatchArtifactSink("output") if options.quiet else None
+
+    # parsed datasets are reused across jobs and runs until the source file changes
+    DatasetLoader.configure_cache("intermediates/datasets")
+    # windows of large files are located through a byte-offset index instead of a full scan
+    DatasetLoader.configure_reader(index_directory="intermediates/indexes")
+    if not options.no_validation:
+        # validated frames are cached by file fingerprint and repair settings
+        DatasetLoader.configure_validation(options.repair, options.spike_threshold, "intermediates/validated")
+
+    # fitted models are reused across runs
+    registry = ModelRegistry("intermediates/models")
+    profiler = "cprofile" if options.profile else None
+    load_times = {}
+    results = run_experiments(options.trading_data_files, options.models, options.horizon, workers=options.workers,
+                              timeout=options.timeout, registry=registry, holdout=options.holdout,
+                              batch_artifacts=sink is not None, profiler=profiler, load_times=load_times,
+                              arima_search=options.arima_search,
+                              window={"start": options.start, "end": options.end, "tail": options.tail},
+                              ensemble_weighting=options.ensemble_weighting, timeframe=options.timeframe)
+    for result in results:
+        if result.succeeded:
+            write_evaluation(result, sink)
+        else:
+            logger.error("Error running forecast for %s:\n%s", result.job, result.error)
+    if sink is not None:
+        sink.flush()
+    if options.results_store:
+        # one transaction for the whole run, written by the parent once every worker has reported
+        store = ResultsStore(options.results_store)
+        run_id = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        store.add_run(run_id, {key: value for key, value in vars(options).items() if key != "trading_data_files"})
+        store.insert(run_id, results)
+        store.close()
+        logger.info("Results of run %s stored in %s", run_id, options.results_store)
+
+    if DatasetLoader.validation is not None and DatasetLoader.validation.reports:
+        quality = DatasetLoader.validation.report_frame()
+        quality.to_csv("output/data_quality_report.csv", index=False)
+        logger.info("Data quality report:\n%s", tabulate(quality.T, showindex=True))
+
+    report = performance_report(results, load_times)
+    report.to_csv("output/performance_report.csv", index=False)
+    logger.info("Performance report:\n%s", tabulate(report, headers="keys", showindex=False, floatfmt="0.3f"))
+    for result in results:
+        if result.timings.get("profile"):
+            logger.info("Profile of %s:\n%s", result.job, result.timings["profile"])
+
+    print(tabulate([[result.job.model.name, result.job.currency_pair, result.job.forecast_horizon, result.status,
+                     f"{result.duration:0.1f}s"] for result in results],
+                   headers=["model", "currency-pair", "horizon", "status", "duration"]))
+    return 0 if all(result.succeeded for result in results) else 1
+
+
 if __name__ == "__main__":
-    # load raw input
-    # https://uk.investing.com/currencies/eur-usd-historical-data
-    trading_data_files = {
-        "eur_cad": "input/eur_cad_trading_data.csv",
-        "eur_gbp": "input/eur_gbp_trading_data.csv",
-        "eur_jpy": "input/eur_jpy_trading_data.csv"
-        "eur_usd": "input/eur_usd_trading_data.csv"
-    }
-
-    models = [ForecastModel.PROPHET, ForecastModel.GARCH, ForecastModel.ARIMA]
-
-    for model in models:
-        for key in trading_data_files.keys():
-            for time_horizon in [100, 200, 500]:
-                # load input frames
-                data_file = trading_data_files[key]
-                currency_pair = key
-                forecast_trading_data(file_name=data_file, currencies=currency_pair, model=model,
-                                      forecast_horizon=time_horizon)
+    sys.exit(main())
@@ -1,32 +1,22 @@
+import logging
 import multiprocessing
 from enum import unique, Enum
 
-from pandas import DataFrame
 from tabulate import tabulate
 
 from source.arima.simulator import ArimaSimulator
 from source.common.io import DatasetLoader, DataWriter
+from source.common.output import configure_logging
 from source.common.simulator import Simulator
-from source.garch.base import ModelParams
+from source.garch.parameter_estimator import estimate_parameter_table
 from source.garch.simulator import GarchSimulator
 from source.prophet_.simuator import ProphetSimulator
 
 multiprocessing.set_start_method("fork")
 
 
-# garch_arma_parameters = {
-#     "eur_cad": ModelParams(ar=5, ma=8),
-#     "eur_gbp": ModelParams(ar=6, ma=4),
-#     "eur_jpy": ModelParams(ar=1, ma=6),
-#     "eur_usd": ModelParams(ar=5, ma=6)
-# }
-
-garch_arma_parameters = {  # ARIMA(p, d, q)(P, D, Q)
-    "eur_cad": ModelParams(ar=2, ma=1),  # ARIMA(0,1,0)(2,1,0)[12]
-    "eur_gbp": ModelParams(ar=3, ma=2),  # ARIMA(0,1,0)(0,1,2)[12]
-    "eur_jpy": ModelParams(ar=1, ma=2),  # ARIMA(0,1,0)(0,1,1)[12]
-    "eur_usd": ModelParams(ar=1, ma=2)  # ARIMA(0,1,1)(0,1,2)[12]
-}
+# per-pair ARMA-GARCH orders, searched once per pair and kept in intermediates/garch_parameters.json
+garch_arma_parameters = {}
 
 
 @unique
@@ -38,8 +28,7 @@ class ForecastModel(Enum):
 
 def forecast_trading_data(file_name: str = None, currencies: str = None,
                           model: ForecastModel = ForecastModel.PROPHET):
-    raw_data = DatasetLoader.load(file_name)
-    trading_data = DataFrame.from_records([item.to_dict() for item in raw_data])
+    trading_data = DatasetLoader.load_frame(file_name)
     forecast_horizon = 96
 
     # run forecast model
@@ -70,6 +59,11 @@ def forecast_trading_data(file_name: str = None, currencies: str = None,
 
 
 if __name__ == "__main__":
+    configure_logging(logging.INFO)
+
+    # parsed datasets are reused across jobs and runs until the source file changes
+    DatasetLoader.configure_cache("intermediates/datasets")
+
     # load raw input
     # https://uk.investing.com/currencies/eur-usd-historical-data
     trading_data_files = {"eur_cad": "input/eur_cad_trading_data.csv",
@@ -82,6 +76,10 @@ if __name__ == "__main__":
     # models = [ForecastModel.PROPHET, ForecastModel.GARCH, ForecastModel.ARIMA]
     models = [ForecastModel.GARCH]
 
+    if ForecastModel.GARCH in models:
+        garch_arma_parameters.update(estimate_parameter_table(
+            {key: DatasetLoader.load_frame(data_file) for key, data_file in trading_data_files.items()}))
+
     for model in models:
         for key in trading_data_files.keys():
             # load input frames
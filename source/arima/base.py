@@ -0,0 +1,43 @@
+class ArimaOrder:
+    def __init__(self, p: int = 1, d: int = 1, q: int = 1, P: int = 0, D: int = 1, Q: int = 0, m: int = 12):
+        self.p = p
+        self.d = d
+        self.q = q
+        self.P = P
+        self.D = D
+        self.Q = Q
+        self.m = m
+
+    @property
+    def order(self) -> tuple:
+        return self.p, self.d, self.q
+
+    @property
+    def seasonal_order(self) -> tuple:
+        # pmdarima's spelling of "no seasonal part"
+        return (self.P, self.D, self.Q, self.m) if self.m > 1 else (0, 0, 0, 0)
+
+    def to_dict(self):
+        return {
+            "p": self.p,
+            "d": self.d,
+            "q": self.q,
+            "P": self.P,
+            "D": self.D,
+            "Q": self.Q,
+            "m": self.m
+        }
+
+    @staticmethod
+    def from_dict(values: dict):
+        return ArimaOrder(p=values["p"], d=values["d"], q=values["q"], P=values["P"], D=values["D"], Q=values["Q"],
+                          m=values["m"])
+
+    def __eq__(self, other):
+        return isinstance(other, ArimaOrder) and self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash(self.order + self.seasonal_order)
+
+    def __repr__(self):
+        return f"ARIMA{self.order}{self.seasonal_order[:3]}[{self.m}]"
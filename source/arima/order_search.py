@@ -0,0 +1,179 @@
+import json
+import logging
+import multiprocessing
+import os
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+
+from pandas import DataFrame
+
+from source.arima.base import ArimaOrder
+from source.common.registry import ModelRegistry
+
+INFORMATION_CRITERIA = ["aic", "bic"]
+
+logger = logging.getLogger(__name__)
+
+
+class ArimaPreprocessing:
+    # (window hash, lmbda2, m, d, D, max_d, max_D) -> Box-Cox series and differencing orders of one training window
+    cache = OrderedDict()
+    max_entries = 64
+
+    @staticmethod
+    def prepare(training_data: DataFrame, lmbda2: float = 1e-6, m: int = 12, d: int = None, D: int = None,
+                max_d: int = 2, max_D: int = 1) -> dict:
+        key = (ModelRegistry.window_hash(training_data), lmbda2, m, d, D, max_d, max_D)
+        if key in ArimaPreprocessing.cache:
+            ArimaPreprocessing.cache.move_to_end(key)
+            return ArimaPreprocessing.cache[key]
+
+        from pmdarima.arima import ndiffs, nsdiffs
+        from pmdarima.preprocessing import BoxCoxEndogTransformer
+        from pmdarima.utils import diff
+
+        transformer = BoxCoxEndogTransformer(lmbda2=lmbda2)
+        y, _ = transformer.fit_transform(training_data["close"].to_numpy())
+
+        # the tests AutoARIMA runs, in its order: seasonal, then non-seasonal on the seasonally differenced series
+        if D is None:
+            D = int(nsdiffs(y, m=m, max_D=max_D, test="ocsb")) if m > 1 else 0
+        seasonal_y = diff(y, lag=m, differences=D) if D > 0 else y
+        if d is None:
+            d = int(ndiffs(seasonal_y, test="kpss", max_d=max_d))
+
+        prepared = {"y": y, "lambda": float(transformer.lam1_), "d": d, "D": D}
+        ArimaPreprocessing.cache[key] = prepared
+        while len(ArimaPreprocessing.cache) > ArimaPreprocessing.max_entries:
+            ArimaPreprocessing.cache.popitem(last=False)
+        return prepared
+
+
+class ArimaOrderSearch:
+    # transformed series are registered before the pool forks, so workers read them copy-on-write
+    datasets = {}
+    # (currency pair, window hash, search settings) -> (best order, candidates fitted), so horizons sharing a window
+    # search once. Filled in the parent before the jobs fork (application.search_arima_windows); a forked job's own
+    # additions die with it
+    results = {}
+
+    def __init__(self, trading_data: DataFrame = None, currency_pair: str = None, criterion: str = "aic",
+                 max_p: int = 3, max_q: int = 3, max_P: int = 1, max_Q: int = 1, d: int = None, D: int = None,
+                 m: int = 12, seasonal: bool = True, lmbda2: float = 1e-6, holdout: int = 0,
+                 start: ArimaOrder = None, workers: int = None):
+        if criterion not in INFORMATION_CRITERIA:
+            raise ValueError(f"Unknown information criterion: {criterion}")
+        self.currency_pair = currency_pair
+        self.criterion = criterion
+        self.max_p = max_p
+        self.max_q = max_q
+        self.max_P = max_P if seasonal else 0
+        self.max_Q = max_Q if seasonal else 0
+        self.d = d
+        self.D = D if seasonal else 0
+        self.m = m if seasonal else 1
+        self.lmbda2 = lmbda2
+        # a remembered order narrows the search to its neighbours
+        self.start = start
+        # a search inside a forked job should pass workers=1: the runner already uses every core
+        self.workers = workers or os.cpu_count() or 1
+        self.training_data = trading_data.head(len(trading_data) - holdout) if holdout else trading_data
+        self.analysis_results = []
+        # candidates the search of this window fitted, also when its order came from `results`
+        self.models_tried = 0
+        self.memo_hit = False
+
+    def candidates(self, d: int, D: int) -> list:
+        if self.start is None:
+            ranges = [range(self.max_p + 1), range(self.max_q + 1), range(self.max_P + 1), range(self.max_Q + 1)]
+        else:
+            start = [self.start.p, self.start.q, self.start.P, self.start.Q]
+            limits = [self.max_p, self.max_q, self.max_P, self.max_Q]
+            ranges = [range(max(0, value - 1), min(limit, value + 1) + 1) for value, limit in zip(start, limits)]
+        return [ArimaOrder(p=p, d=d, q=q, P=P, D=D, Q=Q, m=self.m) for p, q, P, Q in product(*ranges)]
+
+    @staticmethod
+    def simulate(currency_pair: str, order: ArimaOrder) -> dict:
+        y = ArimaOrderSearch.datasets[currency_pair]
+        try:
+            import pmdarima as pm
+            model = pm.ARIMA(order=order.order, seasonal_order=order.seasonal_order, suppress_warnings=True)
+            model.fit(y)
+            return {"order": order, "aic": float(model.aic()), "bic": float(model.bic()), "error": None}
+        except Exception:
+            return {"order": order, "error": traceback.format_exc()}
+
+    def search_key(self) -> tuple:
+        return (self.currency_pair, ModelRegistry.window_hash(self.training_data), self.criterion, self.max_p,
+                self.max_q, self.max_P, self.max_Q, self.d, self.D, self.m, self.lmbda2, self.start)
+
+    def find_optimal_order(self) -> ArimaOrder:
+        key = self.search_key()
+        if key in ArimaOrderSearch.results:
+            self.memo_hit = True
+            best, self.models_tried = ArimaOrderSearch.results[key]
+            return best
+
+        prepared = ArimaPreprocessing.prepare(self.training_data, self.lmbda2, self.m, self.d, self.D)
+        ArimaOrderSearch.datasets[self.currency_pair] = prepared["y"]
+        candidates = self.candidates(prepared["d"], prepared["D"])
+        if self.workers <= 1:
+            self.analysis_results.extend(ArimaOrderSearch.simulate(self.currency_pair, order) for order in candidates)
+        else:
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(candidates)), mp_context=context) as executor:
+                futures = [executor.submit(ArimaOrderSearch.simulate, self.currency_pair, order)
+                           for order in candidates]
+                for future in as_completed(futures):
+                    self.analysis_results.append(future.result())
+
+        fitted = [result for result in self.analysis_results if result["error"] is None]
+        if not fitted:
+            raise ValueError(f"No ARIMA candidate could be fitted for currency-pair: {self.currency_pair}")
+        best = min(fitted, key=lambda item: item[self.criterion])["order"]
+        self.models_tried = len(self.analysis_results)
+        ArimaOrderSearch.results[key] = (best, self.models_tried)
+        return best
+
+    def log_results(self):
+        sorted_results = sorted([result for result in self.analysis_results if result["error"] is None],
+                                key=lambda item: item[self.criterion])
+        if not sorted_results:
+            return
+        best = sorted_results[0]
+        logger.info("ARIMA order for %s (%s): %s, aic=%0.2f, bic=%0.2f", self.currency_pair, self.criterion,
+                    best["order"], best["aic"], best["bic"])
+        logger.debug("ARIMA candidates by %s:\n%s", self.criterion, "\n".join(
+            [f"{result['order']}: aic={result['aic']:0.2f}, bic={result['bic']:0.2f}" for result in sorted_results]))
+
+
+def load_order_table(table_file: str) -> dict:
+    if not os.path.exists(table_file):
+        return {}
+    with open(table_file) as file:
+        return {pair: ArimaOrder.from_dict(values) for pair, values in json.load(file).items()}
+
+
+def save_order_table(table_file: str, table: dict):
+    directory = os.path.dirname(table_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(table_file, "w") as file:
+        json.dump({pair: order.to_dict() for pair, order in table.items()}, file, indent=2)
+
+
+def estimate_order_table(trading_data: dict, table_file: str = "intermediates/arima_orders.json",
+                         holdout: int = 100, **search_options) -> dict:
+    # searches only the pairs the saved table does not cover yet, e.g. {"eur_usd": ARIMA(1, 1, 1)(0, 1, 1)[12]}
+    table = load_order_table(table_file)
+    for currency_pair, data_frame in trading_data.items():
+        if currency_pair in table:
+            continue
+        search = ArimaOrderSearch(trading_data=data_frame, currency_pair=currency_pair, holdout=holdout,
+                                  **search_options)
+        table[currency_pair] = search.find_optimal_order()
+        search.log_results()
+        save_order_table(table_file, table)
+    return table
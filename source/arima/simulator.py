@@ -1,57 +1,151 @@
-import pickle
+import io
+import logging
+from contextlib import redirect_stdout
 
+import numpy as np
 import pmdarima as pm
+from numpy.polynomial import polynomial as P
 from pandas import DataFrame
 from pmdarima.pipeline import Pipeline
 from pmdarima.preprocessing import BoxCoxEndogTransformer
 
+from source.arima.base import ArimaOrder
+from source.arima.order_search import ArimaOrderSearch
+from source.common.output import ArtifactSink
+from source.common.registry import ModelRegistry
+from source.common.resampling import TIMEFRAMES
+from source.common.scenarios import ScenarioModel
 from source.common.simulator import Simulator
 
+# auto: AutoARIMA stepwise search; fast: cached preprocessing and a parallel grid search; fixed: the given order
+SEARCH_MODES = ["auto", "fast", "fixed"]
+
+logger = logging.getLogger(__name__)
+
 
 class ArimaSimulator(Simulator):
-    def __init__(self, trading_data: DataFrame = None, currency_pair: str = None):
-        super().__init__(trading_data, currency_pair, "ARIMA")
+    update_strategy = "update"
 
-    def forecast(self, forecast_horizon: int = 96):
-        super().forecast(forecast_horizon)
+    def __init__(self, trading_data: DataFrame = None, currency_pair: str = None, registry: ModelRegistry = None,
+                 holdout: int = None, sink: ArtifactSink = None, order: ArimaOrder = None, search: str = "auto",
+                 workers: int = None, timeframe: str = None):
+        super().__init__(trading_data, currency_pair, "ARIMA", registry, holdout, sink, timeframe)
+        if search not in SEARCH_MODES:
+            raise ValueError(f"Unknown ARIMA search mode: {search}")
+        if search == "fixed" and order is None:
+            raise ValueError("ARIMA search mode 'fixed' needs an order")
+        # a remembered order: the starting point of auto/fast searches, or the model itself when fixed
+        self.order = order
+        self.search = search
+        self.workers = workers
+
+    def hyperparameters(self) -> dict:
+        start = self.order if self.order is not None and self.search == "auto" else ArimaOrder(p=1, q=1)
+        params = {"lmbda2": 1e-6, "start_p": start.p, "start_q": start.q, "max_p": 3, "max_q": 3, "d": 1, "D": 1,
+                  "start_P": start.P, "stepwise": True, "seasonal": True,
+                  "m": TIMEFRAMES[self.timeframe]["arima_m"] if self.timeframe is not None else 12}
+        if self.search != "auto":
+            params.update({"search": self.search, "order": None if self.order is None else self.order.to_dict()})
+        if self.search == "fast":
+            # differencing orders come from the (cached) seasonal and unit-root tests
+            params.update({"d": None, "D": None})
+        return params
+
+    def fit_model(self, training_data: DataFrame):
+        params = self.hyperparameters()
+        if self.search == "auto":
+            return self.fit_auto(training_data, params)
+
+        order = self.order
+        if self.search == "fast":
+            search = self.order_search(training_data)
+            order = search.find_optimal_order()
+            self.timings.count("arima_models_tried", search.models_tried)
+            self.timings.record("arima_order_memo_hit", search.memo_hit)
+        pipeline = Pipeline([
+            ('boxcox', BoxCoxEndogTransformer(lmbda2=params["lmbda2"])),
+            ('arima', pm.ARIMA(order=order.order, seasonal_order=order.seasonal_order, suppress_warnings=True))
+        ])
+        pipeline.fit(training_data['close'])
+        return pipeline
 
-        print("Running ARIMA forecast for Currency-pair: {} using forecast horizon: {}", self.currency_pair.upper(),
-              forecast_horizon)
-        print("Dataset: ", self.currency_pair.upper())
-        print(self.training_data.head(5))
-        print(".....\t.........\t...")
-        print(self.training_data.tail(5))
+    def order_search(self, training_data: DataFrame, workers: int = None) -> ArimaOrderSearch:
+        # the "fast" search of one training window; the same settings in the parent and in a job give the same
+        # ArimaOrderSearch.results key
+        params = self.hyperparameters()
+        return ArimaOrderSearch(training_data, self.currency_pair, max_p=params["max_p"], max_q=params["max_q"],
+                                d=params["d"], D=params["D"], m=params["m"], seasonal=params["seasonal"],
+                                lmbda2=params["lmbda2"], start=self.order, workers=workers or self.workers)
 
+    def fit_auto(self, training_data: DataFrame, params: dict):
         # define and fit the pipeline/model
         pipeline = Pipeline([
-            ('boxcox', BoxCoxEndogTransformer(lmbda2=1e-6)),
-            ('arima', pm.AutoARIMA(start_p=1, start_q=1, max_p=3, max_q=3, d=1, D=1, start_P=0, error_action='ignore',
-                                   suppress_warnings=True, stepwise=True, seasonal=True, m=12, trace=True))
+            ('boxcox', BoxCoxEndogTransformer(lmbda2=params["lmbda2"])),
+            ('arima', pm.AutoARIMA(start_p=params["start_p"], start_q=params["start_q"], max_p=params["max_p"],
+                                   max_q=params["max_q"], d=params["d"], D=params["D"], start_P=params["start_P"],
+                                   error_action='ignore', suppress_warnings=True, stepwise=params["stepwise"],
+                                   seasonal=params["seasonal"], m=params["m"], trace=True))
         ])
-        pipeline.fit(self.training_data['close'])
+        # the stepwise trace prints one line per candidate model; it is counted, and logged in debug mode
+        trace = io.StringIO()
+        with redirect_stdout(trace):
+            pipeline.fit(training_data['close'])
+        self.timings.count("arima_models_tried", sum(": AIC=" in line for line in trace.getvalue().splitlines()))
+        logger.debug("%s", trace.getvalue())
         # model = pm.auto_arima(self.training_data["close"], seasonal=True, m=12)
+        return pipeline
 
-        # serialize model
-        model_file = f"intermediates/arima_{self.currency_pair}.pkl"
-        with open(model_file, "wb") as file:
-            pickle.dump(pipeline, file)
+    def update_model(self, model, training_data: DataFrame, new_data: DataFrame):
+        # keeps the selected order and only takes a few optimizer steps on the new bars
+        model.update(new_data['close'])
+        return model
 
-        # load model and make predictions seamlessly
-        with open(model_file, "rb") as file:
-            model = pickle.load(file)
+    def model_counters(self, model) -> dict:
+        # AutoARIMA wraps the chosen model; a fixed-order step is the model itself
+        arima = getattr(model.steps[-1][1], "model_", model.steps[-1][1])
+        return {"arima_order": list(arima.order), "arima_seasonal_order": list(arima.seasonal_order)}
 
-        # make the forecasts
+    def scenario_model(self, model) -> ScenarioModel:
+        # the SARIMA lag polynomials times the differencing operators give one AR recursion on the Box-Cox series
+        boxcox, step = model.steps[0][1], model.steps[-1][1]
+        arima = getattr(step, "model_", step)
+        results = arima.arima_res_
+        order, seasonal_order = arima.order, arima.seasonal_order
+        ar = P.polymul(results.polynomial_ar, results.polynomial_seasonal_ar)
+        ar = P.polymul(ar, P.polypow([1, -1], order[1]))
+        if seasonal_order[3] > 1:
+            ar = P.polymul(ar, P.polypow(np.r_[1, np.zeros(seasonal_order[3] - 1), -1], seasonal_order[1]))
+        ma = P.polymul(results.polynomial_ma, results.polynomial_seasonal_ma)
+        params = dict(zip(results.model.param_names, np.asarray(results.params)))
+        return ScenarioModel(params.get("intercept", 0.0), -ar[1:], ma[1:], params["sigma2"],
+                             y=results.model.endog[:, 0], residuals=results.resid,
+                             boxcox_lambda=float(boxcox.lam1_), boxcox_shift=boxcox.lmbda2)
+
+    def interval_label(self) -> str:
+        # pmdarima's predict default, alpha=0.05
+        return "95% confidence interval"
+
+    def predict_model(self, model, forecast_horizon: int) -> DataFrame:
         predictions = model.predict(n_periods=forecast_horizon, return_conf_int=True)
-        print("ARIMA forecast ... complete")
-        collated_results = DataFrame.from_records(
+        return DataFrame.from_records(
             [{"forecast": value, "error": abs(bounds[0] - bounds[1]) / 2, "forecast_lower": bounds[0],
               "forecast_upper": bounds[1]} for value, bounds in zip(predictions[0], predictions[1])])
 
-        self.forecasts = collated_results["forecast"]
-        self.errors = collated_results["error"]
-        self.forecasts_lower = collated_results["forecast_lower"]
-        self.forecasts_upper = collated_results["forecast_upper"]
-        self.forecasts_raw = collated_results
+    def forecast(self, forecast_horizon: int = 96):
+        super().forecast(forecast_horizon)
+
+        logger.info("Running ARIMA forecast for Currency-pair: %s using forecast horizon: %s",
+                    self.currency_pair.upper(), forecast_horizon)
+        logger.debug("Dataset: %s\n%s\n.....\t.........\t...\n%s", self.currency_pair.upper(),
+                     self.training_data.head(5), self.training_data.tail(5))
+
+        # fitted pipelines are reused from the registry when the training window was seen before
+        model = self.fit(self.training_data)
+
+        # make the forecasts
+        collated_results = self.predict(model, forecast_horizon)
+        logger.info("ARIMA forecast ... complete")
+        self.collate(collated_results)
 
-        collated_results.to_csv(f"output/{self.currency_pair}__{self.model_name.lower()}__{forecast_horizon}__forecasts.csv")
-        print(collated_results)
+        self.write_artifact("forecasts", collated_results, forecast_horizon)
+        logger.debug("%s", collated_results)
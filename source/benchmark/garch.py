@@ -0,0 +1,57 @@
+import glob
+import os
+import time
+
+import numpy as np
+from armagarch import ARMA, empModel, normalDist, garch
+from tabulate import tabulate
+
+from source.common.io import DataReader
+from source.garch.base import ModelParams
+from source.garch.engine import GarchEngine
+
+INPUT_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(__file__)), "input")
+
+
+def fit_armagarch(closing_prices, params: ModelParams):
+    model = empModel(closing_prices, ARMA(order={'AR': params.AR, 'MA': params.MA}),
+                     garch(order={'p': params.p, 'q': params.q}), normalDist())
+    model.fit(printTable=False)
+    return model
+
+
+def benchmark_garch(params: ModelParams = ModelParams(ar=1, ma=0), data_files: list = None, nsteps: int = 100):
+    if data_files is None:
+        data_files = sorted(glob.glob(os.path.join(INPUT_DIRECTORY, "*.csv")))
+    series = {os.path.basename(data_file).split("_trading")[0]: DataReader.read_columns(data_file)["close"].to_frame()
+              for data_file in data_files}
+    engine = GarchEngine(params)
+
+    rows = []
+    for pair, closing_prices in series.items():
+        start = time.perf_counter()
+        reference = fit_armagarch(closing_prices, params)
+        reference_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fit = engine.fit([closing_prices])[0]
+        engine_time = time.perf_counter() - start
+
+        reference_mean, reference_variance = reference.predict(nsteps=nsteps)
+        mean, variance = fit.predict(nsteps)
+        rows.append([pair, f"{reference_time:0.2f}", f"{engine_time:0.2f}", f"{-reference._finalLL:0.2f}",
+                     f"{fit.log_likelihood:0.2f}", f"{np.max(np.abs(reference_mean - mean)):0.2e}",
+                     f"{np.max(np.abs(reference_variance - variance)):0.2e}"])
+
+    # every window in one stacked fit
+    start = time.perf_counter()
+    engine.fit(list(series.values()))
+    batched_time = time.perf_counter() - start
+    return rows, batched_time
+
+
+if __name__ == "__main__":
+    rows, batched_time = benchmark_garch()
+    print(tabulate(rows, headers=["pair", "armagarch (s)", "engine (s)", "armagarch loglik", "engine loglik",
+                                  "max |mean diff|", "max |variance diff|"]))
+    print(f"\nengine, all {len(rows)} pairs in one batch: {batched_time:0.2f}s")
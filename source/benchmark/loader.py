@@ -0,0 +1,52 @@
+import glob
+import os
+import time
+
+from pandas import DataFrame
+from tabulate import tabulate
+
+from source.common.io import DataReader
+
+INPUT_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(__file__)), "input")
+
+
+def load_records(data_file: str) -> DataFrame:
+    # the original path: one ForexData object per row, then back to dicts
+    raw_data = DataReader.read_file(data_file)
+    return DataFrame.from_records([item.to_dict() for item in raw_data])
+
+
+def load_columns(data_file: str) -> DataFrame:
+    return DataReader.read_columns(data_file)
+
+
+def time_loader(loader, data_file: str, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        loader(data_file)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_loaders(data_files: list = None, repeat: int = 5):
+    if data_files is None:
+        data_files = sorted(glob.glob(os.path.join(INPUT_DIRECTORY, "*.csv")))
+
+    results = []
+    for data_file in data_files:
+        records = time_loader(load_records, data_file, repeat)
+        columns = time_loader(load_columns, data_file, repeat)
+        results.append({
+            "file": os.path.basename(data_file),
+            "records_ms": records * 1000,
+            "columns_ms": columns * 1000,
+            "speedup": records / columns
+        })
+    return results
+
+
+if __name__ == "__main__":
+    print(tabulate([[item["file"], f"{item['records_ms']:0.3f}", f"{item['columns_ms']:0.3f}",
+                     f"{item['speedup']:0.1f}x"] for item in benchmark_loaders()],
+                   headers=["file", "ForexData rows (ms)", "columnar (ms)", "speedup"]))
@@ -0,0 +1,49 @@
+import glob
+import logging
+import os
+import tempfile
+import time
+
+from tabulate import tabulate
+
+from source.common.io import DataReader
+from source.common.output import BatchArtifactSink, CsvArtifactSink, configure_logging
+from source.common.simulator import Simulator
+
+INPUT_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(__file__)), "input")
+
+
+def run_grid(trading_data: dict, horizons: list, sink_factory, level: int) -> float:
+    # the base Simulator stage is where the previews, describe()/info() and CSV writes live
+    with open(os.devnull, "w") as devnull:
+        configure_logging(level, stream=devnull)
+        start = time.perf_counter()
+        sink = sink_factory()
+        for currency_pair, frame in trading_data.items():
+            for horizon in horizons:
+                simulator = Simulator(frame, currency_pair, "Benchmark", sink=sink)
+                simulator.forecast(horizon)
+                forecasts = simulator.validation_data[["close"]].rename(columns={"close": "forecast"})
+                simulator.write_artifact("forecasts", forecasts, horizon)
+        sink.flush()
+        return time.perf_counter() - start
+
+
+def benchmark_output(horizons: list = None, data_files: list = None):
+    horizons = horizons or [100, 200, 500]
+    data_files = data_files or sorted(glob.glob(os.path.join(INPUT_DIRECTORY, "*.csv")))
+    trading_data = {os.path.basename(data_file).split("_trading")[0]: DataReader.read_columns(data_file)
+                    for data_file in data_files}
+
+    with tempfile.TemporaryDirectory() as directory:
+        verbose = run_grid(trading_data, horizons, lambda: CsvArtifactSink(directory), logging.DEBUG)
+        quiet = run_grid(trading_data, horizons, lambda: BatchArtifactSink(directory), logging.WARNING)
+    configure_logging(logging.INFO)
+    return [{"mode": "verbose: DEBUG diagnostics + per-call CSVs", "seconds": verbose},
+            {"mode": "quiet: WARNING + one batched file", "seconds": quiet}]
+
+
+if __name__ == "__main__":
+    results = benchmark_output()
+    print(tabulate([[item["mode"], f"{item['seconds']:0.3f}", f"{results[0]['seconds'] / item['seconds']:0.1f}x"]
+                    for item in results], headers=["mode", "time (s)", "speedup"]))
@@ -0,0 +1,226 @@
+import argparse
+import glob
+import importlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+
+from source.benchmark.synthetic import SyntheticFxGenerator
+from source.common.decomposition import DecompositionStage
+from source.common.io import CSV_COLUMNS, DataReader
+from source.common.output import ArtifactSink
+from source.common.simulator import Simulator
+
+INPUT_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(__file__)), "input")
+
+# name -> (module, class, constructor keyword arguments); modules are imported when the stage runs
+SIMULATORS = {
+    "arima": ("source.arima.simulator", "ArimaSimulator", {}),
+    "garch_armagarch": ("source.garch.simulator", "GarchSimulator", {"engine": "armagarch"}),
+    "garch_numpy": ("source.garch.simulator", "GarchSimulator", {"engine": "numpy"}),
+    "prophet": ("source.prophet_.simuator", "ProphetSimulator", {})
+}
+PACKAGES = ["numpy", "pandas", "scipy", "statsmodels", "sklearn", "pmdarima", "prophet", "armagarch"]
+MEASURES = ["wall_s", "cpu_s", "peak_bytes"]
+
+
+def measure(function, repeat: int = 3, warmup: bool = True) -> dict:
+    # times are the best of `repeat` untraced runs; peak memory comes from one extra run under tracemalloc
+    if warmup:
+        function()
+    wall, cpu = float("inf"), float("inf")
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        function()
+        wall = min(wall, time.perf_counter() - wall_start)
+        cpu = min(cpu, time.process_time() - cpu_start)
+
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"wall_s": wall, "cpu_s": cpu, "peak_bytes": peak, "repeat": repeat}
+
+
+def write_synthetic(directory: str, rows: int, seed: int = 0) -> str:
+    # GARCH-driven daily bars in the investing.com layout; daily so the decomposition stage can infer a period,
+    # starting early enough that 100k bars still end inside pandas' nanosecond range
+    data_file = os.path.join(directory, f"synthetic_{rows}_trading_data.csv")
+    SyntheticFxGenerator(frequency="1D", start="1700-01-04", seed=seed).write(data_file, rows)
+    return data_file
+
+
+def environment() -> dict:
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = importlib.import_module(package).__version__
+        except Exception:
+            versions[package] = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.processor(),
+            "cpus": os.cpu_count(), "packages": versions}
+
+
+def skipped(error: Exception) -> dict:
+    return {"skipped": f"{type(error).__name__}: {error}"}
+
+
+def benchmark_dataset(dataset: str, data_file: str, simulators: list, horizon: int, window: int,
+                      repeat: int, fit_repeat: int) -> dict:
+    results = {}
+    try:
+        # the ForexData parser needs the optional reader package
+        results[f"parse/{dataset}"] = measure(lambda: DataReader.read_file(data_file), repeat)
+    except ImportError as e:
+        results[f"parse/{dataset}"] = skipped(e)
+    results[f"read_columns/{dataset}"] = measure(lambda: DataReader.read_columns(data_file), repeat)
+
+    columns = pd.read_csv(data_file, header=0, names=CSV_COLUMNS,
+                          dtype={"date": str, "percent_change": str})
+    results[f"frame_build/{dataset}"] = measure(lambda: DataReader.to_frame(columns), repeat)
+
+    frame = DataReader.to_frame(columns)
+    base = Simulator(frame, dataset, "Benchmark", sink=ArtifactSink())
+    base.split_dataset(horizon)
+
+    def decompose():
+        DecompositionStage.clear()
+        DecompositionStage.decompose(dataset, base.training_data)
+
+    results[f"decomposition/{dataset}"] = measure(decompose, repeat)
+
+    # a naive last-value forecast is enough to exercise the metric computation
+    base.forecasts = np.repeat(base.training_data["close"].iloc[-1], horizon)
+    results[f"evaluate_forecast/{dataset}"] = measure(base.evaluate_forecast, repeat)
+
+    # model stages fit on the latest `window` rows so large synthetic files stay tractable
+    window_frame = frame.tail(window + horizon).reset_index(drop=True)
+    for name in simulators:
+        module_name, class_name, options = SIMULATORS[name]
+        try:
+            simulator_class = getattr(importlib.import_module(module_name), class_name)
+        except ImportError as e:
+            results[f"fit/{dataset}/{name}"] = results[f"predict/{dataset}/{name}"] = skipped(e)
+            continue
+
+        simulator = simulator_class(window_frame, dataset, sink=ArtifactSink(), **options)
+        simulator.split_dataset(horizon)
+        try:
+            results[f"fit/{dataset}/{name}"] = measure(lambda: simulator.fit_model(simulator.training_data),
+                                                       fit_repeat, warmup=False)
+            model = simulator.fit_model(simulator.training_data)
+            results[f"predict/{dataset}/{name}"] = measure(lambda: simulator.predict_model(model, horizon), repeat)
+        except Exception as e:
+            results[f"fit/{dataset}/{name}"] = results[f"predict/{dataset}/{name}"] = skipped(e)
+    return results
+
+
+def run_suite(data_files: list = None, synthetic_rows: list = None, simulators: list = None, horizon: int = 100,
+              window: int = 1000, repeat: int = 3, fit_repeat: int = 1, seed: int = 0) -> dict:
+    data_files = data_files if data_files is not None else sorted(glob.glob(os.path.join(INPUT_DIRECTORY, "*.csv")))
+    synthetic_rows = synthetic_rows if synthetic_rows is not None else [20000, 100000]
+    simulators = simulators if simulators is not None else list(SIMULATORS)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        datasets = {os.path.basename(data_file).split("_trading")[0]: data_file for data_file in data_files}
+        for rows in synthetic_rows:
+            datasets[f"synthetic_{rows}"] = write_synthetic(directory, rows, seed)
+        for dataset, data_file in datasets.items():
+            results.update(benchmark_dataset(dataset, data_file, simulators, horizon, window, repeat, fit_repeat))
+
+    return {"created": datetime.now().isoformat(timespec="seconds"), "environment": environment(),
+            "settings": {"horizon": horizon, "window": window, "repeat": repeat, "fit_repeat": fit_repeat,
+                         "seed": seed, "synthetic_rows": synthetic_rows},
+            "results": results}
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2, memory_threshold: float = 0.2,
+            min_seconds: float = 0.005) -> list:
+    # a stage regresses when a measure grows by more than the threshold; sub-`min_seconds` timings are noise
+    rows = []
+    for stage, measured in current["results"].items():
+        reference = baseline["results"].get(stage)
+        if reference is None or "skipped" in reference or "skipped" in measured:
+            continue
+        for measure_name in MEASURES:
+            before, after = reference[measure_name], measured[measure_name]
+            limit = memory_threshold if measure_name == "peak_bytes" else threshold
+            ratio = after / before if before else float("inf")
+            noise = measure_name != "peak_bytes" and max(before, after) < min_seconds
+            rows.append({"stage": stage, "measure": measure_name, "baseline": before, "current": after,
+                         "ratio": ratio, "regression": not noise and ratio > 1 + limit})
+    return rows
+
+
+def print_results(report: dict):
+    rows = []
+    for stage, measured in report["results"].items():
+        if "skipped" in measured:
+            rows.append([stage, "-", "-", "-", measured["skipped"][:60]])
+        else:
+            rows.append([stage, f"{measured['wall_s'] * 1000:0.2f}", f"{measured['cpu_s'] * 1000:0.2f}",
+                         f"{measured['peak_bytes'] / 2 ** 20:0.2f}", ""])
+    print(tabulate(rows, headers=["stage", "wall (ms)", "cpu (ms)", "peak (MiB)", "skipped"]))
+
+
+def main(arguments: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m source.benchmark.suite",
+                                     description="Time loader, decomposition, model and metric stages.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the suite and write a JSON report")
+    run.add_argument("--output", default="benchmarks.json")
+    run.add_argument("--data-files", nargs="*", default=None)
+    run.add_argument("--synthetic-rows", nargs="*", type=int, default=None)
+    run.add_argument("--simulators", nargs="*", choices=list(SIMULATORS), default=None)
+    run.add_argument("--horizon", type=int, default=100)
+    run.add_argument("--window", type=int, default=1000)
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--fit-repeat", type=int, default=1)
+    run.add_argument("--seed", type=int, default=0)
+
+    check = commands.add_parser("compare", help="flag regressions of a report against a baseline")
+    check.add_argument("baseline")
+    check.add_argument("current")
+    check.add_argument("--threshold", type=float, default=0.2)
+    check.add_argument("--memory-threshold", type=float, default=0.2)
+    check.add_argument("--min-seconds", type=float, default=0.005)
+    options = parser.parse_args(arguments)
+
+    if options.command == "run":
+        report = run_suite(options.data_files, options.synthetic_rows, options.simulators, options.horizon,
+                           options.window, options.repeat, options.fit_repeat, options.seed)
+        with open(options.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print_results(report)
+        print(f"\nreport written to {options.output}")
+        return 0
+
+    with open(options.baseline) as file:
+        baseline = json.load(file)
+    with open(options.current) as file:
+        current = json.load(file)
+    rows = compare(baseline, current, options.threshold, options.memory_threshold, options.min_seconds)
+    print(tabulate([[row["stage"], row["measure"], f"{row['baseline']:0.4g}", f"{row['current']:0.4g}",
+                     f"{row['ratio']:0.2f}x", "REGRESSION" if row["regression"] else ""] for row in rows],
+                   headers=["stage", "measure", "baseline", "current", "ratio", ""]))
+    regressions = [row for row in rows if row["regression"]]
+    print(f"\n{len(regressions)} regression(s) beyond +{options.threshold:0.0%} time / "
+          f"+{options.memory_threshold:0.0%} memory")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
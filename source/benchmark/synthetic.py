@@ -0,0 +1,129 @@
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+# investing.com export header, as read by DataReader.read_file/read_columns
+CSV_HEADER = "Date,Close,Open,High,Low,Change %\n"
+# bars per year used to scale the annual volatility down to one bar; FX trades around the clock on weekdays
+TRADING_SECONDS_PER_YEAR = 260 * 86400
+
+
+class SyntheticFxGenerator:
+    # ARMA(1, 0)-GARCH(1, 1) log returns on weekday bars, streamed in chunks so the file size is not bounded by memory
+    def __init__(self, frequency: str = "1D", start: str = "2000-01-03", start_price: float = 1.2,
+                 annual_volatility: float = 0.08, alpha: float = 0.05, beta: float = 0.93, ar: float = 0.02,
+                 seed: int = None):
+        if alpha + beta >= 1:
+            raise ValueError("GARCH persistence alpha + beta must be below 1")
+        self.step = pd.Timedelta(frequency).to_timedelta64().astype("timedelta64[s]")
+        self.intraday = self.step < np.timedelta64(1, "D")
+        self.alpha = alpha
+        self.beta = beta
+        self.ar = ar
+        # unconditional per-bar variance, matched by omega
+        self.variance = annual_volatility ** 2 * self.step.astype(np.int64) / TRADING_SECONDS_PER_YEAR
+        self.omega = self.variance * (1 - alpha - beta)
+        self.generator = np.random.default_rng(seed)
+        self.time = np.datetime64(start, "s")
+        self.price = start_price
+        self.last_return = 0.0
+        self.last_shock = 0.0
+
+    def timestamps(self, rows: int) -> np.ndarray:
+        # the next `rows` bar times, skipping Saturdays and Sundays (1970-01-01 was a Thursday)
+        chunks, remaining = [], rows
+        while remaining > 0:
+            candidates = self.time + self.step * np.arange(int(remaining * 1.5) + 8)
+            days = candidates.astype("datetime64[D]").astype(np.int64)
+            weekdays = candidates[(days + 3) % 7 < 5][:remaining]
+            chunks.append(weekdays)
+            remaining -= len(weekdays)
+            self.time = candidates[-1] + self.step
+        if len(chunks[-1]):
+            self.time = chunks[-1][-1] + self.step
+        return np.concatenate(chunks)
+
+    def returns(self, rows: int) -> tuple:
+        # the GARCH recursion is sequential; scalar floats keep it around a microsecond a bar
+        shocks = self.generator.standard_normal(rows)
+        returns = np.empty(rows)
+        sigmas = np.empty(rows)
+        variance, last_return, last_shock = self.variance, self.last_return, self.last_shock
+        omega, alpha, beta, ar = self.omega, self.alpha, self.beta, self.ar
+        for index, shock in enumerate(shocks.tolist()):
+            variance = omega + alpha * last_shock * last_shock + beta * variance
+            sigma = math.sqrt(variance)
+            last_shock = sigma * shock
+            last_return = ar * last_return + last_shock
+            returns[index] = last_return
+            sigmas[index] = sigma
+        self.variance, self.last_return, self.last_shock = variance, last_return, last_shock
+        return returns, sigmas
+
+    def chunk(self, rows: int) -> DataFrame:
+        dates = self.timestamps(rows)
+        returns, sigmas = self.returns(rows)
+        close = self.price * np.exp(np.cumsum(returns))
+        open_ = np.concatenate([[self.price], close[:-1]])
+        self.price = float(close[-1])
+
+        # wicks beyond the body scale with the bar's conditional volatility
+        wicks = np.abs(self.generator.standard_normal((2, rows))) * sigmas * 0.5
+        high = np.maximum(open_, close) * np.exp(wicks[0])
+        low = np.minimum(open_, close) * np.exp(-wicks[1])
+        text_dates = np.datetime_as_string(dates, unit="s" if self.intraday else "D")
+        if self.intraday:
+            text_dates = np.char.replace(text_dates, "T", " ")
+        return DataFrame({"Date": text_dates, "Close": close, "Open": open_, "High": high, "Low": low,
+                          "Change %": np.char.add(np.char.mod("%.2f", (close / open_ - 1) * 100), "%")})
+
+    def write(self, data_file: str, rows: int, chunk_size: int = 100000) -> int:
+        written = 0
+        with open(data_file, "w", newline="") as file:
+            file.write(CSV_HEADER)
+            while written < rows:
+                size = min(chunk_size, rows - written)
+                self.chunk(size).to_csv(file, header=False, index=False, float_format="%.5f")
+                written += size
+        return written
+
+
+def generate_dataset(directory: str, pairs: int = 4, rows: int = 1000000, frequency: str = "1min",
+                     chunk_size: int = 100000, seed: int = 0, **generator_options) -> dict:
+    # one <pair>_trading_data.csv per synthetic pair, each with its own seed and starting price
+    os.makedirs(directory, exist_ok=True)
+    start_prices = np.random.default_rng(seed).uniform(0.5, 150.0, pairs)
+    data_files = {}
+    for index in range(pairs):
+        currency_pair = f"syn_{index:03d}"
+        data_file = os.path.join(directory, f"{currency_pair}_trading_data.csv")
+        generator = SyntheticFxGenerator(frequency=frequency, start_price=float(start_prices[index]),
+                                         seed=seed + index, **generator_options)
+        generator.write(data_file, rows, chunk_size)
+        data_files[currency_pair] = data_file
+    return data_files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic GARCH-driven FX files in the investing.com layout.")
+    parser.add_argument("--directory", default="input/synthetic")
+    parser.add_argument("--pairs", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=1000000, help="bars per pair")
+    parser.add_argument("--frequency", default="1min", help="bar length, e.g. 1D, 1h, 15min, 1min")
+    parser.add_argument("--start", default="2000-01-03")
+    parser.add_argument("--annual-volatility", type=float, default=0.08)
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+
+    started = time.perf_counter()
+    files = generate_dataset(options.directory, options.pairs, options.rows, options.frequency, options.chunk_size,
+                             options.seed, start=options.start, annual_volatility=options.annual_volatility)
+    size = sum(os.path.getsize(data_file) for data_file in files.values())
+    print(f"{len(files)} files, {options.rows} bars each, {size / 2 ** 20:0.1f} MiB "
+          f"in {time.perf_counter() - started:0.1f}s -> {options.directory}")
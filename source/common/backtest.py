@@ -0,0 +1,130 @@
+import time
+
+from pandas import DataFrame
+
+from source.common.runner import ExperimentRunner
+from source.common.series import ForexSeries
+from source.common.simulator import Simulator
+
+
+class BacktestJob:
+    def __init__(self, currency_pair: str = None, origins: list = None):
+        self.currency_pair = currency_pair
+        self.origins = origins
+
+    def to_dict(self):
+        return {"currency_pair": self.currency_pair, "first_origin": self.origins[0], "last_origin": self.origins[-1]}
+
+    def __repr__(self):
+        return str(self.to_dict())
+
+
+class BacktestReport:
+    def __init__(self, model_name: str = None, currency_pair: str = None, origins: DataFrame = None,
+                 counters: dict = None, errors: list = None, duration: float = 0.0):
+        self.model_name = model_name
+        self.currency_pair = currency_pair
+        self.origins = origins
+        self.counters = counters
+        self.errors = errors if errors is not None else []
+        self.duration = duration
+
+    @property
+    def metrics(self) -> dict:
+        metric_columns = [column for column in self.origins.columns if column not in ["origin", "date", "fit"]]
+        return self.origins[metric_columns].mean().to_dict()
+
+    @property
+    def refits_avoided(self) -> int:
+        # only an in-place update (pmdarima's update) skips the fit; a warm start still fits from scratch,
+        # just from better starting values
+        return self.counters["update"]
+
+    @property
+    def warm_started(self) -> int:
+        return self.counters["warm_start"]
+
+    def to_dict(self):
+        return {"model": self.model_name, "currency_pair": self.currency_pair, **self.counters,
+                "refits_avoided": self.refits_avoided, "warm_started": self.warm_started, "duration": self.duration}
+
+
+class WalkForwardBacktester:
+    def __init__(self, simulator: Simulator = None, forecast_horizon: int = 5, step: int = 1,
+                 initial_window: int = None, max_origins: int = None, refit_every: int = None, workers: int = 1,
+                 timeout: float = None):
+        self.simulator = simulator
+        self.forecast_horizon = forecast_horizon
+        self.step = step
+        self.initial_window = initial_window
+        self.max_origins = max_origins
+        # force a full refit every n origins so incremental updates cannot drift indefinitely
+        self.refit_every = refit_every
+        self.workers = workers
+        self.timeout = timeout
+
+    def origins(self) -> list:
+        size = len(self.simulator.series)
+        first = self.initial_window or size // 2
+        origins = list(range(first, size - self.forecast_horizon + 1, self.step))
+        if self.max_origins is not None:
+            origins = origins[-self.max_origins:]
+        return origins
+
+    def run(self) -> BacktestReport:
+        start = time.perf_counter()
+        origins = self.origins()
+        simulator = self.simulator
+
+        if self.workers <= 1:
+            output = self.run_origins(origins, simulator.series)
+            outputs, errors = [output], []
+        else:
+            # contiguous chunks keep incremental updates going inside each worker
+            chunk_size = -(-len(origins) // self.workers)
+            jobs = [BacktestJob(simulator.currency_pair, origins[index:index + chunk_size])
+                    for index in range(0, len(origins), chunk_size)]
+            ExperimentRunner.load(simulator.currency_pair, simulator.series)
+            runner = ExperimentRunner(target=lambda job, series: self.run_origins(job.origins, series),
+                                      workers=self.workers, timeout=self.timeout)
+            results = runner.run(jobs)
+            outputs = [result.output for result in results if result.succeeded]
+            errors = [result.to_dict() for result in results if not result.succeeded]
+
+        rows = [row for output in outputs for row in output["origins"]]
+        counters = {"origins": len(rows)}
+        for strategy in ["refit", "update", "warm_start"]:
+            counters[strategy] = sum(output["counters"][strategy] for output in outputs)
+        return BacktestReport(simulator.model_name, simulator.currency_pair, DataFrame.from_records(rows), counters,
+                              errors, time.perf_counter() - start)
+
+    def run_origins(self, origins: list, series: ForexSeries) -> dict:
+        simulator = self.simulator
+        counters = {"refit": 0, "update": 0, "warm_start": 0}
+        rows = []
+        model = None
+        previous_origin = None
+
+        for count, origin in enumerate(origins):
+            # windows are views on the series; only the backends get frames
+            training_data = series[:origin].to_frame()
+
+            refit = model is None or (self.refit_every is not None and count % self.refit_every == 0)
+            if not refit:
+                model = simulator.update_model(model, training_data, series[previous_origin:origin].to_frame())
+                refit = model is None
+            if refit:
+                model = simulator.fit_model(training_data)
+                strategy = "refit"
+            else:
+                strategy = simulator.update_strategy
+            counters[strategy] += 1
+            previous_origin = origin
+
+            simulator.validation_series = series[origin:origin + self.forecast_horizon]
+            simulator.validation_frame = None
+            simulator.collate(simulator.predict_model(model, self.forecast_horizon))
+            simulator.evaluate_forecast()
+            rows.append({"origin": origin, "date": series.dates[origin - 1], "fit": strategy,
+                         **simulator.metrics})
+        return {"origins": rows, "counters": counters}
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+from pandas import DataFrame
+
+METADATA_FILE = "metadata.json"
+
+
+class DatasetCache:
+    def __init__(self, cache_directory: str = "intermediates/datasets", max_entries: int = 32):
+        self.cache_directory = cache_directory
+        self.max_entries = max_entries
+        self.frames = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(data_file: str) -> dict:
+        stat = os.stat(data_file)
+        return {"path": os.path.abspath(data_file), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    @staticmethod
+    def content_hash(data_file: str, block_size: int = 1 << 20) -> str:
+        digest = hashlib.sha256()
+        with open(data_file, "rb") as file:
+            for block in iter(lambda: file.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def entry_directory(self, path: str) -> str:
+        name = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.cache_directory, f"{name}_{hashlib.sha1(path.encode()).hexdigest()[:16]}")
+
+    def load(self, data_file: str, parser) -> DataFrame:
+        fingerprint = DatasetCache.fingerprint(data_file)
+        key = (fingerprint["path"], fingerprint["size"], fingerprint["mtime"])
+
+        # in-process layer: repeated loads within one run never touch the disk
+        if key in self.frames:
+            self.frames.move_to_end(key)
+            self.hits += 1
+            return self.frames[key].copy(deep=False)
+
+        frame = self.read_entry(fingerprint)
+        if frame is None:
+            self.misses += 1
+            frame = parser(data_file)
+            self.write_entry(fingerprint, frame)
+        else:
+            self.hits += 1
+
+        self.frames[key] = frame
+        while len(self.frames) > self.max_entries:
+            self.frames.popitem(last=False)
+        return frame.copy(deep=False)
+
+    def read_entry(self, fingerprint: dict):
+        directory = self.entry_directory(fingerprint["path"])
+        metadata_file = os.path.join(directory, METADATA_FILE)
+        if not os.path.exists(metadata_file):
+            return None
+        try:
+            with open(metadata_file) as file:
+                metadata = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if metadata["size"] != fingerprint["size"]:
+            return None
+        if metadata["mtime"] != fingerprint["mtime"]:
+            # touched but possibly unchanged: only the content hash can tell
+            if metadata["sha256"] != DatasetCache.content_hash(fingerprint["path"]):
+                return None
+            metadata["mtime"] = fingerprint["mtime"]
+            DatasetCache.write_metadata(directory, metadata)
+
+        try:
+            columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                       for name in metadata["columns"]}
+        except (OSError, ValueError):
+            return None
+        # aliases point at the same mapped array; copy=False keeps every column a view of its .npy file
+        for alias, column in metadata["aliases"].items():
+            columns[alias] = columns[column]
+        return DataFrame(columns, columns=metadata["order"], copy=False)
+
+    def write_entry(self, fingerprint: dict, frame: DataFrame):
+        directory = self.entry_directory(fingerprint["path"])
+        staging = f"{directory}.{os.getpid()}.tmp"
+        aliases = DatasetCache.find_aliases(frame)
+        columns = [name for name in frame.columns if name not in aliases]
+
+        os.makedirs(staging, exist_ok=True)
+        for name in columns:
+            np.save(os.path.join(staging, f"{name}.npy"), frame[name].to_numpy())
+        DatasetCache.write_metadata(staging, {**fingerprint,
+                                              "sha256": DatasetCache.content_hash(fingerprint["path"]),
+                                              "columns": columns,
+                                              "aliases": aliases,
+                                              "order": list(frame.columns)})
+
+        # swap the entry in whole so readers never see a half-written dataset
+        shutil.rmtree(directory, ignore_errors=True)
+        try:
+            os.replace(staging, directory)
+        except OSError:
+            # another process published the same entry first
+            shutil.rmtree(staging, ignore_errors=True)
+
+    @staticmethod
+    def find_aliases(frame: DataFrame) -> dict:
+        # ds/y duplicate date/close; store them once and re-link on load
+        aliases = {}
+        names = list(frame.columns)
+        for index, name in enumerate(names):
+            for other in names[:index]:
+                if other not in aliases and frame[name].dtype == frame[other].dtype \
+                        and frame[name].equals(frame[other]):
+                    aliases[name] = other
+                    break
+        return aliases
+
+    @staticmethod
+    def write_metadata(directory: str, metadata: dict):
+        staging = os.path.join(directory, f"{METADATA_FILE}.{os.getpid()}.tmp")
+        with open(staging, "w") as file:
+            json.dump(metadata, file)
+        os.replace(staging, os.path.join(directory, METADATA_FILE))
+
+    def clear(self):
+        self.frames.clear()
+        shutil.rmtree(self.cache_directory, ignore_errors=True)
@@ -1,18 +1,38 @@
+import math
 from datetime import datetime
 
 
+def parse_percent(value) -> float:
+    # investing.com writes "0.25%"; anything unparseable becomes NaN
+    try:
+        return float(str(value).rstrip("%"))
+    except ValueError:
+        return math.nan
+
+
 class ForexData:
+    # one bar; ds and y are Prophet's names for date and close and are not stored twice
+    __slots__ = ("date", "open", "high", "low", "close", "percent_change")
+
     def __init__(self, date: str = None, close: str = None, _open: str = None, high: str = None, low: str = None,
                  percent_change: str = None):
         date_format = '%Y-%m-%d'  # "%b %d, %Y"
-        self.date = datetime.strptime(date, date_format).date()
-        self.ds = self.date
+        # intraday exports carry a time of day and keep it
+        self.date = datetime.strptime(date, date_format).date() if len(date) <= 10 else \
+            datetime.strptime(date, date_format + " %H:%M:%S")
         self.open = float(_open)
         self.high = float(high)
         self.low = float(low)
         self.close = float(close)
-        self.percent_change = percent_change
-        self.y = self.close
+        self.percent_change = parse_percent(percent_change)
+
+    @property
+    def ds(self):
+        return self.date
+
+    @property
+    def y(self):
+        return self.close
 
     @staticmethod
     def from_string(_data: str):
@@ -25,6 +45,18 @@ class ForexData:
         assert len(_data) == 6
         return ForexData(*_data)
 
+    @staticmethod
+    def from_values(date, _open: float, high: float, low: float, close: float, percent_change: float):
+        # already-parsed values, e.g. one row of a ForexSeries; skips the string parsing of __init__
+        record = object.__new__(ForexData)
+        record.date = date
+        record.open = float(_open)
+        record.high = float(high)
+        record.low = float(low)
+        record.close = float(close)
+        record.percent_change = float(percent_change)
+        return record
+
     def to_dict(self):
         return {
             "date": self.date,
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from source.common.registry import ModelRegistry
+
+
+class DecompositionStage:
+    # (currency pair, window hash, period, additive/multiplicative) -> trend/residual/seasonality frame
+    cache = OrderedDict()
+    max_entries = 256
+    hits = 0
+    misses = 0
+
+    @staticmethod
+    def infer_period(dates) -> int:
+        from statsmodels.tsa.tsatools import freq_to_period
+
+        frequency = pd.DatetimeIndex(dates).inferred_freq
+        if frequency is None:
+            raise ValueError("Cannot infer a seasonal period from the dates; pass period explicitly")
+        return freq_to_period(frequency)
+
+    @staticmethod
+    def prepare(training_data: DataFrame, period: int = None):
+        dates = pd.to_datetime(training_data["date"]).to_numpy()
+        close = training_data["close"].to_numpy(dtype=np.float64)
+        if len(dates) > 1 and not (dates[1:] >= dates[:-1]).all():
+            order = np.argsort(dates, kind="stable")
+            dates, close = dates[order], close[order]
+        return close, period if period is not None else DecompositionStage.infer_period(dates)
+
+    @staticmethod
+    def make_key(currency_pair: str, training_data: DataFrame, period: int, model: str):
+        return currency_pair, ModelRegistry.window_hash(training_data), period, model
+
+    @staticmethod
+    def remember(key, decomposition: DataFrame):
+        DecompositionStage.cache[key] = decomposition
+        while len(DecompositionStage.cache) > DecompositionStage.max_entries:
+            DecompositionStage.cache.popitem(last=False)
+
+    @staticmethod
+    def decompose(currency_pair: str, training_data: DataFrame, period: int = None,
+                  model: str = "additive") -> DataFrame:
+        return DecompositionStage.decompose_many({currency_pair: training_data}, period, model)[currency_pair]
+
+    @staticmethod
+    def decompose_many(training_data: dict, period: int = None, model: str = "additive") -> dict:
+        # keys are currency pairs, or (currency pair, label) tuples when one pair has several windows;
+        # results come back under the same keys
+        # statsmodels (and scipy under it) is imported on first use rather than with every Simulator
+        from statsmodels.tsa.seasonal import seasonal_decompose
+
+        results = {}
+        batches = {}
+        for name, frame in training_data.items():
+            currency_pair = name[0] if isinstance(name, tuple) else name
+            close, pair_period = DecompositionStage.prepare(frame, period)
+            key = DecompositionStage.make_key(currency_pair, frame, pair_period, model)
+            if key in DecompositionStage.cache:
+                DecompositionStage.cache.move_to_end(key)
+                DecompositionStage.hits += 1
+                results[name] = DecompositionStage.cache[key].copy(deep=False)
+            else:
+                DecompositionStage.misses += 1
+                batches.setdefault((len(close), pair_period), []).append((name, key, close))
+
+        # windows of equal length and period go through seasonal_decompose as the columns of one array
+        for (_, batch_period), members in batches.items():
+            raw_decomposition = seasonal_decompose(np.column_stack([close for _, _, close in members]),
+                                                   model=model, period=batch_period)
+            # a single column comes back squeezed to 1-D
+            trend, residual, seasonality = (np.reshape(component, (len(component), -1)) for component in
+                                            (raw_decomposition.trend, raw_decomposition.resid,
+                                             raw_decomposition.seasonal))
+            for column, (name, key, _) in enumerate(members):
+                decomposition = DataFrame({"trend": trend[:, column], "residual": residual[:, column],
+                                           "seasonality": seasonality[:, column]})
+                DecompositionStage.remember(key, decomposition)
+                results[name] = decomposition
+        return results
+
+    @staticmethod
+    def clear():
+        DecompositionStage.cache.clear()
+        DecompositionStage.hits = 0
+        DecompositionStage.misses = 0
@@ -0,0 +1,98 @@
+import cProfile
+import io
+import os
+import pstats
+import resource
+import time
+from contextlib import contextmanager
+
+PROFILERS = ["cprofile", "pyinstrument"]
+
+
+def resident_memory() -> int:
+    # current resident set size in bytes; falls back to the peak where /proc is not available
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageTimings:
+    # per-stage wall/CPU time and resident-memory deltas plus free-form model counters for one simulator
+    def __init__(self, profiler: str = None, profile_file: str = None, profile_lines: int = 25):
+        if profiler is not None and profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler: {profiler}")
+        self.stages = {}
+        self.counters = {}
+        self.profiler = profiler
+        self.profile_file = profile_file
+        self.profile_lines = profile_lines
+        self.profile_report = None
+
+    @contextmanager
+    def stage(self, name: str):
+        # repeated stages (several artifact writes, say) accumulate under one name
+        wall_start, cpu_start, memory_start = time.perf_counter(), time.process_time(), resident_memory()
+        try:
+            yield
+        finally:
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "cpu_seconds": 0.0, "memory_delta": 0, "calls": 0})
+            stage["seconds"] += time.perf_counter() - wall_start
+            stage["cpu_seconds"] += time.process_time() - cpu_start
+            stage["memory_delta"] += resident_memory() - memory_start
+            stage["calls"] += 1
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, name: str, value):
+        # facts about the latest fit (order chosen, log-likelihood) overwrite rather than add up
+        self.counters[name] = value
+
+    @contextmanager
+    def profile(self):
+        if self.profiler is None:
+            yield
+            return
+
+        if self.profiler == "pyinstrument":
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                self.profile_report = profiler.output_text()
+                if self.profile_file is not None:
+                    with open(self.profile_file, "w") as file:
+                        file.write(profiler.output_html())
+            return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(self.profile_lines)
+            self.profile_report = report.getvalue()
+            if self.profile_file is not None:
+                profiler.dump_stats(self.profile_file)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(stage["seconds"] for stage in self.stages.values())
+
+    def to_dict(self):
+        return {
+            "stages": {name: dict(stage) for name, stage in self.stages.items()},
+            "counters": dict(self.counters),
+            "total_seconds": self.total_seconds,
+            "profile": self.profile_report
+        }
+
+    def __repr__(self):
+        return str({name: f"{stage['seconds']:0.3f}s" for name, stage in self.stages.items()})
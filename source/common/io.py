@@ -1,11 +1,35 @@
-from reader import Reader
+import hashlib
+import json
+import logging
+import os
+from collections import deque
 
+import numpy as np
+import pandas as pd
+from numpy import float64
+from pandas import DataFrame
+
+from source.common.cache import DatasetCache
 from source.common.data import ForexData
+from source.common.series import ForexSeries
+from source.common.validation import DataValidator, ValidationStage
+
+# column layout of the investing.com exports: Date,Close,Open,High,Low,Change %
+CSV_COLUMNS = ["date", "close", "open", "high", "low", "percent_change"]
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+# ds/y are added only for Prophet (series.prophet_frame)
+FRAME_COLUMNS = ["date", "open", "high", "low", "close", "percent_change"]
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+logger = logging.getLogger(__name__)
 
 
 class DataReader:
     @staticmethod
     def read_file(filename: str):
+        from reader import Reader
+
         dataset = []
         with Reader.openWithName(filename) as file:
             for line in file:
@@ -25,6 +49,165 @@ class DataReader:
         dataset.append(trading_data)
         return dataset
 
+    @staticmethod
+    def read_columns(filename: str) -> DataFrame:
+        # the header is consumed once by the parser instead of being tested on every row
+        columns = pd.read_csv(filename, header=0, names=CSV_COLUMNS, usecols=range(len(CSV_COLUMNS)),
+                              dtype={"date": str, "percent_change": str})
+        return DataReader.to_frame(columns)
+
+    @staticmethod
+    def read_chunks(filename: str, chunk_size: int = 100000, start=None, end=None):
+        # parsed blocks of at most chunk_size rows; see ChunkedReader for index lookups
+        return ChunkedReader(chunk_size).read_chunks(filename, start, end)
+
+    @staticmethod
+    def read_series(filename: str, currency_pair: str = None) -> ForexSeries:
+        return ForexSeries.from_frame(DataReader.read_columns(filename), currency_pair)
+
+    @staticmethod
+    def to_frame(columns: DataFrame) -> DataFrame:
+        # intraday files (e.g. benchmark/synthetic.py with --frequency 1min) have a time of day on every row
+        intraday = len(columns) > 0 and len(str(columns["date"].iloc[0])) > 10
+        frame = DataFrame({
+            "date": pd.to_datetime(columns["date"], format=DATETIME_FORMAT if intraday else DATE_FORMAT,
+                                   errors="coerce"),
+            "open": pd.to_numeric(columns["open"], errors="coerce").astype(float64),
+            "high": pd.to_numeric(columns["high"], errors="coerce").astype(float64),
+            "low": pd.to_numeric(columns["low"], errors="coerce").astype(float64),
+            "close": pd.to_numeric(columns["close"], errors="coerce").astype(float64),
+            "percent_change": pd.to_numeric(columns["percent_change"].str.rstrip("%"),
+                                            errors="coerce").astype(float64)
+        })
+
+        # rows the record path would have rejected in ForexData.from_list
+        invalid = frame[["date"] + PRICE_COLUMNS].isna().any(axis=1)
+        if invalid.any():
+            logger.warning("Dropped %d data entries that could not be parsed", int(invalid.sum()))
+            frame = frame[~invalid].reset_index(drop=True)
+
+        return frame[FRAME_COLUMNS]
+
+
+def window_bounds(start=None, end=None) -> tuple:
+    # [lower, upper): a date-only end includes that whole day, as in ForexSeries.between
+    lower = pd.Timestamp(start) if start is not None else None
+    upper = None
+    if end is not None:
+        end = pd.Timestamp(end)
+        upper = end + pd.Timedelta(days=1) if end == end.normalize() else end + pd.Timedelta(1)
+    return lower, upper
+
+
+class OffsetIndex:
+    # the byte offset and first date of every stride-th row, so a window is read from near its start
+    def __init__(self, index_directory: str = "intermediates/indexes", stride: int = 10000):
+        self.index_directory = index_directory
+        self.stride = stride
+
+    def index_file(self, path: str) -> str:
+        name = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.index_directory, f"{name}_{hashlib.sha1(path.encode()).hexdigest()[:16]}.json")
+
+    def load(self, data_file: str) -> dict:
+        fingerprint = DatasetCache.fingerprint(data_file)
+        index_file = self.index_file(fingerprint["path"])
+        if os.path.exists(index_file):
+            try:
+                with open(index_file) as file:
+                    index = json.load(file)
+                if (index["size"], index["mtime"], index["stride"]) == \
+                        (fingerprint["size"], fingerprint["mtime"], self.stride):
+                    index["dates"] = pd.to_datetime(index["dates"]).to_numpy()
+                    return index
+            except (OSError, ValueError, KeyError):
+                pass
+
+        index = {**fingerprint, **OffsetIndex.build(data_file, self.stride)}
+        os.makedirs(self.index_directory, exist_ok=True)
+        staging = f"{index_file}.{os.getpid()}.tmp"
+        with open(staging, "w") as file:
+            json.dump(index, file)
+        os.replace(staging, index_file)
+        index["dates"] = pd.to_datetime(index["dates"]).to_numpy()
+        return index
+
+    @staticmethod
+    def build(data_file: str, stride: int = 10000) -> dict:
+        # one pass over the raw lines; nothing but the sampled dates is parsed
+        dates, offsets, rows = [], [], 0
+        with open(data_file, "rb") as file:
+            position = len(file.readline())
+            for line in file:
+                if line.strip():
+                    if rows % stride == 0:
+                        dates.append(line.split(b",", 1)[0].decode())
+                        offsets.append(position)
+                    rows += 1
+                position += len(line)
+        return {"stride": stride, "rows": rows, "dates": dates, "offsets": offsets}
+
+    @staticmethod
+    def locate(index: dict, start=None, tail: int = None):
+        # offset of the block holding the first wanted row; None reads from the top
+        if not index["offsets"]:
+            return None
+        if tail is not None:
+            block = max(index["rows"] - tail, 0) // index["stride"]
+        elif start is not None:
+            block = int(np.searchsorted(index["dates"], np.datetime64(pd.Timestamp(start)), side="left")) - 1
+        else:
+            return None
+        return index["offsets"][max(block, 0)]
+
+
+class ChunkedReader:
+    def __init__(self, chunk_size: int = 100000, index: OffsetIndex = None):
+        self.chunk_size = chunk_size
+        self.index = index
+
+    def read_chunks(self, filename: str, start=None, end=None, offset: int = None):
+        # dates ascend, so reading stops at the first row past `end`
+        lower, upper = window_bounds(start, end)
+        with open(filename, "rb") as file:
+            if offset is not None:
+                file.seek(offset)
+            with pd.read_csv(file, header=None if offset is not None else 0, names=CSV_COLUMNS,
+                             usecols=range(len(CSV_COLUMNS)), dtype={"date": str, "percent_change": str},
+                             chunksize=self.chunk_size) as chunks:
+                for columns in chunks:
+                    frame = DataReader.to_frame(columns)
+                    if lower is not None:
+                        frame = frame[frame["date"] >= lower]
+                    if upper is not None and len(frame) and frame["date"].iloc[-1] >= upper:
+                        frame = frame[frame["date"] < upper]
+                        if len(frame):
+                            yield frame.reset_index(drop=True)
+                        return
+                    if len(frame):
+                        yield frame.reset_index(drop=True)
+
+    def read_window(self, filename: str, start=None, end=None, tail: int = None) -> DataFrame:
+        offset = None
+        if self.index is not None and (start is not None or (tail is not None and end is None)):
+            offset = OffsetIndex.locate(self.index.load(filename), start=start, tail=tail if end is None else None)
+
+        chunks = self.read_chunks(filename, start, end, offset)
+        if tail is None:
+            frames = list(chunks)
+        else:
+            # only the chunks that can still hold one of the last `tail` rows are kept
+            frames, rows = deque(), 0
+            for frame in chunks:
+                frames.append(frame)
+                rows += len(frame)
+                while rows - len(frames[0]) >= tail:
+                    rows -= len(frames.popleft())
+        if not frames:
+            return DataFrame(columns=FRAME_COLUMNS)
+        frame = pd.concat(frames, ignore_index=True)
+        return frame.tail(tail).reset_index(drop=True) if tail is not None else frame
+
 
 class DataWriter:
     @staticmethod
@@ -35,8 +218,52 @@ class DataWriter:
 
 
 class DatasetLoader:
+    cache: DatasetCache = None
+    reader: ChunkedReader = None
+    validation: ValidationStage = None
+
+    @staticmethod
+    def configure_cache(cache_directory: str = "intermediates/datasets", max_entries: int = 32):
+        DatasetLoader.cache = DatasetCache(cache_directory, max_entries) if cache_directory else None
+
+    @staticmethod
+    def configure_reader(chunk_size: int = 100000, index_directory: str = "intermediates/indexes",
+                         stride: int = 10000):
+        DatasetLoader.reader = ChunkedReader(chunk_size, OffsetIndex(index_directory, stride) if index_directory
+                                             else None)
+
+    @staticmethod
+    def configure_validation(repairs: list = None, spike_threshold: float = 10.0,
+                             cache_directory: str = "intermediates/validated", max_entries: int = 32):
+        # checks (and repairs) every loaded frame before it reaches a model; validated frames replace the raw cache
+        DatasetLoader.validation = ValidationStage(DataValidator(repairs, spike_threshold), cache_directory,
+                                                   max_entries)
+
     @staticmethod
     def load(data_file: str = None):
         raw_data = DataReader.read_file(data_file)
         print("raw input loaded ...")
         return raw_data
+
+    @staticmethod
+    def load_frame(data_file: str = None, start=None, end=None, tail: int = None) -> DataFrame:
+        if start is not None or end is not None or tail is not None:
+            # a window is read in chunks and never holds the whole file
+            reader = DatasetLoader.reader if DatasetLoader.reader is not None else ChunkedReader()
+            trading_data = reader.read_window(data_file, start, end, tail)
+            if DatasetLoader.validation is not None:
+                trading_data = DatasetLoader.validation.apply(trading_data, data_file)
+        elif DatasetLoader.validation is not None:
+            trading_data = DatasetLoader.validation.load(data_file, DataReader.read_columns)
+        elif DatasetLoader.cache is not None:
+            trading_data = DatasetLoader.cache.load(data_file, DataReader.read_columns)
+        else:
+            trading_data = DataReader.read_columns(data_file)
+        logger.debug("raw input loaded: %s (%d rows)", data_file, len(trading_data))
+        return trading_data
+
+    @staticmethod
+    def load_series(data_file: str = None, currency_pair: str = None, start=None, end=None,
+                    tail: int = None) -> ForexSeries:
+        # the compact form for long-lived workers; the cached columns are copied into one block
+        return ForexSeries.from_frame(DatasetLoader.load_frame(data_file, start, end, tail), currency_pair)
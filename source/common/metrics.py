@@ -0,0 +1,70 @@
+import numpy as np
+
+METRIC_NAMES = {
+    "mse": "Mean Squared Error (MSE)",
+    "mae": "Mean Absolute Error (MAE)",
+    "msle": "Mean Squared Logarithmic Error (MSLE)",
+    "mape": "Mean Absolute Percentage Error (MAPE)",
+    "medae": "Median Absolute Error (MedAE)",
+    "gamma_deviance": "Mean Gamma Deviance",
+    "poisson_deviance": "Mean Poisson Deviance",
+    "tweedie_deviance": "Mean Tweedie Deviance Error",
+    "explained_variance": "Explained Variance Regression Score",
+    "max_error": "Max Residual Error",
+    "r2": "Coefficient of Determination"
+}
+
+
+def compute_metrics_batch(y_actual, y_forecast) -> dict:
+    # rows are forecasts (e.g. origins), columns the horizon; a 1-D actual is shared by every row
+    y_forecast = np.atleast_2d(np.asarray(y_forecast, dtype=np.float64))
+    y_actual = np.broadcast_to(np.asarray(y_actual, dtype=np.float64), y_forecast.shape)
+    if y_actual.shape[-1] == 0:
+        raise ValueError("Found empty input while computing forecast metrics")
+    if not (np.all(y_actual > 0) and np.all(y_forecast > 0)):
+        # same domain as sklearn's gamma deviance, which has always been part of the report
+        raise ValueError("Forecast metrics require strictly positive actual and forecast values")
+
+    # shared intermediates
+    residuals = y_actual - y_forecast
+    absolute_errors = np.abs(residuals)
+    squared_errors = residuals * residuals
+    log_actual = np.log(y_actual)
+    log_forecast = np.log(y_forecast)
+    log_ratio = log_actual - log_forecast
+    actual_deviation = y_actual - y_actual.mean(axis=-1, keepdims=True)
+    total_variance = (actual_deviation * actual_deviation).mean(axis=-1)
+    mse = squared_errors.mean(axis=-1)
+
+    log1p_residuals = np.log1p(y_actual) - np.log1p(y_forecast)
+    residual_variance = residuals.var(axis=-1)
+
+    metrics = {
+        "mse": mse,
+        "mae": absolute_errors.mean(axis=-1),
+        "msle": (log1p_residuals * log1p_residuals).mean(axis=-1),
+        "mape": (absolute_errors / np.maximum(np.abs(y_actual), np.finfo(np.float64).eps)).mean(axis=-1),
+        "medae": np.median(absolute_errors, axis=-1),
+        "gamma_deviance": (2 * (-log_ratio + y_actual / y_forecast - 1)).mean(axis=-1),
+        "poisson_deviance": (2 * (y_actual * log_ratio - residuals)).mean(axis=-1),
+        # sklearn's default tweedie power of 0 is the normal deviance, i.e. the squared error
+        "tweedie_deviance": mse,
+        "explained_variance": score(residual_variance, total_variance),
+        "max_error": absolute_errors.max(axis=-1),
+        "r2": score(mse, total_variance)
+    }
+    return {METRIC_NAMES[key]: value for key, value in metrics.items()}
+
+
+def score(numerator, denominator):
+    # sklearn: a perfect fit on constant actuals scores 1.0, an imperfect one 0.0
+    numerator, denominator = np.broadcast_arrays(numerator, denominator)
+    result = np.ones(numerator.shape)
+    valid = denominator != 0
+    result[valid] = 1 - numerator[valid] / denominator[valid]
+    result[~valid & (numerator != 0)] = 0.0
+    return result
+
+
+def compute_metrics(y_actual, y_forecast) -> dict:
+    return {key: float(value[0]) for key, value in compute_metrics_batch(y_actual, y_forecast).items()}
@@ -0,0 +1,95 @@
+import logging
+import os
+import sys
+import time
+
+import pandas as pd
+from pandas import DataFrame
+
+
+def configure_logging(level: int = logging.INFO, stream=sys.stdout):
+    # diagnostics that used to be printed are emitted at DEBUG; progress and results at INFO
+    logging.basicConfig(level=level, stream=stream, format="%(message)s", force=True)
+
+
+class ArtifactSink:
+    # discards artifacts; subclasses decide where forecasts, decompositions and metrics end up
+    def write(self, name: str, frame: DataFrame):
+        pass
+
+    def flush(self):
+        pass
+
+
+class CsvArtifactSink(ArtifactSink):
+    # one CSV per artifact, as the simulators have always written to output/
+    def __init__(self, directory: str = "output"):
+        self.directory = directory
+
+    def write(self, name: str, frame: DataFrame):
+        frame.to_csv(os.path.join(self.directory, f"{name}.csv"))
+
+
+class BatchArtifactSink(ArtifactSink):
+    # collects every artifact of a run in memory and writes a single file on flush
+    def __init__(self, directory: str = "output", run_id: str = None):
+        self.directory = directory
+        self.run_id = run_id or time.strftime("%Y%m%d_%H%M%S")
+        self.frames = []
+
+    def write(self, name: str, frame: DataFrame):
+        frame = frame.reset_index(drop=True)
+        frame.insert(0, "artifact", name)
+        frame.insert(1, "row", range(len(frame)))
+        self.frames.append(frame)
+
+    def flush(self) -> str:
+        if not self.frames:
+            return None
+        frame = pd.concat(self.frames, ignore_index=True, sort=False)
+        self.frames = []
+        os.makedirs(self.directory, exist_ok=True)
+        output_file = os.path.join(self.directory, f"run_{self.run_id}.parquet")
+        try:
+            frame.to_parquet(output_file, index=False)
+        except ImportError:
+            # no parquet engine installed
+            output_file = os.path.join(self.directory, f"run_{self.run_id}.csv.gz")
+            frame.to_csv(output_file, index=False)
+        return output_file
+
+
+class SimulationResult:
+    def __init__(self, model_name: str = None, currency_pair: str = None, forecast_horizon: int = 0,
+                 forecasts: DataFrame = None, metrics: dict = None, model_reused: bool = False,
+                 timings: dict = None, hyperparameters: dict = None, data_version: str = None):
+        self.model_name = model_name
+        self.currency_pair = currency_pair
+        self.forecast_horizon = forecast_horizon
+        self.forecasts = forecasts
+        self.metrics = metrics
+        self.model_reused = model_reused
+        self.timings = timings if timings is not None else {}
+        self.hyperparameters = hyperparameters if hyperparameters is not None else {}
+        # window hash of the training data the model was fitted on
+        self.data_version = data_version
+
+    def to_dict(self):
+        return {
+            "model_name": self.model_name,
+            "currency_pair": self.currency_pair,
+            "forecast_horizon": self.forecast_horizon,
+            "model_reused": self.model_reused,
+            "metrics": self.metrics,
+            "timings": self.timings,
+            "hyperparameters": self.hyperparameters,
+            "data_version": self.data_version,
+            "forecasts": list(self.forecasts["forecast"]),
+            "errors": list(self.forecasts["error"]),
+            "forecasts_lower": list(self.forecasts["forecast_lower"]),
+            "forecasts_upper": list(self.forecasts["forecast_upper"])
+        }
+
+    def __repr__(self):
+        return str({key: value for key, value in self.to_dict().items()
+                    if not key.startswith("forecasts") and key != "timings"})
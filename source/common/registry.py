@@ -0,0 +1,97 @@
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+from pandas import DataFrame
+
+
+class ModelRegistry:
+    def __init__(self, registry_directory: str = "intermediates/models", max_bytes: int = 2 << 30):
+        self.registry_directory = registry_directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(registry_directory, exist_ok=True)
+
+    @staticmethod
+    def window_hash(training_data: DataFrame) -> str:
+        digest = hashlib.sha256()
+        for column in ["date", "close"]:
+            if column in training_data:
+                digest.update(training_data[column].to_numpy().tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(model_type: str, currency_pair: str, hyperparameters: dict, window_hash: str) -> str:
+        description = json.dumps({"model": model_type, "pair": currency_pair, "params": hyperparameters,
+                                  "window": window_hash}, sort_keys=True, default=str)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def model_file(self, key: str) -> str:
+        return os.path.join(self.registry_directory, f"{key}.pkl")
+
+    def get(self, key: str):
+        model_file = self.model_file(key)
+        try:
+            with open(model_file, "rb") as file:
+                model = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        # eviction is least-recently-used on mtime
+        try:
+            os.utime(model_file)
+        except OSError:
+            pass
+        return model
+
+    def put(self, key: str, model):
+        # write to a private file first; os.replace makes the entry visible atomically
+        handle, staging = tempfile.mkstemp(dir=self.registry_directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                pickle.dump(model, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(staging, self.model_file(key))
+        except Exception:
+            if os.path.exists(staging):
+                os.remove(staging)
+            raise
+        self.evict()
+
+    def fit(self, key: str, fit_function):
+        model = self.get(key)
+        if model is not None:
+            self.hits += 1
+            return model, True
+        self.misses += 1
+        model = fit_function()
+        self.put(key, model)
+        return model, False
+
+    def evict(self):
+        with open(os.path.join(self.registry_directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                entries = []
+                for name in os.listdir(self.registry_directory):
+                    if not name.endswith(".pkl"):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(self.registry_directory, name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, name))
+
+                total_size = sum(size for _, size, _ in entries)
+                for _, size, name in sorted(entries):
+                    if total_size <= self.max_bytes:
+                        break
+                    try:
+                        os.remove(os.path.join(self.registry_directory, name))
+                    except OSError:
+                        pass
+                    total_size -= size
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
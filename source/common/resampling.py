@@ -0,0 +1,119 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from source.common.registry import ModelRegistry
+
+# bar length, decomposition period, AutoARIMA m and Prophet future-date step per resolution. Daily keeps today's
+# behaviour: the period is inferred from the dates, m=12 and Prophet's default daily future dates
+TIMEFRAMES = {
+    "hourly": {"duration": pd.Timedelta(hours=1), "seasonal_period": 24, "arima_m": 24,
+               "prophet_frequency": pd.Timedelta(hours=1)},
+    "daily": {"duration": pd.Timedelta(days=1), "seasonal_period": None, "arima_m": 12, "prophet_frequency": None},
+    # weeks end on Friday, the last FX trading day
+    "weekly": {"duration": pd.Timedelta(days=7), "seasonal_period": 52, "arima_m": 4,
+               "prophet_frequency": pd.offsets.Week(weekday=4)},
+}
+AGGREGATES = {"open": "first", "high": "max", "low": "min", "close": "last"}
+
+
+def bin_labels(dates: pd.Series, timeframe: str) -> pd.Series:
+    # hourly and daily bins are labelled by their start, weekly ones by their Friday
+    if timeframe == "weekly":
+        return dates.dt.normalize() + pd.to_timedelta((4 - dates.dt.dayofweek) % 7, unit="D")
+    return dates.dt.floor(TIMEFRAMES[timeframe]["duration"])
+
+
+def resample_bars(trading_data: DataFrame, timeframe: str, previous_close: float = None) -> DataFrame:
+    # OHLC of every non-empty bin and its percent change against the previous bin's close. Before the first bin that
+    # close is implied by the first source bar's own change
+    labels = bin_labels(trading_data["date"], timeframe)
+    bars = trading_data[list(AGGREGATES)].groupby(labels.to_numpy()).agg(AGGREGATES)
+    if previous_close is None and len(trading_data):
+        previous_close = trading_data["close"].iloc[0] / (1 + trading_data["percent_change"].iloc[0] / 100)
+
+    closes = bars["close"].to_numpy()
+    previous = np.concatenate([[previous_close], closes[:-1]]) if len(closes) else closes
+    return DataFrame({"date": bars.index, "open": bars["open"].to_numpy(), "high": bars["high"].to_numpy(),
+                      "low": bars["low"].to_numpy(), "close": closes, "percent_change": (closes / previous - 1) * 100})
+
+
+class TimeframeSeries:
+    # one pair's base bars and every aggregate level computed from them so far
+    def __init__(self, trading_data: DataFrame = None):
+        self.trading_data = trading_data.reset_index(drop=True)
+        self.bar_duration = TimeframeSeries.median_spacing(self.trading_data)
+        self.levels = {}
+        self.version = ModelRegistry.window_hash(self.trading_data)
+
+    @staticmethod
+    def median_spacing(trading_data: DataFrame) -> pd.Timedelta:
+        dates = trading_data["date"].to_numpy()
+        return pd.Timedelta(np.median(np.diff(dates))) if len(dates) > 1 else pd.Timedelta(0)
+
+    def level(self, timeframe: str) -> DataFrame:
+        if timeframe not in TIMEFRAMES:
+            raise ValueError(f"Unknown timeframe: {timeframe}")
+        duration = TIMEFRAMES[timeframe]["duration"]
+        if self.bar_duration > duration:
+            raise ValueError(f"Cannot resample {self.bar_duration} bars to the finer {timeframe} timeframe")
+        if self.bar_duration == duration:
+            # already at this resolution
+            return self.trading_data
+        if timeframe not in self.levels:
+            self.levels[timeframe] = resample_bars(self.trading_data, timeframe)
+        return self.levels[timeframe]
+
+    def append(self, new_bars: DataFrame):
+        # only the last, possibly partial, bin of each level is recomputed, together with the bins the new bars open
+        first = len(self.trading_data)
+        self.trading_data = pd.concat([self.trading_data, new_bars], ignore_index=True)
+        self.version = ModelRegistry.window_hash(self.trading_data)
+        for timeframe, bars in self.levels.items():
+            if first == 0 or len(bars) == 0:
+                self.levels[timeframe] = resample_bars(self.trading_data, timeframe)
+                continue
+            start = TimeframeSeries.bin_start(timeframe, bars)
+            kept = bars[bars["date"] < bars["date"].iloc[-1]]
+            tail = self.trading_data[self.trading_data["date"] >= start]
+            previous_close = kept["close"].iloc[-1] if len(kept) else None
+            self.levels[timeframe] = pd.concat([kept, resample_bars(tail, timeframe, previous_close)],
+                                               ignore_index=True)
+
+    @staticmethod
+    def bin_start(timeframe: str, bars: DataFrame) -> pd.Timestamp:
+        # a weekly bin runs from the Saturday after the previous Friday
+        label = bars["date"].iloc[-1]
+        return label - pd.Timedelta(days=6) if timeframe == "weekly" else label
+
+
+class TimeframeCache:
+    # currency pair -> TimeframeSeries; shared by every simulator of the process, like DecompositionStage
+    series = OrderedDict()
+    max_entries = 64
+
+    @staticmethod
+    def level(currency_pair: str, trading_data: DataFrame, timeframe: str) -> DataFrame:
+        entry = TimeframeCache.series.get(currency_pair)
+        if entry is not None and entry.version != ModelRegistry.window_hash(trading_data):
+            known = len(entry.trading_data)
+            # the same history with bars appended extends the cached levels; anything else starts over
+            if len(trading_data) > known > 0 and \
+                    trading_data["date"].iloc[known - 1] == entry.trading_data["date"].iloc[-1] and \
+                    trading_data["close"].iloc[known - 1] == entry.trading_data["close"].iloc[-1]:
+                entry.append(trading_data.iloc[known:])
+            else:
+                entry = None
+        if entry is None:
+            entry = TimeframeSeries(trading_data)
+        TimeframeCache.series[currency_pair] = entry
+        TimeframeCache.series.move_to_end(currency_pair)
+        while len(TimeframeCache.series) > TimeframeCache.max_entries:
+            TimeframeCache.series.popitem(last=False)
+        return entry.level(timeframe)
+
+    @staticmethod
+    def clear():
+        TimeframeCache.series.clear()
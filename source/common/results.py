@@ -0,0 +1,176 @@
+import json
+import os
+import sqlite3
+import time
+
+import pandas as pd
+from pandas import DataFrame
+
+from source.common.runner import ForecastResult
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    settings TEXT
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL REFERENCES runs (run_id),
+    currency_pair TEXT NOT NULL,
+    model TEXT NOT NULL,
+    forecast_horizon INTEGER NOT NULL,
+    holdout INTEGER,
+    data_version TEXT,
+    status TEXT NOT NULL,
+    duration REAL,
+    model_reused INTEGER,
+    created REAL NOT NULL,
+    hyperparameters TEXT,
+    timings TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_series ON jobs (currency_pair, model, forecast_horizon, created);
+CREATE INDEX IF NOT EXISTS jobs_by_run ON jobs (run_id);
+CREATE INDEX IF NOT EXISTS jobs_by_data_version ON jobs (data_version);
+CREATE TABLE IF NOT EXISTS metrics (
+    job_id INTEGER NOT NULL REFERENCES jobs (job_id),
+    metric TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (job_id, metric)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS metrics_by_name ON metrics (metric, job_id, value);
+CREATE TABLE IF NOT EXISTS forecasts (
+    job_id INTEGER NOT NULL REFERENCES jobs (job_id),
+    step INTEGER NOT NULL,
+    forecast REAL,
+    error REAL,
+    forecast_lower REAL,
+    forecast_upper REAL,
+    PRIMARY KEY (job_id, step)
+) WITHOUT ROWID;
+"""
+# SimulationResult.to_dict keys of the forecast columns, in forecasts table order
+FORECAST_KEYS = ["forecasts", "errors", "forecasts_lower", "forecasts_upper"]
+
+
+class ResultsStore:
+    # one SQLite file in WAL mode: readers never block the writer, and concurrent writers
+    # (one connection per process) queue on the write lock for up to `timeout` seconds
+    def __init__(self, database_file: str = "intermediates/results.sqlite", timeout: float = 60.0):
+        self.database_file = database_file
+        self.timeout = timeout
+        self.connection = None
+        self.pid = None
+        directory = os.path.dirname(database_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connect().executescript(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        # a connection must not cross a fork; forked workers open their own
+        if self.connection is None or self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.database_file, timeout=self.timeout)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("PRAGMA foreign_keys=ON")
+            self.pid = os.getpid()
+        return self.connection
+
+    def add_run(self, run_id: str, settings: dict = None):
+        with self.connect() as connection:
+            connection.execute("INSERT OR IGNORE INTO runs (run_id, created, settings) VALUES (?, ?, ?)",
+                               (run_id, time.time(), json.dumps(settings or {}, default=str)))
+
+    def insert(self, run_id: str, results: list) -> list:
+        # every ForecastResult of a batch in one transaction; returns the new job ids
+        self.add_run(run_id)
+        created = time.time()
+        with self.connect() as connection:
+            return [ResultsStore.insert_result(connection, run_id, result, created) for result in results]
+
+    @staticmethod
+    def insert_result(connection: sqlite3.Connection, run_id: str, result: ForecastResult, created: float) -> int:
+        job, output = result.job, result.output
+        cursor = connection.execute(
+            "INSERT INTO jobs (run_id, currency_pair, model, forecast_horizon, holdout, data_version, status, "
+            "duration, model_reused, created, hyperparameters, timings, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, job.currency_pair, getattr(job.model, "name", str(job.model)), job.forecast_horizon,
+             job.holdout, output.get("data_version"), result.status, result.duration,
+             None if "model_reused" not in output else int(output["model_reused"]), created,
+             json.dumps(output.get("hyperparameters", {}), default=str),
+             json.dumps(output.get("timings", {}), default=str), result.error))
+        job_id = cursor.lastrowid
+
+        connection.executemany("INSERT INTO metrics (job_id, metric, value) VALUES (?, ?, ?)",
+                               [(job_id, metric, float(value)) for metric, value in result.metrics.items()])
+        if "forecasts" in output:
+            columns = [output.get(key) or [None] * len(output["forecasts"]) for key in FORECAST_KEYS]
+            connection.executemany(
+                "INSERT INTO forecasts (job_id, step, forecast, error, forecast_lower, forecast_upper) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(job_id, step, *[None if value is None else float(value) for value in row])
+                 for step, row in enumerate(zip(*columns), start=1)])
+        return job_id
+
+    def query(self, sql: str, parameters: list = None) -> DataFrame:
+        return pd.read_sql_query(sql, self.connect(), params=parameters or [])
+
+    @staticmethod
+    def filters(currency_pair: str = None, model: str = None, forecast_horizon: int = None, run_id: str = None,
+                data_version: str = None) -> tuple:
+        clauses, parameters = ["jobs.status = 'ok'"], []
+        for column, value in [("currency_pair", currency_pair), ("model", model),
+                              ("forecast_horizon", forecast_horizon), ("run_id", run_id),
+                              ("data_version", data_version)]:
+            if value is not None:
+                clauses.append(f"jobs.{column} = ?")
+                parameters.append(value)
+        return " AND ".join(clauses), parameters
+
+    def leaderboard(self, metric: str = "Mean Absolute Error (MAE)", currency_pair: str = None,
+                    forecast_horizon: int = None, run_id: str = None, data_version: str = None,
+                    ascending: bool = True, limit: int = None) -> DataFrame:
+        # models ranked per pair and horizon on their mean `metric`; pass ascending=False for scores like R^2
+        where, parameters = ResultsStore.filters(currency_pair, None, forecast_horizon, run_id, data_version)
+        order = "ASC" if ascending else "DESC"
+        sql = ("SELECT jobs.currency_pair, jobs.forecast_horizon, jobs.model, AVG(metrics.value) AS value, "
+               "MIN(metrics.value) AS minimum, MAX(metrics.value) AS maximum, COUNT(*) AS runs, "
+               "MAX(jobs.created) AS last_run "
+               "FROM metrics JOIN jobs ON jobs.job_id = metrics.job_id "
+               f"WHERE metrics.metric = ? AND {where} "
+               "GROUP BY jobs.currency_pair, jobs.forecast_horizon, jobs.model "
+               f"ORDER BY jobs.currency_pair, jobs.forecast_horizon, value {order}")
+        board = self.query(sql, [metric] + parameters)
+        board.insert(3, "rank", board.groupby(["currency_pair", "forecast_horizon"]).cumcount() + 1)
+        board["last_run"] = pd.to_datetime(board["last_run"], unit="s")
+        return board[board["rank"] <= limit].reset_index(drop=True) if limit is not None else board
+
+    def metric_history(self, metric: str = "Mean Absolute Error (MAE)", currency_pair: str = None, model: str = None,
+                       forecast_horizon: int = None) -> DataFrame:
+        # one row per successful job, oldest first; served by the (pair, model, horizon, created) index
+        where, parameters = ResultsStore.filters(currency_pair, model, forecast_horizon)
+        sql = ("SELECT jobs.created, jobs.run_id, jobs.job_id, jobs.currency_pair, jobs.model, jobs.forecast_horizon, "
+               "jobs.data_version, metrics.value "
+               "FROM jobs JOIN metrics ON metrics.job_id = jobs.job_id AND metrics.metric = ? "
+               f"WHERE {where} ORDER BY jobs.created, jobs.job_id")
+        history = self.query(sql, [metric] + parameters)
+        history["created"] = pd.to_datetime(history["created"], unit="s")
+        return history
+
+    def forecasts(self, job_id: int) -> DataFrame:
+        return self.query("SELECT step, forecast, error, forecast_lower, forecast_upper FROM forecasts "
+                          "WHERE job_id = ? ORDER BY step", [job_id])
+
+    def jobs(self, currency_pair: str = None, model: str = None, forecast_horizon: int = None, run_id: str = None,
+             data_version: str = None) -> DataFrame:
+        where, parameters = ResultsStore.filters(currency_pair, model, forecast_horizon, run_id, data_version)
+        return self.query("SELECT job_id, run_id, currency_pair, model, forecast_horizon, holdout, data_version, "
+                          f"duration, model_reused, created, hyperparameters FROM jobs WHERE {where} "
+                          "ORDER BY created, job_id", parameters)
+
+    def close(self):
+        if self.connection is not None and self.pid == os.getpid():
+            self.connection.close()
+        self.connection = None
@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import time
+import traceback
+from multiprocessing.connection import wait
+
+from pandas import DataFrame
+
+
+class ForecastJob:
+    def __init__(self, model=None, currency_pair: str = None, forecast_horizon: int = 96, holdout: int = None):
+        self.model = model
+        self.currency_pair = currency_pair
+        self.forecast_horizon = forecast_horizon
+        self.holdout = holdout
+
+    def to_dict(self):
+        return {
+            "model": getattr(self.model, "name", self.model),
+            "currency_pair": self.currency_pair,
+            "forecast_horizon": self.forecast_horizon,
+            "holdout": self.holdout
+        }
+
+    def __repr__(self):
+        return str(self.to_dict())
+
+
+class ForecastResult:
+    def __init__(self, job: ForecastJob = None, status: str = "ok", output: dict = None, error: str = None,
+                 duration: float = 0.0):
+        self.job = job
+        self.status = status
+        self.output = output if output is not None else {}
+        self.error = error
+        self.duration = duration
+
+    @property
+    def succeeded(self):
+        return self.status == "ok"
+
+    @property
+    def metrics(self):
+        return self.output.get("metrics", {})
+
+    @property
+    def timings(self):
+        return self.output.get("timings", {})
+
+    def to_dict(self):
+        return {**self.job.to_dict(), "status": self.status, "duration": self.duration, "error": self.error}
+
+    def __repr__(self):
+        return str(self.to_dict())
+
+
+class ExperimentRunner:
+    # populated before any worker is forked, so children read it copy-on-write
+    datasets = {}
+
+    def __init__(self, target=None, workers: int = None, timeout: float = None):
+        self.target = target
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+
+    @staticmethod
+    def load(currency_pair: str, trading_data: DataFrame):
+        ExperimentRunner.datasets[currency_pair] = trading_data
+
+    @staticmethod
+    def execute(target, job: ForecastJob, connection):
+        start = time.perf_counter()
+        try:
+            output = target(job, ExperimentRunner.datasets[job.currency_pair])
+            connection.send(("ok", output, None, time.perf_counter() - start))
+        except Exception:
+            connection.send(("error", None, traceback.format_exc(), time.perf_counter() - start))
+        finally:
+            connection.close()
+
+    def run(self, jobs: list) -> list:
+        context = multiprocessing.get_context("fork")
+        pending = list(enumerate(jobs))
+        running = {}
+        results = [None] * len(jobs)
+
+        while pending or running:
+            while pending and len(running) < self.workers:
+                index, job = pending.pop(0)
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=ExperimentRunner.execute, args=(self.target, job, sender))
+                process.start()
+                sender.close()
+                running[receiver] = (index, job, process, time.perf_counter())
+
+            wait(list(running.keys()), timeout=self.next_deadline(running))
+
+            now = time.perf_counter()
+            for receiver in list(running.keys()):
+                index, job, process, started = running[receiver]
+                if receiver.poll():
+                    try:
+                        status, output, error, duration = receiver.recv()
+                    except EOFError:
+                        process.join()
+                        status, output, error, duration = "error", None, \
+                            f"worker exited with code {process.exitcode}", now - started
+                    results[index] = ForecastResult(job, status, output, error, duration)
+                elif self.timeout is not None and now - started >= self.timeout:
+                    process.terminate()
+                    results[index] = ForecastResult(job, "timeout", None,
+                                                    f"timed out after {self.timeout:0.1f}s", now - started)
+                else:
+                    continue
+                process.join()
+                receiver.close()
+                del running[receiver]
+        return results
+
+    def next_deadline(self, running: dict):
+        if self.timeout is None:
+            return None
+        now = time.perf_counter()
+        return max(0.0, min(started + self.timeout - now for _, _, _, started in running.values()))
@@ -0,0 +1,185 @@
+import numpy as np
+from pandas import DataFrame
+
+QUANTILES = [0.005, 0.025, 0.05, 0.25, 0.5, 0.75, 0.95, 0.975, 0.995]
+CONFIDENCE_LEVELS = [0.95, 0.99]
+
+
+class ScenarioModel:
+    # one pair's fitted recursion, on the scale the model was fitted on:
+    #   y[t] = constant + sum(ar[i] * y[t-1-i]) + e[t] + sum(ma[j] * e[t-1-j]),  e[t] = sqrt(h[t]) * z[t]
+    #   h[t] = omega + sum(alpha[i] * e[t-1-i] ** 2) + sum(beta[j] * h[t-1-j])
+    # GARCH fits it to prices directly; ARIMA to Box-Cox prices, with the differencing folded into ar
+    # and alpha = beta = 0
+    def __init__(self, constant: float = 0.0, ar=(), ma=(), omega: float = 0.0, alpha=(), beta=(), y=None,
+                 residuals=None, variance=None, boxcox_lambda: float = None, boxcox_shift: float = 0.0):
+        self.constant = float(constant)
+        self.ar = np.asarray(ar, dtype=np.float64).ravel()
+        self.ma = np.asarray(ma, dtype=np.float64).ravel()
+        self.omega = float(omega)
+        self.alpha = np.asarray(alpha, dtype=np.float64).ravel()
+        self.beta = np.asarray(beta, dtype=np.float64).ravel()
+        # in-sample history; only the last few values seed the recursion
+        self.y = np.asarray(y, dtype=np.float64).ravel()
+        self.residuals = np.asarray(residuals if residuals is not None else np.zeros(len(self.y)),
+                                    dtype=np.float64).ravel()
+        self.variance = np.asarray(variance if variance is not None else np.full(len(self.y), self.omega),
+                                   dtype=np.float64).ravel()
+        self.boxcox_lambda = boxcox_lambda
+        self.boxcox_shift = boxcox_shift
+
+    def to_price(self, values: np.ndarray) -> np.ndarray:
+        # inverse of pmdarima's BoxCoxEndogTransformer: boxcox(price + shift, lambda)
+        if self.boxcox_lambda is None:
+            return values
+        if self.boxcox_lambda == 0:
+            return np.exp(values) - self.boxcox_shift
+        with np.errstate(invalid="ignore"):
+            return np.maximum(values * self.boxcox_lambda + 1, 0) ** (1 / self.boxcox_lambda) - self.boxcox_shift
+
+    @property
+    def last_price(self) -> float:
+        return float(self.to_price(self.y[-1:])[0])
+
+    def __repr__(self):
+        return f"ScenarioModel(ar={len(self.ar)}, ma={len(self.ma)}, alpha={len(self.alpha)}, beta={len(self.beta)})"
+
+
+def tail(values: np.ndarray, size: int) -> np.ndarray:
+    # the last `size` values, zero-padded in front when the history is shorter
+    values = values[len(values) - size:] if size else values[:0]
+    return np.concatenate([np.zeros(size - len(values)), values])
+
+
+class ScenarioResult:
+    def __init__(self, currency_pair: str = None, forecast_horizon: int = 0, paths: int = 0, last_price: float = None,
+                 bands: DataFrame = None, risk: dict = None):
+        self.currency_pair = currency_pair
+        self.forecast_horizon = forecast_horizon
+        self.paths = paths
+        self.last_price = last_price
+        # step, mean and one column per quantile of the simulated price
+        self.bands = bands
+        # value at risk and expected shortfall of the horizon return, as positive loss fractions
+        self.risk = risk if risk is not None else {}
+
+    def to_dict(self):
+        return {
+            "currency_pair": self.currency_pair,
+            "forecast_horizon": self.forecast_horizon,
+            "paths": self.paths,
+            "last_price": self.last_price,
+            "risk": self.risk,
+            "bands": self.bands.to_dict(orient="list")
+        }
+
+    def __repr__(self):
+        return str({key: value for key, value in self.to_dict().items() if key != "bands"})
+
+
+class ScenarioEngine:
+    def __init__(self, paths: int = 10000, quantiles: list = None, confidence_levels: list = None, seed: int = None,
+                 max_bytes: int = 512 * 2 ** 20):
+        self.paths = paths
+        self.quantiles = quantiles if quantiles is not None else QUANTILES
+        self.confidence_levels = confidence_levels if confidence_levels is not None else CONFIDENCE_LEVELS
+        self.seed = seed
+        # working-set budget: pairs are simulated in batches that fit in it
+        self.max_bytes = max_bytes
+
+    def batch_size(self, forecast_horizon: int, lags: int) -> int:
+        # price, residual, variance and shock arrays of paths x (lags + horizon) floats per pair
+        return max(1, self.max_bytes // (4 * 8 * self.paths * (forecast_horizon + lags)))
+
+    def simulate_paths(self, models: dict, forecast_horizon: int = 100):
+        # yields (currency pairs, prices of shape pairs x horizon x paths) batch by batch
+        currency_pairs = list(models.keys())
+        # one stream per pair, so a pair's paths do not depend on how the pairs are batched
+        streams = np.random.SeedSequence(self.seed).spawn(len(currency_pairs))
+        lags = max([len(model.ar) + len(model.ma) + len(model.alpha) + len(model.beta) for model in models.values()]
+                   or [0])
+        size = self.batch_size(forecast_horizon, lags)
+        for start in range(0, len(currency_pairs), size):
+            batch = currency_pairs[start:start + size]
+            shocks = np.stack([np.random.default_rng(streams[start + index]).standard_normal(
+                (forecast_horizon, self.paths)) for index in range(len(batch))])
+            yield batch, ScenarioEngine.recurse([models[currency_pair] for currency_pair in batch], shocks)
+
+    @staticmethod
+    def recurse(models: list, shocks: np.ndarray) -> np.ndarray:
+        # every pair and path advances together; only the horizon and the non-zero lags are Python loops.
+        # Time-major (pairs, time, paths) arrays keep each lag term one contiguous block
+        # shocks: pairs x horizon x paths
+        count, horizon, paths = shocks.shape
+        p, q = max(len(model.ar) for model in models), max(len(model.ma) for model in models)
+        a, b = max(len(model.alpha) for model in models), max(len(model.beta) for model in models)
+        r = max(q, a)
+
+        def coefficients(name: str, size: int) -> list:
+            # (offset into the history window, per-pair coefficient) for lags that are non-zero for some pair;
+            # seasonal ARIMA recursions are mostly zeros
+            values = np.stack([tail(getattr(model, name)[::-1], size) for model in models]).reshape(count, size)
+            return [(offset, values[:, offset, None]) for offset in range(size) if values[:, offset].any()]
+
+        ar, ma, alpha, beta = coefficients("ar", p), coefficients("ma", q), coefficients("alpha", a), \
+            coefficients("beta", b)
+        constant = np.array([model.constant for model in models])[:, None]
+        omega = np.array([model.omega for model in models])[:, None]
+
+        y = np.empty((count, p + horizon, paths))
+        residuals = np.empty((count, r + horizon, paths))
+        variance = np.empty((count, b + horizon, paths))
+        y[:, :p] = np.stack([tail(model.y, p) for model in models])[:, :, None]
+        residuals[:, :r] = np.stack([tail(model.residuals, r) for model in models])[:, :, None]
+        variance[:, :b] = np.stack([tail(model.variance, b) for model in models])[:, :, None]
+
+        for t in range(horizon):
+            h = np.repeat(omega, paths, axis=1)
+            for offset, coefficient in alpha:
+                h += coefficient * residuals[:, r + t - a + offset] ** 2
+            for offset, coefficient in beta:
+                h += coefficient * variance[:, t + offset]
+            e = np.sqrt(h) * shocks[:, t]
+            value = constant + e
+            for offset, coefficient in ar:
+                value += coefficient * y[:, t + offset]
+            for offset, coefficient in ma:
+                value += coefficient * residuals[:, r + t - q + offset]
+            y[:, p + t] = value
+            residuals[:, r + t] = e
+            variance[:, b + t] = h
+
+        prices = y[:, p:]
+        for index, model in enumerate(models):
+            prices[index] = model.to_price(prices[index])
+        return prices
+
+    def summarise(self, currency_pair: str, model: ScenarioModel, prices: np.ndarray) -> ScenarioResult:
+        # prices: horizon x paths for one pair. One sort per step serves every quantile (linear interpolation,
+        # as np.quantile) and the tail losses, and is several times faster than np.quantile's partitions
+        ordered = np.sort(prices, axis=1)
+        position = np.asarray(self.quantiles) * (ordered.shape[1] - 1)
+        lower = np.floor(position).astype(int)
+        upper = np.minimum(lower + 1, ordered.shape[1] - 1)
+        bands = DataFrame(ordered[:, lower] * (1 - (position - lower)) + ordered[:, upper] * (position - lower),
+                          columns=[f"q{q:g}" for q in self.quantiles])
+        bands.insert(0, "mean", prices.mean(axis=1))
+        bands.insert(0, "step", np.arange(1, len(prices) + 1))
+
+        last_price = model.last_price
+        losses = (1 - ordered[-1] / last_price)[::-1]
+        risk = {}
+        for level in self.confidence_levels:
+            # expected shortfall: the mean of the worst (1 - level) share of horizon losses
+            worst = max(1, int(np.ceil((1 - level) * len(losses))))
+            risk[f"var_{level:g}"] = float(np.quantile(losses, level))
+            risk[f"es_{level:g}"] = float(losses[-worst:].mean())
+        return ScenarioResult(currency_pair, prices.shape[0], prices.shape[1], last_price, bands, risk)
+
+    def simulate(self, models: dict, forecast_horizon: int = 100) -> dict:
+        # currency pair -> ScenarioResult; the paths themselves are dropped batch by batch
+        results = {}
+        for currency_pairs, prices in self.simulate_paths(models, forecast_horizon):
+            for index, currency_pair in enumerate(currency_pairs):
+                results[currency_pair] = self.summarise(currency_pair, models[currency_pair], prices[index])
+        return results
@@ -0,0 +1,145 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from pandas import DataFrame
+
+from source.common.registry import ModelRegistry
+from source.common.runner import ForecastJob, ForecastResult
+
+
+class ForecastService:
+    # registered before the pool forks, so workers read the frames copy-on-write
+    datasets = {}
+
+    def __init__(self, target=None, workers: int = None, ttl: float = 300.0, max_entries: int = 256,
+                 timeout: float = None, latency_window: int = 1000):
+        # target(job, trading_data) -> dict, as for ExperimentRunner (application.run_forecast)
+        self.target = target
+        self.workers = workers or os.cpu_count() or 1
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.versions = {}
+        self.executor = None
+        self.cache = OrderedDict()
+        self.in_flight = {}
+        self.latencies = deque(maxlen=latency_window)
+        self.counters = {"requests": 0, "cache_hits": 0, "coalesced": 0, "fits": 0, "errors": 0}
+
+    def load(self, currency_pair: str, trading_data: DataFrame) -> str:
+        version = ModelRegistry.window_hash(trading_data)
+        if self.versions.get(currency_pair) == version:
+            return version
+        ForecastService.datasets[currency_pair] = trading_data
+        self.versions[currency_pair] = version
+        # workers forked before this update hold the old frame; running fits finish, new ones get a fresh pool
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        return version
+
+    @staticmethod
+    def execute(target, job: ForecastJob) -> tuple:
+        start = time.perf_counter()
+        try:
+            return "ok", target(job, ForecastService.datasets[job.currency_pair]), None, time.perf_counter() - start
+        except Exception:
+            return "error", None, traceback.format_exc(), time.perf_counter() - start
+
+    def key(self, job: ForecastJob) -> tuple:
+        if job.currency_pair not in self.versions:
+            raise KeyError(f"No trading data loaded for currency-pair: {job.currency_pair}")
+        return (getattr(job.model, "name", job.model), job.currency_pair, job.forecast_horizon, job.holdout,
+                self.versions[job.currency_pair])
+
+    def cached(self, key: tuple):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if expires < time.monotonic():
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return result
+
+    def remember(self, key: tuple, result: ForecastResult):
+        self.cache[key] = (time.monotonic() + self.ttl, result)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+    async def forecast(self, job: ForecastJob) -> ForecastResult:
+        start = time.perf_counter()
+        self.counters["requests"] += 1
+        key = self.key(job)
+        try:
+            result = self.cached(key)
+            if result is not None:
+                self.counters["cache_hits"] += 1
+                return result
+
+            # identical requests arriving while a fit runs wait on that fit instead of starting another
+            pending = self.in_flight.get(key)
+            if pending is not None:
+                self.counters["coalesced"] += 1
+                return await asyncio.shield(pending)
+
+            pending = asyncio.ensure_future(self.fit(job, key))
+            self.in_flight[key] = pending
+            return await asyncio.shield(pending)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    async def fit(self, job: ForecastJob, key: tuple) -> ForecastResult:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("fork"))
+        loop = asyncio.get_running_loop()
+        self.counters["fits"] += 1
+        try:
+            status, output, error, duration = await asyncio.wait_for(
+                loop.run_in_executor(self.executor, ForecastService.execute, self.target, job), self.timeout)
+        except asyncio.TimeoutError:
+            # the worker keeps running; its late result is discarded
+            status, output, error, duration = "timeout", None, f"timed out after {self.timeout:0.1f}s", self.timeout
+        finally:
+            self.in_flight.pop(key, None)
+
+        result = ForecastResult(job, status, output, error, duration)
+        if result.succeeded:
+            self.remember(key, result)
+        else:
+            self.counters["errors"] += 1
+        return result
+
+    async def forecast_many(self, jobs: list) -> list:
+        return await asyncio.gather(*[self.forecast(job) for job in jobs])
+
+    def stats(self) -> dict:
+        # in-flight fits beyond the worker count are waiting in the executor queue
+        stats = {**self.counters, "in_flight": len(self.in_flight),
+                 "queue_depth": max(0, len(self.in_flight) - self.workers), "cached": len(self.cache)}
+        if self.latencies:
+            values = np.array(self.latencies) * 1000
+            stats.update({"mean_ms": float(values.mean()), "p50_ms": float(np.percentile(values, 50)),
+                          "p95_ms": float(np.percentile(values, 95)), "p99_ms": float(np.percentile(values, 99)),
+                          "max_ms": float(values.max())})
+        return stats
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
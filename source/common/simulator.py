@@ -1,20 +1,46 @@
+import io
+import logging
 from datetime import datetime
 
 import pandas as pd
-import sklearn.metrics as learn
-from matplotlib import pyplot as plt
 from pandas import DataFrame
-from statsmodels.tsa.seasonal import seasonal_decompose
+
+from source.common.decomposition import DecompositionStage
+from source.common.instrumentation import StageTimings
+from source.common.metrics import compute_metrics
+from source.common.output import ArtifactSink, CsvArtifactSink, SimulationResult
+from source.common.registry import ModelRegistry
+from source.common.resampling import TIMEFRAMES, TimeframeCache
+from source.common.scenarios import ScenarioEngine, ScenarioResult
+from source.common.series import ForexSeries
+
+logger = logging.getLogger(__name__)
 
 
 class Simulator:
+    # how update_model extends a fit: "refit", "update" (in place) or "warm_start"
+    update_strategy = "refit"
+
     def __init__(self, trading_data: DataFrame = None, currency_pair: str = None,
-                 model_name: str = None):
+                 model_name: str = None, registry: ModelRegistry = None, holdout: int = None,
+                 sink: ArtifactSink = None, timeframe: str = None):
         self.model_name = model_name
-        self.trading_data = trading_data
-        self.training_data = None
-        self.validation_data = None
         self.currency_pair = currency_pair
+        # None uses the bars as loaded; "hourly"/"daily"/"weekly" the cached aggregate of that resolution
+        self.timeframe = timeframe
+        # a series the parent already resampled (application.run_experiments) is used as it is
+        if timeframe is not None and getattr(trading_data, "timeframe", None) != timeframe:
+            frame = trading_data.to_frame() if isinstance(trading_data, ForexSeries) else trading_data
+            trading_data = TimeframeCache.level(currency_pair, frame, timeframe)
+        # the bars live in one ForexSeries; the training and validation windows are views on it and become frames
+        # only where a backend reads them (training_data/validation_data)
+        self.series = None
+        self.trading_frame = None
+        self.trading_data = trading_data
+        self.training_series = None
+        self.validation_series = None
+        self.training_frame = None
+        self.validation_frame = None
         self.forecasts = []
         self.forecasts_upper = []
         self.forecasts_lower = []
@@ -22,75 +48,178 @@ class Simulator:
         self.metrics = None
         self.forecasts_raw = []
         self.decomposition = None
+        # None infers the period from the dates, as seasonal_decompose does
+        self.seasonal_period = TIMEFRAMES[timeframe]["seasonal_period"] if timeframe is not None else None
+        self.decomposition_model = "additive"
         self.forecast_horizon = 0
-
-    def forecast(self, forecast_horizon: int = 100):
-        training_data_size = self.trading_data.size - forecast_horizon
-        self.training_data = self.trading_data.head(training_data_size)
-        self.validation_data = self.trading_data.tail(forecast_horizon)
+        self.model = None
+        self.model_reused = False
+        self.registry = registry
+        # rows held back from training; horizons up to the holdout then share one training window
+        self.holdout = holdout
+        # None keeps the per-call CSVs in output/; ArtifactSink() writes nothing, BatchArtifactSink one file per run
+        self.sink = sink if sink is not None else CsvArtifactSink("output")
+        # per-stage time/memory and model counters; set timings.profiler to profile run()
+        self.timings = StageTimings()
+
+    @property
+    def trading_data(self) -> DataFrame:
+        # the caller's frame when one was given, otherwise built from the series on first use
+        if self.trading_frame is None and self.series is not None:
+            self.trading_frame = self.series.to_frame()
+        return self.trading_frame
+
+    @trading_data.setter
+    def trading_data(self, trading_data):
+        if isinstance(trading_data, ForexSeries):
+            self.series, self.trading_frame = trading_data, None
+        else:
+            self.series = ForexSeries.from_frame(trading_data, self.currency_pair) if trading_data is not None \
+                else None
+            self.trading_frame = trading_data
+
+    @property
+    def training_data(self) -> DataFrame:
+        if self.training_frame is None and self.training_series is not None:
+            self.training_frame = self.training_series.to_frame()
+        return self.training_frame
+
+    @training_data.setter
+    def training_data(self, training_data: DataFrame):
+        self.training_series = ForexSeries.from_frame(training_data) if training_data is not None else None
+        self.training_frame = training_data
+
+    @property
+    def validation_data(self) -> DataFrame:
+        if self.validation_frame is None and self.validation_series is not None:
+            self.validation_frame = self.validation_series.to_frame()
+        return self.validation_frame
+
+    @validation_data.setter
+    def validation_data(self, validation_data: DataFrame):
+        self.validation_series = ForexSeries.from_frame(validation_data) if validation_data is not None else None
+        self.validation_frame = validation_data
+
+    def split_dataset(self, forecast_horizon: int = 100):
+        with self.timings.stage("split"):
+            # slices of the series: nothing is copied until a backend asks for a frame
+            self.training_series, self.validation_series = self.series.split(forecast_horizon, self.holdout)
+            self.training_frame, self.validation_frame = None, None
         self.forecast_horizon = forecast_horizon
 
-        # decompose time-series for trend and seasonality
-        time_series = pd.DataFrame(self.training_data, columns=["date", "close"])
-        time_series['date'] = pd.to_datetime(time_series['date'])
-        time_series.sort_values('date', inplace=True)
-        time_series.set_index('date', inplace=True)
+    def hyperparameters(self) -> dict:
+        return {}
+
+    def fit_model(self, training_data: DataFrame):
+        raise NotImplementedError(f"{self.model_name} does not implement fit_model")
+
+    def predict_model(self, model, forecast_horizon: int) -> DataFrame:
+        raise NotImplementedError(f"{self.model_name} does not implement predict_model")
+
+    def update_model(self, model, training_data: DataFrame, new_data: DataFrame):
+        # backends that can extend a fitted model return it here; None means refit from scratch
+        return None
+
+    def model_counters(self, model) -> dict:
+        # backend-specific facts about a fitted model (order chosen, optimizer iterations, ...)
+        return {}
+
+    def scenario_model(self, model):
+        # the fitted recursion as a ScenarioModel, for backends whose parameters define one
+        raise NotImplementedError(f"{self.model_name} does not implement scenario_model")
+
+    def interval_label(self) -> str:
+        # what forecast_lower/upper are, for the plot legend
+        return "forecast interval"
+
+    def fit(self, training_data: DataFrame):
+        with self.timings.stage("fit"):
+            if self.registry is None:
+                self.model = self.fit_model(training_data)
+                self.model_reused = False
+            else:
+                key = ModelRegistry.make_key(self.model_name, self.currency_pair, self.hyperparameters(),
+                                             ModelRegistry.window_hash(training_data))
+                self.model, self.model_reused = self.registry.fit(key, lambda: self.fit_model(training_data))
+        self.timings.record("model_reused", self.model_reused)
+        for name, value in self.model_counters(self.model).items():
+            self.timings.record(name, value)
+        return self.model
+
+    def predict(self, model, forecast_horizon: int) -> DataFrame:
+        with self.timings.stage("predict"):
+            return self.predict_model(model, forecast_horizon)
+
+    def collate(self, collated_results: DataFrame):
+        self.forecasts = collated_results["forecast"]
+        self.errors = collated_results["error"]
+        self.forecasts_lower = collated_results["forecast_lower"]
+        self.forecasts_upper = collated_results["forecast_upper"]
+        self.forecasts_raw = collated_results
 
-        raw_decomposition = seasonal_decompose(time_series)
-        decomposition = DataFrame.from_records(
-            [{"trend": trend, "residual": residual, "seasonality": seasonality} for trend, residual, seasonality in
-             zip(raw_decomposition.trend, raw_decomposition.resid, raw_decomposition.seasonal)])
-        self.decomposition = decomposition
-
-        print("\n\ndata_frame preview:")
-        print(self.training_data.head())
-        print(self.training_data.tail())
-
-        print("\n\ndata_frame shape:")
-        print(self.training_data.shape)
+    def forecast(self, forecast_horizon: int = 100):
+        self.split_dataset(forecast_horizon)
 
-        print("\n\ndata_frame summary:")
-        print(self.training_data.describe())
-        print(self.training_data.info())
+        # decompose time-series for trend and seasonality; shared by every model on the same window
+        with self.timings.stage("decomposition"):
+            decomposition = DecompositionStage.decompose(self.currency_pair, self.training_data,
+                                                         self.seasonal_period, self.decomposition_model)
+        self.decomposition = decomposition
 
-        print("\n\ndata_frame trend/residual/seasonality:")
-        print(self.decomposition)
-        decomposition.to_csv(f"output/{self.currency_pair}__{self.model_name.lower()}__trend_seasonality.csv")
-        print("\n\n")
+        # describe()/info() are only worth computing when somebody reads them
+        if logger.isEnabledFor(logging.DEBUG):
+            self.log_diagnostics()
+        self.write_artifact("trend_seasonality", decomposition)
+
+    def log_diagnostics(self):
+        with self.timings.stage("diagnostics"):
+            summary = io.StringIO()
+            self.training_data.info(buf=summary)
+            logger.debug("data_frame preview:\n%s\n%s", self.training_data.head(), self.training_data.tail())
+            logger.debug("data_frame shape: %s", self.training_data.shape)
+            logger.debug("data_frame summary:\n%s\n%s", self.training_data.describe(), summary.getvalue())
+            logger.debug("data_frame trend/residual/seasonality:\n%s", self.decomposition)
+
+    def write_artifact(self, kind: str, frame: DataFrame, forecast_horizon: int = None):
+        horizon = "" if forecast_horizon is None else f"{forecast_horizon}__"
+        with self.timings.stage("output"):
+            self.sink.write(f"{self.currency_pair}__{self.model_name.lower()}__{horizon}{kind}", frame)
+
+    def scenarios(self, engine: ScenarioEngine = None, forecast_horizon: int = None) -> ScenarioResult:
+        # simulated price paths of the fitted model, summarised as quantile bands, VaR and expected shortfall
+        engine = engine if engine is not None else ScenarioEngine()
+        forecast_horizon = forecast_horizon or self.forecast_horizon
+        with self.timings.stage("scenarios"):
+            result = engine.simulate({self.currency_pair: self.scenario_model(self.model)},
+                                     forecast_horizon)[self.currency_pair]
+        self.write_artifact("scenarios", result.bands, forecast_horizon)
+        return result
+
+    def run(self, forecast_horizon: int = 100) -> SimulationResult:
+        # forecast and evaluate, under the profiler when timings.profiler is set
+        with self.timings.profile():
+            self.forecast(forecast_horizon)
+            self.evaluate_forecast()
+        return self.result()
+
+    def result(self) -> SimulationResult:
+        data_version = ModelRegistry.window_hash(self.training_data) if self.training_data is not None else None
+        return SimulationResult(self.model_name, self.currency_pair, self.forecast_horizon, self.forecasts_raw,
+                                self.metrics, self.model_reused, self.timings.to_dict(), self.hyperparameters(),
+                                data_version)
 
     def evaluate_forecast(self):
-        n = min(len(self.validation_data), len(self.forecasts))
+        n = min(len(self.validation_series), len(self.forecasts))
         y_forecast = self.forecasts[:n]
-        y_actual = self.validation_data.tail(n)["close"]
-
-        mean_abs_err = learn.mean_absolute_error(y_actual, y_forecast)
-        mean_sq_err = learn.mean_squared_error(y_actual, y_forecast)
-        mean_sq_lg_err = learn.mean_squared_log_error(y_actual, y_forecast)
-        mean_abs_percent_err = learn.mean_absolute_percentage_error(y_actual, y_forecast)
-        median_abs_err = learn.median_absolute_error(y_actual, y_forecast)
-        mean_gamma_dev = learn.mean_gamma_deviance(y_actual, y_forecast)
-        mean_poisson_dev = learn.mean_poisson_deviance(y_actual, y_forecast)
-        mean_tweedie_dev = learn.mean_tweedie_deviance(y_actual, y_forecast)
-        explained_variance = learn.explained_variance_score(y_actual, y_forecast)
-        max_residual = learn.max_error(y_actual, y_forecast)
-        coeff_determination = learn.r2_score(y_actual, y_forecast)
-
-        metrics = {
-            "Mean Squared Error (MSE)": mean_sq_err,
-            "Mean Absolute Error (MAE)": mean_abs_err,
-            "Mean Squared Logarithmic Error (MSLE)": mean_sq_lg_err,
-            "Mean Absolute Percentage Error (MAPE)": mean_abs_percent_err,
-            "Median Absolute Error (MedAE)": median_abs_err,
-            "Mean Gamma Deviance": mean_gamma_dev,
-            "Mean Poisson Deviance": mean_poisson_dev,
-            "Mean Tweedie Deviance Error": mean_tweedie_dev,
-            "Explained Variance Regression Score": explained_variance,
-            "Max Residual Error": max_residual,
-            "Coefficient of Determination": coeff_determination
-        }
+        y_actual = self.validation_series.tail(n).close
+
+        with self.timings.stage("metrics"):
+            metrics = compute_metrics(y_actual, y_forecast)
         self.metrics = metrics
 
     def plot_source_dataset(self):
+        from matplotlib import pyplot as plt
+
         sub_set = self.validation_data
         forecast_horizon = len(self.forecasts)
         x = pd.date_range(end=datetime.strptime("2021-05-14", "%Y-%m-%d"), periods=forecast_horizon, freq='B').tolist()
@@ -103,7 +232,7 @@ class Simulator:
         ax.plot(x, y_real, c='blue', linewidth=2, label="actual price")
         ax.plot(x, y_forecast, c='green', linewidth=2, label="forecast price")
         ax.fill_between(x, y_forecast_lower, y_forecast_upper, color='k', alpha=0.2,
-                        label="95% confidence interval")
+                        label=self.interval_label())
 
         ax.set(xlabel="Date", ylabel="Closing Price",
                title="{}: {} Model - Actual vs Forecast Closing Price".format(self.currency_pair.upper(),
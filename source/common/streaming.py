@@ -0,0 +1,201 @@
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+from pandas import DataFrame
+
+from source.common.data import ForexData
+from source.common.simulator import Simulator
+
+FIELDS = ["open", "high", "low", "close"]
+
+
+class RollingWindow:
+    # the latest `capacity` bars of one pair; storage is twice the capacity so appends shift rarely
+    def __init__(self, capacity: int = 500):
+        self.capacity = capacity
+        self.dates = np.empty(2 * capacity, dtype="datetime64[ns]")
+        self.values = np.empty((2 * capacity, len(FIELDS)), dtype=np.float64)
+        self.percent_change = np.empty(2 * capacity, dtype=np.float64)
+        self.start = 0
+        self.end = 0
+        self.total = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def append(self, record: ForexData):
+        if self.end == len(self.dates):
+            size = len(self)
+            self.dates[:size] = self.dates[self.start:self.end]
+            self.values[:size] = self.values[self.start:self.end]
+            self.percent_change[:size] = self.percent_change[self.start:self.end]
+            self.start, self.end = 0, size
+        self.dates[self.end] = np.datetime64(record.date, "ns")
+        self.values[self.end] = [record.open, record.high, record.low, record.close]
+        self.percent_change[self.end] = record.percent_change
+        self.end += 1
+        self.total += 1
+        if len(self) > self.capacity:
+            self.start += 1
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.values[self.start:self.end, 3]
+
+    def frame(self, last: int = None) -> DataFrame:
+        start = self.start if last is None else max(self.start, self.end - last)
+        frame = DataFrame(self.values[start:self.end], columns=FIELDS)
+        frame.insert(0, "date", self.dates[start:self.end])
+        frame["percent_change"] = self.percent_change[start:self.end]
+        return frame
+
+
+class IncrementalDecomposition:
+    # additive moving-average decomposition (as statsmodels' seasonal_decompose) updated one bar at a time
+    def __init__(self, period: int = 5):
+        self.period = period
+        if period % 2 == 0:
+            self.weights = np.array([0.5] + [1.0] * (period - 1) + [0.5]) / period
+        else:
+            self.weights = np.repeat(1.0 / period, period)
+        self.half = len(self.weights) // 2
+        self.phase_sums = np.zeros(period)
+        self.phase_counts = np.zeros(period)
+        self.detrended = {}
+        self.trend = {}
+        self.indices = deque()
+
+    def update(self, window: RollingWindow):
+        close = window.close
+        first_index = window.total - len(close)
+
+        # a new bar completes the centred average `half` bars back
+        position = len(close) - 1 - self.half
+        if position >= self.half:
+            index = first_index + position
+            trend = float(np.dot(self.weights, close[position - self.half:position + self.half + 1]))
+            self.trend[index] = trend
+            self.detrended[index] = close[position] - trend
+            self.phase_sums[index % self.period] += self.detrended[index]
+            self.phase_counts[index % self.period] += 1
+            self.indices.append(index)
+
+        # bars that left the window stop contributing to the seasonal averages
+        while self.indices and self.indices[0] < first_index:
+            index = self.indices.popleft()
+            self.phase_sums[index % self.period] -= self.detrended.pop(index)
+            self.phase_counts[index % self.period] -= 1
+            del self.trend[index]
+
+    @property
+    def seasonal_profile(self) -> np.ndarray:
+        with np.errstate(invalid="ignore"):
+            averages = self.phase_sums / self.phase_counts
+        return averages - np.nanmean(averages) if np.isfinite(averages).any() else averages
+
+    def frame(self, window: RollingWindow) -> DataFrame:
+        close = window.close
+        first_index = window.total - len(close)
+        indices = np.arange(first_index, window.total)
+        trend = np.array([self.trend.get(index, np.nan) for index in indices])
+        seasonality = self.seasonal_profile[indices % self.period]
+        return DataFrame({"trend": trend, "residual": close - trend - seasonality, "seasonality": seasonality})
+
+
+class StreamingForecaster:
+    def __init__(self, simulators: dict = None, forecast_horizon: int = 5, window: int = 500, period: int = 5,
+                 min_history: int = 100, update_every: int = 1, callback=None):
+        # simulators: currency-pair -> Simulator whose trading_data seeds the window
+        self.simulators = simulators if simulators is not None else {}
+        self.forecast_horizon = forecast_horizon
+        self.window_size = window
+        self.period = period
+        self.min_history = min_history
+        # bars between model updates; GARCH and Prophet refit (warm-started) on every update
+        self.update_every = update_every
+        self.callback = callback
+        self.windows = {}
+        self.decompositions = {}
+        self.models = {}
+        self.pending = {}
+        self.latencies = {}
+
+    def add_pair(self, currency_pair: str, simulator: Simulator):
+        self.simulators[currency_pair] = simulator
+
+    def state(self, currency_pair: str):
+        if currency_pair not in self.windows:
+            window = RollingWindow(self.window_size)
+            decomposition = IncrementalDecomposition(self.period)
+            simulator = self.simulators[currency_pair]
+            if simulator.series is not None:
+                # ForexData records of the series' view, with the full timestamp of intraday bars
+                for record in simulator.series.tail(self.window_size):
+                    window.append(record)
+                    decomposition.update(window)
+            self.windows[currency_pair] = window
+            self.decompositions[currency_pair] = decomposition
+            self.pending[currency_pair] = 0
+            self.latencies[currency_pair] = []
+        return self.windows[currency_pair], self.decompositions[currency_pair]
+
+    def push(self, currency_pair: str, record):
+        start = time.perf_counter()
+        if isinstance(record, str):
+            record = ForexData.from_string(record.strip())
+        window, decomposition = self.state(currency_pair)
+        window.append(record)
+        decomposition.update(window)
+        self.pending[currency_pair] += 1
+
+        if len(window) < self.min_history or self.pending[currency_pair] < self.update_every:
+            return None
+
+        simulator = self.simulators[currency_pair]
+        model = self.models.get(currency_pair)
+        new_bars = self.pending[currency_pair]
+        if model is not None:
+            model = simulator.update_model(model, window.frame(), window.frame(last=new_bars))
+        if model is None:
+            model = simulator.fit_model(window.frame())
+        self.models[currency_pair] = model
+        self.pending[currency_pair] = 0
+
+        forecasts = simulator.predict_model(model, self.forecast_horizon)
+        latency = time.perf_counter() - start
+        self.latencies[currency_pair].append(latency)
+        update = {"currency_pair": currency_pair, "date": record.date, "forecasts": forecasts,
+                  "decomposition": decomposition.frame(window), "latency": latency}
+        if self.callback is not None:
+            self.callback(update)
+        return update
+
+    def consume(self, records):
+        # records: iterable of (currency_pair, ForexData or raw CSV line)
+        for currency_pair, record in records:
+            self.push(currency_pair, record)
+
+    async def run(self, queue: asyncio.Queue):
+        # a None item stops the consumer; model updates run off the event loop
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    break
+                await loop.run_in_executor(None, self.push, *item)
+            finally:
+                queue.task_done()
+
+    def latency_stats(self) -> dict:
+        stats = {}
+        for currency_pair, latencies in self.latencies.items():
+            if not latencies:
+                continue
+            values = np.array(latencies) * 1000
+            stats[currency_pair] = {"updates": len(values), "mean_ms": float(values.mean()),
+                                    "p50_ms": float(np.percentile(values, 50)),
+                                    "p95_ms": float(np.percentile(values, 95)), "max_ms": float(values.max())}
+        return stats
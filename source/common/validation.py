@@ -0,0 +1,304 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from numpy import float64
+from pandas import DataFrame
+
+from source.common.cache import DatasetCache
+
+# same layout as io.FRAME_COLUMNS; io imports this module, not the other way round
+FRAME_COLUMNS = ["date", "open", "high", "low", "close", "percent_change"]
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+# applied in this order; "fill" adds flat bars on missing business days and is off by default
+REPAIRS = ["sort", "deduplicate", "ohlc", "clip", "fill"]
+DEFAULT_REPAIRS = ["sort", "deduplicate", "ohlc", "clip"]
+# investing.com rounds the change to two decimals
+PERCENT_TOLERANCE = 0.01
+
+logger = logging.getLogger(__name__)
+
+
+class ValidationReport:
+    def __init__(self, data_file: str = None, rows: int = 0, checks: dict = None, repairs: dict = None,
+                 rows_out: int = 0, first_date=None, last_date=None, seconds: float = 0.0):
+        self.data_file = data_file
+        self.rows = rows
+        # issue -> rows (or intervals) affected in the input
+        self.checks = checks if checks is not None else {}
+        # repair -> rows changed, added or removed
+        self.repairs = repairs if repairs is not None else {}
+        self.rows_out = rows_out
+        self.first_date = first_date
+        self.last_date = last_date
+        self.seconds = seconds
+
+    @property
+    def clean(self):
+        return not any(self.checks.values())
+
+    def to_dict(self):
+        return {
+            "data_file": self.data_file,
+            "rows": self.rows,
+            "rows_out": self.rows_out,
+            "first_date": str(self.first_date),
+            "last_date": str(self.last_date),
+            "checks": self.checks,
+            "repairs": self.repairs,
+            "seconds": self.seconds
+        }
+
+    @staticmethod
+    def from_dict(values: dict):
+        return ValidationReport(values["data_file"], values["rows"], values["checks"], values["repairs"],
+                                values["rows_out"], values["first_date"], values["last_date"], values["seconds"])
+
+    def __repr__(self):
+        found = {key: value for key, value in self.checks.items() if value}
+        applied = {key: value for key, value in self.repairs.items() if value}
+        return f"{os.path.basename(self.data_file or '')}: {self.rows} -> {self.rows_out} rows, " \
+               f"issues {found or 'none'}, repairs {applied or 'none'}"
+
+
+class DataValidator:
+    def __init__(self, repairs: list = None, spike_threshold: float = 10.0):
+        unknown = set(repairs or []) - set(REPAIRS)
+        if unknown:
+            raise ValueError(f"Unknown repairs: {', '.join(sorted(unknown))}")
+        self.repairs = [repair for repair in REPAIRS if repair in (DEFAULT_REPAIRS if repairs is None else repairs)]
+        # robust z-score (median / MAD of log returns) above which a bar counts as a spike
+        self.spike_threshold = spike_threshold
+
+    def version(self) -> str:
+        # validated datasets are cached per configuration
+        settings = json.dumps({"repairs": self.repairs, "spike_threshold": self.spike_threshold}, sort_keys=True)
+        return hashlib.sha1(settings.encode()).hexdigest()[:12]
+
+    @staticmethod
+    def daily(dates: np.ndarray) -> bool:
+        steps = np.diff(dates)
+        return len(steps) == 0 or np.median(steps) >= np.timedelta64(1, "D")
+
+    def spikes(self, prices: np.ndarray) -> tuple:
+        # prices: rows x PRICE_COLUMNS in date order. A close spike is a big move into a bar that is reversed by a
+        # big move out of it; a wick spike is a high or low far outside the bar's body. Returns both masks and the
+        # (center, scale) of the log returns
+        with np.errstate(divide="ignore", invalid="ignore"):
+            logs = np.log(np.where(prices > 0, prices, np.nan))
+        returns = np.diff(logs[:, 3])
+        valid = returns[np.isfinite(returns)]
+        if len(valid) < 3:
+            return np.zeros(len(prices), bool), np.zeros(len(prices), bool), 0.0, 0.0
+        center = float(np.median(valid))
+        scale = 1.4826 * float(np.median(np.abs(valid - center))) or float(valid.std()) or 1.0
+        limit = self.spike_threshold * scale
+
+        big = np.abs(returns - center) > limit
+        closes = np.zeros(len(prices), bool)
+        closes[1:-1] = big[:-1] & big[1:] & (np.sign(returns[:-1]) != np.sign(returns[1:]))
+        body_high = np.fmax(logs[:, 0], logs[:, 3])
+        body_low = np.fmin(logs[:, 0], logs[:, 3])
+        with np.errstate(invalid="ignore"):
+            wicks = (logs[:, 1] - body_high > limit) | (body_low - logs[:, 2] > limit)
+        return closes, wicks & ~closes, center, scale
+
+    def check(self, frame: DataFrame) -> dict:
+        # every check over the whole column set at once; nothing is modified
+        dates = frame["date"].to_numpy(dtype="datetime64[ns]")
+        prices = frame[PRICE_COLUMNS].to_numpy(dtype=float64)
+        order = np.argsort(dates, kind="stable")
+        ordered = dates[order]
+        distinct = np.concatenate([[True], ordered[1:] != ordered[:-1]]) if len(ordered) else np.zeros(0, bool)
+        days = ordered[distinct].astype("datetime64[D]")
+
+        opens, highs, lows, closes = prices.T
+        inverted = highs < lows
+        outside = ~inverted & ((opens > highs) | (opens < lows) | (closes > highs) | (closes < lows))
+        close_spikes, wick_spikes, _, _ = self.spikes(prices[order][distinct])
+
+        if DataValidator.daily(ordered):
+            # business days with no bar between two consecutive bars; weekends never count
+            missing = np.maximum(np.busday_count(days[:-1], days[1:]) - 1, 0)
+        else:
+            # intraday: bars missing from pauses inside the trading week
+            unique = ordered[distinct]
+            steps = np.diff(unique)
+            spacing = np.median(steps) if len(steps) else np.timedelta64(1, "s")
+            weekday_span = np.busday_count(days[:-1], days[1:]) == (days[1:] - days[:-1]).astype(int)
+            missing = np.where(weekday_span & (steps > 2 * spacing), np.rint(steps / spacing).astype(int) - 1, 0)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            implied = (closes[order][1:] / closes[order][:-1] - 1) * 100
+        reported = frame["percent_change"].to_numpy(dtype=float64)[order][1:]
+        return {
+            "non_monotonic": int((np.diff(dates) < np.timedelta64(0)).sum()),
+            "duplicated_dates": int((~distinct).sum()),
+            "weekend_bars": int((~np.is_busday(dates.astype("datetime64[D]"))).sum()),
+            "gaps": int((missing > 0).sum()),
+            "missing_bars": int(missing.sum()),
+            "high_below_low": int(inverted.sum()),
+            "outside_range": int(outside.sum()),
+            "non_positive": int((prices <= 0).any(axis=1).sum()),
+            "close_spikes": int(close_spikes.sum()),
+            "wick_spikes": int(wick_spikes.sum()),
+            "percent_change_mismatch": int((~(np.abs(implied - reported) <= PERCENT_TOLERANCE)).sum())
+        }
+
+    def repair(self, frame: DataFrame) -> tuple:
+        # returns the repaired frame and repair -> rows changed
+        repaired = {}
+        dates = frame["date"].to_numpy(dtype="datetime64[ns]")
+        prices = frame[PRICE_COLUMNS].to_numpy(dtype=float64, copy=True)
+        percent = frame["percent_change"].to_numpy(dtype=float64, copy=True)
+
+        if "sort" in self.repairs:
+            order = np.argsort(dates, kind="stable")
+            repaired["sort"] = int((np.diff(dates) < np.timedelta64(0)).sum())
+            dates, prices, percent = dates[order], prices[order], percent[order]
+        if "deduplicate" in self.repairs:
+            # the last row for a date wins: exports append corrections
+            keep = np.concatenate([dates[1:] != dates[:-1], [True]]) if len(dates) else np.zeros(0, bool)
+            if "sort" not in self.repairs:
+                keep = ~pd.Series(dates).duplicated(keep="last").to_numpy()
+            repaired["deduplicate"] = int((~keep).sum())
+            dates, prices, percent = dates[keep], prices[keep], percent[keep]
+        if "ohlc" in self.repairs:
+            positive = (prices > 0).all(axis=1)
+            dates, prices, percent = dates[positive], prices[positive], percent[positive]
+            before = prices.copy()
+            prices[:, 1] = prices.max(axis=1)
+            prices[:, 2] = prices.min(axis=1)
+            repaired["ohlc"] = int((~positive).sum() + (prices != before).any(axis=1).sum())
+        if "clip" in self.repairs:
+            close_spikes, wick_spikes, center, scale = self.spikes(prices)
+            limit = self.spike_threshold * scale
+            if close_spikes.any():
+                # a spiking bar is pulled into the band the threshold allows around the previous close
+                previous = prices[np.flatnonzero(close_spikes) - 1, 3][:, None]
+                prices[close_spikes] = np.clip(prices[close_spikes], previous * np.exp(center - limit),
+                                               previous * np.exp(center + limit))
+            if wick_spikes.any():
+                body = prices[wick_spikes][:, [0, 3]]
+                prices[wick_spikes, 1] = np.minimum(prices[wick_spikes, 1], body.max(axis=1) * np.exp(limit))
+                prices[wick_spikes, 2] = np.maximum(prices[wick_spikes, 2], body.min(axis=1) * np.exp(-limit))
+            repaired["clip"] = int(close_spikes.sum() + wick_spikes.sum())
+
+        repaired_frame = DataFrame({"date": dates, "open": prices[:, 0], "high": prices[:, 1], "low": prices[:, 2],
+                                    "close": prices[:, 3], "percent_change": percent})
+        if "fill" in self.repairs:
+            repaired_frame, repaired["fill"] = DataValidator.fill_calendar(repaired_frame)
+
+        if any(repaired.values()):
+            # changes of rows whose own or previous bar moved follow the repaired closes
+            closes = repaired_frame["close"].to_numpy()
+            percent = repaired_frame["percent_change"].to_numpy(dtype=float64, copy=True)
+            implied = (closes[1:] / closes[:-1] - 1) * 100
+            stale = ~(np.abs(implied - percent[1:]) <= PERCENT_TOLERANCE)
+            percent[1:][stale] = np.round(implied[stale], 2)
+            repaired_frame["percent_change"] = percent
+            repaired["percent_change"] = int(stale.sum())
+        return repaired_frame[FRAME_COLUMNS], repaired
+
+    @staticmethod
+    def fill_calendar(frame: DataFrame) -> tuple:
+        # daily bars only: every missing business day becomes a flat bar at the previous close
+        dates = frame["date"]
+        if len(frame) < 2 or not DataValidator.daily(dates.to_numpy()) or dates.duplicated().any() or \
+                not dates.is_monotonic_increasing:
+            return frame, 0
+        calendar = pd.DatetimeIndex(dates).union(pd.bdate_range(dates.iloc[0], dates.iloc[-1]))
+        filled = frame.set_index("date").reindex(calendar)
+        added = filled["close"].isna().to_numpy()
+        if not added.any():
+            return frame, 0
+        filled["close"] = filled["close"].ffill()
+        for column in ["open", "high", "low"]:
+            filled[column] = filled[column].fillna(filled["close"])
+        filled["percent_change"] = filled["percent_change"].fillna(0.0)
+        filled = filled.rename_axis("date").reset_index()
+        filled["date"] = filled["date"].astype(frame["date"].dtype)
+        return filled, int(added.sum())
+
+    def validate(self, frame: DataFrame, data_file: str = None) -> tuple:
+        start = time.perf_counter()
+        checks = self.check(frame)
+        repaired, repairs = self.repair(frame) if self.repairs else (frame, {})
+        dates = repaired["date"]
+        report = ValidationReport(data_file, len(frame), checks, repairs, len(repaired),
+                                  dates.iloc[0] if len(dates) else None, dates.iloc[-1] if len(dates) else None,
+                                  time.perf_counter() - start)
+        if not report.clean:
+            logger.warning("Data quality: %s", report)
+        return repaired, report
+
+
+class ValidationStage:
+    # validated frames are cached like raw ones (DatasetCache, keyed by file fingerprint), one cache per validator
+    # configuration; the report of each file is kept next to its entry
+    def __init__(self, validator: DataValidator = None, cache_directory: str = "intermediates/validated",
+                 max_entries: int = 32):
+        self.validator = validator or DataValidator()
+        self.cache = DatasetCache(os.path.join(cache_directory, self.validator.version()), max_entries) \
+            if cache_directory else None
+        self.reports = {}
+
+    def report_file(self, path: str) -> str:
+        return f"{self.cache.entry_directory(path)}.report.json"
+
+    def load(self, data_file: str, parser) -> DataFrame:
+        fingerprint = DatasetCache.fingerprint(data_file)
+        path = fingerprint["path"]
+        if self.cache is None:
+            return self.apply(parser(data_file), data_file)
+
+        fresh = {}
+
+        def validate(filename: str) -> DataFrame:
+            frame, fresh["report"] = self.validator.validate(parser(filename), data_file)
+            self.write_report(fingerprint, fresh["report"])
+            return frame
+
+        frame = self.cache.load(data_file, validate)
+        report = fresh.get("report") or self.read_report(fingerprint)
+        if report is None:
+            # the entry outlived its report: validate again
+            frame, report = self.validator.validate(parser(data_file), data_file)
+            self.write_report(fingerprint, report)
+        self.reports[path] = report
+        return frame
+
+    def apply(self, frame: DataFrame, data_file: str = None) -> DataFrame:
+        # uncached, e.g. for a date window read in chunks
+        frame, report = self.validator.validate(frame, data_file)
+        self.reports[os.path.abspath(data_file) if data_file else None] = report
+        return frame
+
+    def read_report(self, fingerprint: dict):
+        try:
+            with open(self.report_file(fingerprint["path"])) as file:
+                values = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if values.get("size") != fingerprint["size"]:
+            return None
+        return ValidationReport.from_dict(values["report"])
+
+    def write_report(self, fingerprint: dict, report: ValidationReport):
+        report_file = self.report_file(fingerprint["path"])
+        os.makedirs(os.path.dirname(report_file), exist_ok=True)
+        staging = f"{report_file}.{os.getpid()}.tmp"
+        with open(staging, "w") as file:
+            json.dump({"size": fingerprint["size"], "report": report.to_dict()}, file, default=str)
+        os.replace(staging, report_file)
+
+    def report_frame(self) -> DataFrame:
+        # one row per file: the counts of every check and repair
+        return DataFrame([{"data_file": os.path.basename(report.data_file or ""), "rows": report.rows,
+                           "rows_out": report.rows_out, **report.checks,
+                           **{f"repaired_{key}": value for key, value in report.repairs.items()}}
+                          for report in self.reports.values()])
@@ -0,0 +1,163 @@
+import logging
+import multiprocessing
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from pandas import DataFrame
+
+from source.common.metrics import compute_metrics
+from source.common.output import ArtifactSink
+from source.common.registry import ModelRegistry
+from source.common.simulator import Simulator
+
+WEIGHTINGS = ["equal", "inverse_error", "stacked"]
+BAND_COLUMNS = ["forecast", "error", "forecast_lower", "forecast_upper"]
+
+logger = logging.getLogger(__name__)
+
+
+class EnsembleSimulator(Simulator):
+    # members are registered before the pool forks, so workers read them copy-on-write
+    members = {}
+
+    def __init__(self, members: list = None, trading_data: DataFrame = None, currency_pair: str = None,
+                 weighting: str = "equal", registry: ModelRegistry = None, holdout: int = None,
+                 sink: ArtifactSink = None, workers: int = None, weight_steps: int = None, timeframe: str = None):
+        super().__init__(trading_data, currency_pair, "Ensemble", registry, holdout, sink, timeframe)
+        if weighting not in WEIGHTINGS:
+            raise ValueError(f"Unknown ensemble weighting: {weighting}")
+        # ARIMA/GARCH/Prophet simulators on the same data; each keeps its own registry and sink
+        self.member_simulators = members or []
+        self.weighting = weighting
+        self.workers = workers or min(len(self.member_simulators), os.cpu_count() or 1)
+        # leading validation steps the inverse-error and stacked weights are fitted on (None: half the horizon);
+        # the metrics score only the steps after them
+        self.weight_steps = weight_steps
+        self.member_names = []
+        # members x horizon x BAND_COLUMNS, the only input of combine()
+        self.bands = np.empty((0, 0, len(BAND_COLUMNS)))
+        self.weights = None
+
+    def hyperparameters(self) -> dict:
+        return {"members": [member.model_name for member in self.member_simulators], "weighting": self.weighting,
+                "weight_steps": self.weight_steps}
+
+    @staticmethod
+    def forecast_member(key: tuple, forecast_horizon: int) -> dict:
+        member = EnsembleSimulator.members[key]
+        try:
+            member.forecast(forecast_horizon)
+            # batched artifacts would otherwise stay in the worker
+            return {"bands": member.forecasts_raw[BAND_COLUMNS].reset_index(drop=True),
+                    "model_reused": member.model_reused, "timings": member.timings.to_dict(),
+                    "artifacts": getattr(member.sink, "frames", None), "error": None}
+        except Exception:
+            return {"error": traceback.format_exc()}
+
+    def run_members(self, forecast_horizon: int) -> list:
+        keys = []
+        for index, member in enumerate(self.member_simulators):
+            # one split for everybody: the ensemble's holdout decides the training window
+            member.holdout = self.holdout
+            key = (self.currency_pair, index)
+            EnsembleSimulator.members[key] = member
+            keys.append(key)
+
+        if self.workers <= 1:
+            return [EnsembleSimulator.forecast_member(key, forecast_horizon) for key in keys]
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+            futures = [executor.submit(EnsembleSimulator.forecast_member, key, forecast_horizon) for key in keys]
+            return [future.result() for future in futures]
+
+    def forecast(self, forecast_horizon: int = 100):
+        super().forecast(forecast_horizon)
+        logger.info("Running Ensemble forecast for Currency-pair: %s using forecast horizon: %s",
+                    self.currency_pair.upper(), forecast_horizon)
+
+        # every member fits (or reuses from its registry) exactly once, concurrently
+        with self.timings.stage("fit"):
+            outputs = self.run_members(forecast_horizon)
+
+        names, bands = [], []
+        for index, (member, output) in enumerate(zip(self.member_simulators, outputs)):
+            name = member.model_name.lower()
+            name = f"{name}_{index}" if name in names else name
+            if output["error"] is not None:
+                logger.error("Ensemble member %s failed for %s:\n%s", member.model_name, self.currency_pair,
+                             output["error"])
+                continue
+            if output["artifacts"] is not None and member.sink.frames is not output["artifacts"]:
+                member.sink.frames.extend(output["artifacts"])
+            self.timings.record(f"{name}_model_reused", output["model_reused"])
+            fit_stage = output["timings"]["stages"].get("fit", {})
+            self.timings.record(f"{name}_fit_seconds", fit_stage.get("seconds", 0.0))
+            names.append(name)
+            bands.append(output["bands"].to_numpy(dtype=np.float64)[:forecast_horizon])
+        if not bands:
+            raise ValueError(f"No ensemble member produced a forecast for currency-pair: {self.currency_pair}")
+
+        self.member_names = names
+        self.bands = np.stack(bands)
+        self.weights = self.fit_weights(self.weighting)
+        self.timings.record("weight_steps", self.held_out_steps())
+        for name, weight in zip(names, self.weights):
+            self.timings.record(f"{name}_weight", float(weight))
+
+        collated_results = self.combine(self.weights)
+        logger.info("Ensemble forecast ... complete")
+        self.collate(collated_results)
+        self.write_artifact("forecasts", collated_results, forecast_horizon)
+
+    def weight_fit_steps(self, steps: int = None) -> int:
+        horizon = self.bands.shape[1]
+        steps = steps or self.weight_steps or horizon // 2
+        if not 0 < steps < horizon:
+            raise ValueError(f"Ensemble weights need 0 < weight_steps < forecast horizon, got {steps} of {horizon}")
+        return steps
+
+    def held_out_steps(self) -> int:
+        # leading validation steps evaluate_forecast skips: those the fitted weights have seen
+        return 0 if self.weighting == "equal" else self.weight_fit_steps()
+
+    def fit_weights(self, weighting: str = "equal", steps: int = None) -> np.ndarray:
+        count = len(self.bands)
+        if weighting == "equal":
+            return np.full(count, 1.0 / count)
+
+        steps = self.weight_fit_steps(steps)
+        actual = self.validation_series.close[:steps].astype(np.float64)
+        forecasts = self.bands[:, :len(actual), 0]
+        if weighting == "inverse_error":
+            rmse = np.sqrt(((forecasts - actual) ** 2).mean(axis=1))
+            weights = 1.0 / np.maximum(rmse, 1e-12)
+        elif weighting == "stacked":
+            # non-negative least squares of the actuals on the member forecasts, rescaled to sum to one
+            from scipy.optimize import nnls
+            weights = nnls(forecasts.T, actual)[0]
+            if not weights.any():
+                weights = np.ones(count)
+        else:
+            raise ValueError(f"Unknown ensemble weighting: {weighting}")
+        return weights / weights.sum()
+
+    def evaluate_forecast(self):
+        skip = self.held_out_steps()
+        n = min(len(self.validation_series), len(self.forecasts))
+        y_forecast = np.asarray(self.forecasts[:n], dtype=np.float64)[skip:]
+        y_actual = self.validation_series.tail(n).close[skip:]
+
+        with self.timings.stage("metrics"):
+            self.metrics = compute_metrics(y_actual, y_forecast)
+
+    def combine_many(self, weights: np.ndarray) -> np.ndarray:
+        # schemes x members weights -> schemes x horizon x BAND_COLUMNS; no member is refitted
+        return np.einsum("sm,mhc->shc", np.atleast_2d(weights), self.bands)
+
+    def combine(self, weights: np.ndarray) -> DataFrame:
+        combined = DataFrame(self.combine_many(weights)[0], columns=BAND_COLUMNS)
+        for index, name in enumerate(self.member_names):
+            combined[f"{name}_forecast"] = self.bands[index, :, 0]
+        return combined
@@ -17,6 +17,16 @@ class ModelParams:
             "order_arma": self.order_arma
         }
 
+    @staticmethod
+    def from_dict(values: dict):
+        return ModelParams(ar=values["AR"], ma=values["MA"], p=values["p"], q=values["q"])
+
+    def __eq__(self, other):
+        return isinstance(other, ModelParams) and self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash((self.AR, self.MA, self.p, self.q))
+
     def __repr__(self):
         values = self.to_dict()
         del values["order_pq"]
@@ -0,0 +1,291 @@
+import numpy as np
+from pandas import DataFrame
+
+from source.garch.base import ModelParams
+
+LOG_2PI = np.log(2 * np.pi)
+MAX_PERSISTENCE = 0.999
+MAX_ARMA = 0.99999
+PENALTY = 1e10
+
+
+class GarchFit:
+    # mirrors the parts of armagarch's empModel the simulators use: Ey, ht, stres, params, ICs and predict
+    def __init__(self, params: ModelParams = None, data: DataFrame = None, coefficients: np.ndarray = None,
+                 conditional_mean: np.ndarray = None, residuals: np.ndarray = None, variance: np.ndarray = None,
+                 log_likelihood: float = 0.0, iterations: int = 0):
+        self.model_params = params
+        self.data = data
+        self.params = coefficients
+        self.log_likelihood = log_likelihood
+        self.iterations = iterations
+        self._residuals = residuals
+        self._variance = variance
+        self._conditional_mean = conditional_mean
+
+    @property
+    def name(self):
+        return str(self.data.columns[0])
+
+    @property
+    def Ey(self):
+        return DataFrame(self._conditional_mean, index=self.data.index, columns=[self.name])
+
+    @property
+    def et(self):
+        return DataFrame(self._residuals, index=self.data.index, columns=[self.name])
+
+    @property
+    def ht(self):
+        return DataFrame(self._variance, index=self.data.index, columns=[self.name + "Vol"])
+
+    @property
+    def stres(self):
+        return DataFrame(self._residuals / np.sqrt(self._variance), index=self.data.index, columns=[self.name])
+
+    @property
+    def ICs(self):
+        # same definitions as empModel._ICs
+        k = len(self.params)
+        n = len(self._residuals)
+        aic = 2 * k - 2 * self.log_likelihood
+        if n / k < 40:
+            aic += 2 * k * (k + 1) / (n - k - 1)
+        bic = np.log(n) * k - 2 * self.log_likelihood
+        hqic = -2 * self.log_likelihood + 2 * k * np.log(np.log(n))
+        return [aic, bic, hqic]
+
+    def predict(self, nsteps: int = 1):
+        if nsteps <= 0:
+            raise ValueError("Number of steps must be a positive number!")
+        params = self.model_params
+        constant, ar, ma, omega, alpha, beta = GarchEngine.unpack(self.params, params)
+        y = self.data.values[:, 0]
+
+        # mean: future shocks have zero expectation, past shocks and observations are known
+        y_lags = list(y[::-1][:params.AR]) + [0.0] * max(0, params.AR - len(y))
+        e_lags = list(self._residuals[::-1][:params.MA]) + [0.0] * max(0, params.MA - len(y))
+        mean = np.empty(nsteps)
+        for t in range(nsteps):
+            mean[t] = constant + np.dot(ar, y_lags[:params.AR]) + np.dot(ma, e_lags[:params.MA])
+            y_lags = [mean[t]] + y_lags
+            e_lags = [0.0] + e_lags
+
+        # variance: E[e^2] of a future shock is its own variance forecast
+        e2_lags = list(self._residuals[::-1][:params.p] ** 2)
+        h_lags = list(self._variance[::-1][:params.q])
+        variance = np.empty(nsteps)
+        for t in range(nsteps):
+            variance[t] = omega + np.dot(alpha, e2_lags[:params.p]) + np.dot(beta, h_lags[:params.q])
+            e2_lags = [variance[t]] + e2_lags
+            h_lags = [variance[t]] + h_lags
+        return [mean, variance]
+
+
+class GarchEngine:
+    def __init__(self, params: ModelParams = ModelParams(), max_iterations: int = 200, tolerance: float = 1e-9,
+                 step: float = 1e-6):
+        if params.p < 1:
+            raise ValueError("GarchEngine needs at least one ARCH term (p >= 1)")
+        self.params = params
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        # central-difference step in the unconstrained parameter space
+        self.step = step
+
+    @property
+    def parameter_count(self) -> int:
+        params = self.params
+        return 1 + params.AR + params.MA + 1 + params.p + params.q
+
+    @staticmethod
+    def unpack(coefficients: np.ndarray, params: ModelParams):
+        # armagarch ordering: [constant, ar..., ma..., omega, alpha..., beta...]
+        coefficients = np.asarray(coefficients, dtype=np.float64)
+        index = 1 + params.AR + params.MA
+        return (coefficients[..., 0], coefficients[..., 1:1 + params.AR], coefficients[..., 1 + params.AR:index],
+                coefficients[..., index], coefficients[..., index + 1:index + 1 + params.p],
+                coefficients[..., index + 1 + params.p:])
+
+    def to_natural(self, z: np.ndarray, scales: tuple) -> np.ndarray:
+        # unconstrained -> armagarch coefficients; keeps omega > 0, |ar|, |ma| < 1 and sum(alpha, beta) < 1
+        params = self.params
+        level, variance = scales
+        index = 1 + params.AR + params.MA
+        arma = MAX_ARMA * np.tanh(z[:, 1:index])
+        omega = variance * np.exp(z[:, index:index + 1])
+        persistence = MAX_PERSISTENCE / (1 + np.exp(-z[:, index + 1:index + 2]))
+        logits = np.concatenate([np.zeros((len(z), 1)), z[:, index + 2:]], axis=1)
+        shares = np.exp(logits - logits.max(axis=1, keepdims=True))
+        shares /= shares.sum(axis=1, keepdims=True)
+        return np.concatenate([level * z[:, :1], arma, omega, persistence * shares], axis=1)
+
+    def to_unconstrained(self, coefficients: np.ndarray, scales: tuple) -> np.ndarray:
+        params = self.params
+        level, variance = scales
+        index = 1 + params.AR + params.MA
+        arma = np.arctanh(np.clip(coefficients[:, 1:index] / MAX_ARMA, -0.999999, 0.999999))
+        omega = np.log(np.maximum(coefficients[:, index:index + 1], 1e-12) / variance)
+        garch_terms = np.maximum(coefficients[:, index + 1:], 1e-6)
+        persistence = np.clip(garch_terms.sum(axis=1, keepdims=True) / MAX_PERSISTENCE, 1e-6, 1 - 1e-6)
+        shares = garch_terms / garch_terms.sum(axis=1, keepdims=True)
+        logits = np.log(shares[:, 1:] / shares[:, :1])
+        return np.concatenate([coefficients[:, :1] / level, arma, omega, np.log(persistence / (1 - persistence)),
+                               logits], axis=1)
+
+    def filter(self, y: np.ndarray, coefficients: np.ndarray):
+        # y is time-major (T, n); every column is a series with its own coefficients
+        params = self.params
+        constant, ar, ma, omega, alpha, beta = GarchEngine.unpack(coefficients, params)
+        size = len(y)
+
+        conditional_mean = np.broadcast_to(constant, y.shape).copy()
+        for lag in range(1, params.AR + 1):
+            conditional_mean[lag:] += ar[:, lag - 1] * y[:-lag]
+        if params.MA > 0:
+            residuals = np.empty_like(y)
+            for t in range(size):
+                for lag in range(1, min(params.MA, t) + 1):
+                    conditional_mean[t] += ma[:, lag - 1] * residuals[t - lag]
+                residuals[t] = y[t] - conditional_mean[t]
+        else:
+            residuals = y - conditional_mean
+
+        # same initialisation as armagarch: h0 is the mean squared residual, missing lags are zero
+        squared = residuals * residuals
+        variance = np.broadcast_to(omega, y.shape).copy()
+        for lag in range(1, params.p + 1):
+            variance[lag:] += alpha[:, lag - 1] * squared[:-lag]
+        variance[0] = squared.mean(axis=0)
+        for t in range(1, size):
+            for lag in range(1, min(params.q, t) + 1):
+                variance[t] += beta[:, lag - 1] * variance[t - lag]
+        return conditional_mean, residuals, variance
+
+    def negative_log_likelihood(self, y: np.ndarray, coefficients: np.ndarray) -> np.ndarray:
+        with np.errstate(all="ignore"):
+            _, residuals, variance = self.filter(y, coefficients)
+            values = 0.5 * (LOG_2PI + np.log(variance) + residuals * residuals / variance).sum(axis=0)
+        return np.where(np.isfinite(values), values, PENALTY)
+
+    def starting_values(self, y: np.ndarray) -> np.ndarray:
+        # OLS on the AR lags for the mean, armagarch's GARCH defaults (alpha 0.1, beta 0.8) for the variance
+        params = self.params
+        size, count = y.shape
+        design = np.ones((count, size - params.AR, 1 + params.AR))
+        for lag in range(1, params.AR + 1):
+            design[:, :, lag] = y[params.AR - lag:size - lag].T
+        target = y[params.AR:].T[:, :, None]
+        gram = design.transpose(0, 2, 1) @ design + 1e-10 * np.eye(1 + params.AR)
+        solution = np.linalg.solve(gram, design.transpose(0, 2, 1) @ target)[:, :, 0]
+        solution[:, 1:] = np.clip(solution[:, 1:], -0.99, 0.99)
+        residual_variance = ((target[:, :, 0] - (design @ solution[:, :, None])[:, :, 0]) ** 2).mean(axis=1)
+
+        alpha = np.full((count, params.p), 0.1 / params.p)
+        beta = np.full((count, params.q), 0.8 / max(params.q, 1))
+        return np.concatenate([solution, np.zeros((count, params.MA)), 0.1 * residual_variance[:, None], alpha,
+                               beta], axis=1)
+
+    def fit_batch(self, y: np.ndarray, starting_values: np.ndarray = None):
+        size, count = y.shape
+        k = self.parameter_count
+        scales = (np.maximum(np.abs(y).mean(axis=0), 1e-12)[:, None],
+                  np.maximum(np.diff(y, axis=0).var(axis=0) if size > 1 else y.var(axis=0), 1e-12)[:, None])
+        if starting_values is None:
+            starting_values = self.starting_values(y)
+        z0 = self.to_unconstrained(np.asarray(starting_values, dtype=np.float64).reshape(count, k), scales)
+
+        # one pass over the time axis evaluates every series and every finite-difference probe at once
+        probes = np.vstack([np.zeros(k), self.step * np.eye(k), -self.step * np.eye(k)])
+        stacked_y = np.tile(y, len(probes))
+        stacked_scales = tuple(np.tile(scale, (len(probes), 1)) for scale in scales)
+
+        def objective(z: np.ndarray):
+            return self.negative_log_likelihood(y, self.to_natural(z, scales))
+
+        def objective_and_gradient(z: np.ndarray):
+            stacked_z = (probes[:, None, :] + z[None, :, :]).reshape(-1, k)
+            values = self.negative_log_likelihood(stacked_y, self.to_natural(stacked_z, stacked_scales))
+            values = values.reshape(len(probes), count)
+            return values[0], ((values[1:k + 1] - values[k + 1:]) / (2 * self.step)).T
+
+        z, iterations = self.minimize(objective, objective_and_gradient, z0)
+        coefficients = self.to_natural(z, scales)
+        conditional_mean, residuals, variance = self.filter(y, coefficients)
+        log_likelihood = -self.negative_log_likelihood(y, coefficients)
+        return coefficients, conditional_mean, residuals, variance, log_likelihood, iterations
+
+    def minimize(self, objective, objective_and_gradient, z: np.ndarray):
+        # BFGS run in lockstep: every series keeps its own inverse Hessian, line search and stopping test,
+        # so stacking series never slows the convergence of any one of them
+        count, k = z.shape
+        identity = np.eye(k)
+        inverse_hessian = np.tile(identity, (count, 1, 1))
+        active = np.ones(count, dtype=bool)
+        iterations = np.zeros(count, dtype=int)
+        value, gradient = objective_and_gradient(z)
+
+        for iteration in range(self.max_iterations):
+            direction = -(inverse_hessian @ gradient[:, :, None])[:, :, 0]
+            slope = (gradient * direction).sum(axis=1)
+            uphill = slope >= 0
+            inverse_hessian[uphill] = identity
+            direction[uphill] = -gradient[uphill]
+            slope[uphill] = -(gradient[uphill] ** 2).sum(axis=1)
+
+            # batched backtracking (Armijo) line search
+            step = np.where(active, 1.0, 0.0)
+            accepted = ~active
+            for _ in range(40):
+                trial = objective(z + step[:, None] * direction)
+                accepted |= trial <= value + 1e-4 * step * slope
+                if accepted.all():
+                    break
+                step[~accepted] *= 0.5
+            step[~accepted] = 0.0
+            active &= accepted
+
+            next_z = z + step[:, None] * direction
+            next_value, next_gradient = objective_and_gradient(next_z)
+            s = next_z - z
+            change = next_gradient - gradient
+            curvature = (s * change).sum(axis=1)
+            update = active & (curvature > 1e-12)
+            if iteration == 0:
+                scale = curvature[update] / (change[update] ** 2).sum(axis=1)
+                inverse_hessian[update] = scale[:, None, None] * identity
+            rho = 1.0 / curvature[update]
+            left = identity - rho[:, None, None] * s[update][:, :, None] * change[update][:, None, :]
+            inverse_hessian[update] = left @ inverse_hessian[update] @ left.transpose(0, 2, 1) + \
+                rho[:, None, None] * s[update][:, :, None] * s[update][:, None, :]
+
+            iterations[active] += 1
+            converged = ((value - next_value) <= self.tolerance * np.maximum(
+                np.maximum(np.abs(value), np.abs(next_value)), 1.0)) | \
+                (np.abs(next_gradient).max(axis=1) < 1e-6)
+            active &= ~converged
+            z, value, gradient = next_z, next_value, next_gradient
+            if not active.any():
+                break
+        return z, iterations
+
+    def fit(self, series: list, starting_values: list = None) -> list:
+        frames = [item.to_frame() if hasattr(item, "to_frame") else item for item in series]
+        fits = [None] * len(frames)
+
+        # series of equal length share one stacked array; others are batched by length
+        groups = {}
+        for index, frame in enumerate(frames):
+            groups.setdefault(len(frame), []).append(index)
+        for indices in groups.values():
+            y = np.column_stack([frames[index].values[:, 0].astype(np.float64) for index in indices])
+            starts = None
+            if starting_values is not None and all(starting_values[index] is not None for index in indices):
+                starts = np.vstack([starting_values[index] for index in indices])
+            coefficients, conditional_mean, residuals, variance, log_likelihood, iterations = \
+                self.fit_batch(y, starts)
+            for column, index in enumerate(indices):
+                fits[index] = GarchFit(self.params, frames[index], coefficients[column],
+                                       conditional_mean[:, column], residuals[:, column], variance[:, column],
+                                       float(log_likelihood[column]), int(iterations[column]))
+        return fits
@@ -1,98 +1,162 @@
-from logging.config import dictConfig
+import json
+import logging
+import multiprocessing
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from statistics import variance
 from warnings import filterwarnings
 
-from meanwhile import Job
 from pandas import DataFrame
 
+from source.common.registry import ModelRegistry
 from source.garch.base import ModelParams
 from source.garch.simulator import GarchSimulator
 
 filterwarnings("ignore")
 
-dictConfig({
-    'version': 1,
-    'disable_existing_loggers': True,
-})
+INFORMATION_CRITERIA = {"aic": 0, "bic": 1, "hqic": 2}
 
+logger = logging.getLogger(__name__)
 
-class GarchParameterEstimator:
-    analysis_results = []
-    data_frame: DataFrame = None
-
-    @staticmethod
-    def initialize(analysis_results: list = None, data_frame: DataFrame = None):
-        GarchParameterEstimator.analysis_results = analysis_results
-        GarchParameterEstimator.data_frame = data_frame
-
-    @staticmethod
-    def simulate(param: ModelParams = ModelParams()):
-        print("* * *   simulation using parameter: {}    * * *".format(param))
-        try:
-            model = GarchSimulator(trading_data=GarchParameterEstimator.data_frame, params=param)
-            _results = model.forecast(100)
-            GarchParameterEstimator.analyse_results(_results, param)
-        except Exception as e:
-            print("Simulation error:", e)
 
-    @staticmethod
-    def generate_param_set(max_range: int = 2):
+class GarchParameterEstimator:
+    # training windows are registered before the pool forks, so workers read them copy-on-write
+    datasets = {}
+
+    def __init__(self, trading_data: DataFrame = None, currency_pair: str = None, criterion: str = "bic",
+                 max_ar: int = 3, max_ma: int = 3, max_p: int = 1, max_q: int = 1, holdout: int = 100,
+                 patience: int = 1, workers: int = None, registry: ModelRegistry = None):
+        if criterion not in INFORMATION_CRITERIA:
+            raise ValueError(f"Unknown information criterion: {criterion}")
+        self.currency_pair = currency_pair
+        self.criterion = criterion
+        self.max_ar = max_ar
+        self.max_ma = max_ma
+        self.max_p = max_p
+        self.max_q = max_q
+        self.holdout = holdout
+        # number of ARMA order levels without improvement before the search stops expanding
+        self.patience = patience
+        self.workers = workers or os.cpu_count() or 1
+        self.registry = registry
+        self.training_data = trading_data.head(len(trading_data) - holdout)
+        self.analysis_results = []
+        self.fits = {}
+
+    def generate_param_set(self, arma_order: int) -> list:
         _param_set = []
-        for ar in range(0, max_range):
-            for ma in range(0, max_range):
-                _params = ModelParams(ar=ar, ma=ma, p=1, q=1)
-                _param_set.append(_params)
-        _param_set.sort(key=lambda item: (item.to_dict()["order_pq"], item.to_dict()["order_arma"]))
+        for ar in range(0, min(arma_order, self.max_ar) + 1):
+            ma = arma_order - ar
+            if ma > self.max_ma:
+                continue
+            for p in range(1, self.max_p + 1):
+                for q in range(1, self.max_q + 1):
+                    _param_set.append(ModelParams(ar=ar, ma=ma, p=p, q=q))
         return _param_set
 
     @staticmethod
-    def analyse_results(results: list = None, param: ModelParams = ModelParams()):
-        if len(results) == 2:
-            predictions = results[0]
-            errors = results[0]
-            prediction_variance = variance(predictions)
-            error_range = max(errors) - min(errors)
-            GarchParameterEstimator.analysis_results.append({
-                "params": param,
-                "prediction_variance": prediction_variance,
-                "error_range": error_range
-            })
-            GarchParameterEstimator.print_results()
-
-    @staticmethod
-    def print_results():
-        sorted_results = sorted(GarchParameterEstimator.analysis_results,
-                                key=lambda item: (item["error_range"], -item["prediction_variance"]))
-        print("\n\n============================================\n")
-        print("ideal params:", "\n".join([str(it) for it in sorted_results]))
-        print("\n============================================\n\n")
-
-    @staticmethod
-    def find_optimal_parameters(max_range: int = 1, thread_count: int = 12):
-        # create the param set
-        param_set = GarchParameterEstimator.generate_param_set(max_range)
-
-        # concurrent threads
-        job = Job(GarchParameterEstimator.simulate, thread_count)
-        job.add_many(param_set)
-        job.wait()
-        job.get_results()
-
-        GarchParameterEstimator.print_results()
+    def simulate(currency_pair: str, param: ModelParams, holdout: int, registry: ModelRegistry = None) -> dict:
+        training_data = GarchParameterEstimator.datasets[currency_pair]
+        try:
+            simulator = GarchSimulator(trading_data=training_data, currency_pair=currency_pair, params=param,
+                                       registry=registry)
+            model = simulator.fit(training_data)
+            aic, bic, hqic = model.ICs
+            return {"params": param, "aic": float(aic), "bic": float(bic), "hqic": float(hqic),
+                    **GarchParameterEstimator.analyse_results(model.predict(nsteps=holdout)), "error": None}
+        except Exception:
+            return {"params": param, "error": traceback.format_exc()}
 
     @staticmethod
-    def verify_parameters(params: list):
-        for _param in params:
-            GarchParameterEstimator.simulate(_param)
-
-
-def estimate_garch_parameters(df: DataFrame):
-    # find optimal parameters
-    max_range: int = 1
-    thread_count: int = 6
-    GarchParameterEstimator.initialize(analysis_results=[], data_frame=df)
-    GarchParameterEstimator.find_optimal_parameters(max_range=max_range, thread_count=thread_count)
-
-    # verify optimal parameters
-    optimal_params = []
-    GarchParameterEstimator.verify_parameters(optimal_params)
+    def analyse_results(results: list) -> dict:
+        predictions = results[0]
+        errors = results[1]
+        return {
+            "prediction_variance": float(variance(predictions)),
+            "error_range": float(max(errors) - min(errors))
+        }
+
+    def evaluate(self, executor: ProcessPoolExecutor, param_set: list) -> list:
+        # fits are cached per candidate, so re-running a search only fits new orders
+        pending = [param for param in param_set if param not in self.fits]
+        futures = [executor.submit(GarchParameterEstimator.simulate, self.currency_pair, param, self.holdout,
+                                   self.registry) for param in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            self.fits[result["params"]] = result
+            self.analysis_results.append(result)
+        return [self.fits[param] for param in param_set]
+
+    def find_optimal_parameters(self) -> ModelParams:
+        GarchParameterEstimator.datasets[self.currency_pair] = self.training_data
+        best = None
+        stale_levels = 0
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+            for arma_order in range(0, self.max_ar + self.max_ma + 1):
+                results = [result for result in self.evaluate(executor, self.generate_param_set(arma_order))
+                           if result["error"] is None]
+                level_best = min(results, key=lambda item: item[self.criterion], default=None)
+                if level_best is not None and (best is None or level_best[self.criterion] < best[self.criterion]):
+                    best = level_best
+                    stale_levels = 0
+                else:
+                    stale_levels += 1
+                    if stale_levels >= self.patience:
+                        break
+
+        if best is None:
+            raise ValueError(f"No GARCH candidate could be fitted for currency-pair: {self.currency_pair}")
+        return best["params"]
+
+    def log_results(self):
+        sorted_results = sorted([result for result in self.analysis_results if result["error"] is None],
+                                key=lambda item: item[self.criterion])
+        if not sorted_results:
+            return
+        logger.info("GARCH parameters for %s (%s): %s", self.currency_pair, self.criterion, sorted_results[0]["params"])
+        logger.debug("GARCH candidates by %s:\n%s", self.criterion, "\n".join([str(it) for it in sorted_results]))
+
+
+def load_parameter_table(table_file: str) -> dict:
+    if not os.path.exists(table_file):
+        return {}
+    with open(table_file) as file:
+        return {pair: ModelParams.from_dict(values) for pair, values in json.load(file).items()}
+
+
+def save_parameter_table(table_file: str, table: dict):
+    directory = os.path.dirname(table_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(table_file, "w") as file:
+        json.dump({pair: params.to_dict() for pair, params in table.items()}, file, indent=2)
+
+
+def estimate_parameter_table(trading_data: dict, table_file: str = "intermediates/garch_parameters.json",
+                             **search_options) -> dict:
+    # searches only the pairs the saved table does not cover yet
+    table = load_parameter_table(table_file)
+    for currency_pair, data_frame in trading_data.items():
+        if currency_pair in table:
+            continue
+        estimator = GarchParameterEstimator(trading_data=data_frame, currency_pair=currency_pair, **search_options)
+        try:
+            table[currency_pair] = estimator.find_optimal_parameters()
+        except ValueError:
+            # e.g. armagarch is missing or every fit failed; the pair's jobs fall back to the default orders
+            errors = [result["error"] for result in estimator.analysis_results if result["error"] is not None]
+            logger.error("GARCH parameter search failed for %s, not saving its parameters; first error:\n%s",
+                         currency_pair, errors[0] if errors else "no candidates")
+            continue
+        estimator.log_results()
+        save_parameter_table(table_file, table)
+    return table
+
+
+def estimate_garch_parameters(df: DataFrame, currency_pair: str = None, **search_options) -> ModelParams:
+    estimator = GarchParameterEstimator(trading_data=df, currency_pair=currency_pair, **search_options)
+    optimal_params = estimator.find_optimal_parameters()
+    estimator.log_results()
+    return optimal_params
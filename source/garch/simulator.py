@@ -1,25 +1,42 @@
-from armagarch import ARMA, empModel, normalDist, garch
+import logging
+
+import numpy as np
 from numpy import sqrt
 from pandas import DataFrame
 
+from source.common.output import ArtifactSink
+from source.common.registry import ModelRegistry
+from source.common.scenarios import ScenarioModel
 from source.common.simulator import Simulator
 from source.garch.base import ModelParams
+from source.garch.engine import GarchEngine
+
+ENGINES = ["armagarch", "numpy"]
+
+logger = logging.getLogger(__name__)
 
 
 class GarchSimulator(Simulator):
+    update_strategy = "warm_start"
 
     def __init__(self, trading_data: DataFrame = None, currency_pair: str = None,
-                 params: ModelParams = ModelParams()):
-        super().__init__(trading_data, currency_pair, "GARCH")
+                 params: ModelParams = ModelParams(), registry: ModelRegistry = None, holdout: int = None,
+                 engine: str = "armagarch", sink: ArtifactSink = None, timeframe: str = None):
+        super().__init__(trading_data, currency_pair, "GARCH", registry, holdout, sink, timeframe)
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown GARCH engine: {engine}")
         self.params = params
+        self.engine = engine
 
-    def forecast(self, forecast_horizon: int = 96):
-        super().forecast(forecast_horizon)
-        print("Running GARCH forecast for Currency-pair: {} using forecast horizon: {}", self.currency_pair.upper(), forecast_horizon)
-        print("Dataset: ", self.currency_pair.upper())
-        print(self.training_data.head(5))
-        print(".....\t.........\t...")
-        print(self.training_data.tail(5))
+    def hyperparameters(self) -> dict:
+        return {**self.params.to_dict(), "engine": self.engine}
+
+    def fit_model(self, training_data: DataFrame, starting_values=None):
+        if self.engine == "numpy":
+            return GarchEngine(self.params).fit([training_data['close'].to_frame()], [starting_values])[0]
+
+        # armagarch (and the statsmodels/scipy stack under it) is only imported by the reference engine
+        from armagarch import ARMA, empModel, normalDist, garch
 
         # define mean, vol and distribution
         mean = ARMA(order={'AR': self.params.AR, 'MA': self.params.MA})
@@ -27,41 +44,62 @@ class GarchSimulator(Simulator):
         distribution = normalDist()
 
         # create a model
-        closing_prices = self.training_data['close'].to_frame()
+        closing_prices = training_data['close'].to_frame()
         model = empModel(closing_prices, mean, vol, distribution)
         # fit model
-        model.fit()
+        model.fit(startingVals=starting_values, printTable=logger.isEnabledFor(logging.DEBUG))
+        return model
 
-        # get the conditional mean
-        conditional_mean = model.Ey
-        print("conditional mean:", conditional_mean)
+    def update_model(self, model, training_data: DataFrame, new_data: DataFrame):
+        # previous estimates are a far better starting point for the optimizer than the defaults
+        return self.fit_model(training_data, starting_values=model.params)
 
-        # get conditional variance
-        ht = model.ht
-        conditional_variance = sqrt(ht)
-        print("conditional variance:", conditional_variance)
+    def model_counters(self, model) -> dict:
+        if self.engine == "numpy":
+            return {"garch_iterations": int(model.iterations), "garch_log_likelihood": float(model.log_likelihood)}
+        return {"garch_log_likelihood": -float(model._finalLL)}
 
-        # get standardized residuals
-        standardized_residuals = model.stres
-        print("standardized residuals:", standardized_residuals)
+    def scenario_model(self, model) -> ScenarioModel:
+        # Ey, ht and stres exist on both engines' fits; the residuals are stres * sqrt(ht)
+        constant, ar, ma, omega, alpha, beta = GarchEngine.unpack(model.params, self.params)
+        variance = np.asarray(model.ht.values[:, 0], dtype=np.float64)
+        residuals = np.asarray(model.stres.values[:, 0], dtype=np.float64) * np.sqrt(variance)
+        return ScenarioModel(constant, ar, ma, omega, alpha, beta, model.Ey.values[:, 0] + residuals, residuals,
+                             variance)
 
-        # make a prediction of mean and variance over next 100 days.
+    def interval_label(self) -> str:
+        return "forecast +/- predicted variance"
+
+    def predict_model(self, model, forecast_horizon: int) -> DataFrame:
         # results is a list of two-arrays with first array being prediction of mean
         # and second array being prediction of variance
         results = model.predict(nsteps=forecast_horizon)
         predictions = results[0]
         errors = results[1]
-
-        print("GARCH forecast ... complete")
-        collated_results = DataFrame.from_records(
+        return DataFrame.from_records(
             [{"forecast": value, "error": error, "forecast_lower": value - error, "forecast_upper": value + error} for
              value, error in zip(predictions, errors)])
 
-        self.forecasts = collated_results["forecast"]
-        self.errors = collated_results["error"]
-        self.forecasts_lower = collated_results["forecast_lower"]
-        self.forecasts_upper = collated_results["forecast_upper"]
-        self.forecasts_raw = collated_results
+    def forecast(self, forecast_horizon: int = 96):
+        super().forecast(forecast_horizon)
+        logger.info("Running GARCH forecast for Currency-pair: %s using forecast horizon: %s",
+                    self.currency_pair.upper(), forecast_horizon)
+        logger.debug("Dataset: %s\n%s\n.....\t.........\t...\n%s", self.currency_pair.upper(),
+                     self.training_data.head(5), self.training_data.tail(5))
+
+        model = self.fit(self.training_data)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            # conditional mean, conditional variance and standardized residuals
+            logger.debug("conditional mean: %s", model.Ey)
+            logger.debug("conditional variance: %s", sqrt(model.ht))
+            logger.debug("standardized residuals: %s", model.stres)
+
+        # make a prediction of mean and variance over next 100 days.
+        collated_results = self.predict(model, forecast_horizon)
+
+        logger.info("GARCH forecast ... complete")
+        self.collate(collated_results)
 
-        collated_results.to_csv(f"output/{self.currency_pair}__{self.model_name.lower()}__{forecast_horizon}__forecasts.csv")
-        print(collated_results)
+        self.write_artifact("forecasts", collated_results, forecast_horizon)
+        logger.debug("%s", collated_results)
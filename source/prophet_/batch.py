@@ -0,0 +1,85 @@
+import logging
+import multiprocessing
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from pandas import DataFrame
+
+from source.common.output import ArtifactSink, BatchArtifactSink, CsvArtifactSink
+from source.common.registry import ModelRegistry
+from source.prophet_.simuator import ProphetSimulator, SharedBackendProphet
+
+logger = logging.getLogger(__name__)
+
+
+class ProphetBatch:
+    # registered before the pool forks, so workers read the frames copy-on-write
+    datasets = {}
+
+    def __init__(self, trading_data: dict = None, uncertainty_samples: int = 1000, holdout: int = None,
+                 registry: ModelRegistry = None, workers: int = None, sink: ArtifactSink = None):
+        # trading_data: currency-pair -> frame
+        ProphetBatch.datasets.update(trading_data or {})
+        self.currency_pairs = list((trading_data or {}).keys())
+        self.uncertainty_samples = uncertainty_samples
+        self.holdout = holdout
+        self.registry = registry
+        self.workers = workers or os.cpu_count() or 1
+        self.sink = sink if sink is not None else CsvArtifactSink("output")
+
+    @staticmethod
+    def simulate(currency_pair: str, forecast_horizon: int, uncertainty_samples: int, holdout: int,
+                 registry: ModelRegistry = None) -> dict:
+        # artifacts are collected in the worker and written once by the parent
+        sink = BatchArtifactSink()
+        try:
+            simulator = ProphetSimulator(ProphetBatch.datasets[currency_pair], currency_pair, registry, holdout, sink,
+                                         uncertainty_samples)
+            output = simulator.run(forecast_horizon).to_dict()
+            output["artifacts"] = sink.frames
+            output["error"] = None
+            return output
+        except Exception:
+            return {"currency_pair": currency_pair, "forecast_horizon": forecast_horizon,
+                    "error": traceback.format_exc()}
+
+    def forecast(self, forecast_horizons=96) -> dict:
+        # (currency pair, horizon) -> SimulationResult.to_dict(), or a dict with the error traceback
+        forecast_horizons = forecast_horizons if isinstance(forecast_horizons, (list, tuple)) else [forecast_horizons]
+        tasks = [(currency_pair, forecast_horizon) for currency_pair in self.currency_pairs
+                 for forecast_horizon in forecast_horizons]
+
+        # the Stan model is loaded here once and inherited by every forked worker
+        SharedBackendProphet.load_backend()
+        results = {}
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks) or 1),
+                                 mp_context=multiprocessing.get_context("fork")) as executor:
+            futures = {executor.submit(ProphetBatch.simulate, currency_pair, forecast_horizon,
+                                       self.uncertainty_samples, self.holdout, self.registry):
+                       (currency_pair, forecast_horizon) for currency_pair, forecast_horizon in tasks}
+            for future in as_completed(futures):
+                output = future.result()
+                results[futures[future]] = output
+                if output["error"] is not None:
+                    logger.error("Prophet forecast failed for %s, horizon %s:\n%s", *futures[future],
+                                 output["error"])
+                    continue
+                for frame in output.pop("artifacts"):
+                    self.sink.write(frame["artifact"].iloc[0], frame.drop(columns=["artifact", "row"]))
+        self.sink.flush()
+        return results
+
+    @staticmethod
+    def forecasts_table(results: dict) -> DataFrame:
+        # long format: one row per pair, horizon and step
+        frames = []
+        for (currency_pair, forecast_horizon), output in results.items():
+            if output["error"] is not None:
+                continue
+            frames.append(DataFrame({"currency_pair": currency_pair, "forecast_horizon": forecast_horizon,
+                                     "step": range(1, len(output["forecasts"]) + 1),
+                                     "forecast": output["forecasts"], "forecast_lower": output["forecasts_lower"],
+                                     "forecast_upper": output["forecasts_upper"]}))
+        return pd.concat(frames, ignore_index=True) if frames else DataFrame()
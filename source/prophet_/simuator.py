@@ -1,39 +1,99 @@
+import logging
+
 from pandas import DataFrame
 from prophet import Prophet
 
+from source.common.output import ArtifactSink
+from source.common.registry import ModelRegistry
+from source.common.resampling import TIMEFRAMES
+from source.common.series import prophet_frame
 from source.common.simulator import Simulator
 
+logger = logging.getLogger(__name__)
+
+
+class SharedBackendProphet(Prophet):
+    # loading the compiled Stan model dominates Prophet() construction; it is loaded once per process and shared.
+    # A fork after load_backend() hands the loaded model to every worker.
+    backend = None
+
+    @staticmethod
+    def load_backend():
+        if SharedBackendProphet.backend is None:
+            SharedBackendProphet()
+        return SharedBackendProphet.backend
+
+    def _load_stan_backend(self, stan_backend):
+        if SharedBackendProphet.backend is None:
+            super()._load_stan_backend(stan_backend)
+            SharedBackendProphet.backend = self.stan_backend
+        self.stan_backend = SharedBackendProphet.backend
+
 
 class ProphetSimulator(Simulator):
+    update_strategy = "warm_start"
+
+    def __init__(self, trading_data: DataFrame = None, currency_pair: str = None, registry: ModelRegistry = None,
+                 holdout: int = None, sink: ArtifactSink = None, uncertainty_samples: int = 1000,
+                 timeframe: str = None):
+        super().__init__(trading_data, currency_pair, "Prophet", registry, holdout, sink, timeframe)
+        # posterior draws behind forecast_lower/upper; 0 turns interval sampling off (the bounds equal the forecast)
+        self.uncertainty_samples = uncertainty_samples
 
-    def __init__(self, trading_data: DataFrame = None, currency_pair: str = None):
-        super().__init__(trading_data, currency_pair, "Prophet")
+    def hyperparameters(self) -> dict:
+        return {"interval_width": 0.99}
+
+    def fit_model(self, training_data: DataFrame):
+        # model = Prophet(interval_width=0.99, mcmc_samples=60)
+        model = SharedBackendProphet(**self.hyperparameters())
+        model.fit(prophet_frame(training_data))
+        return model
+
+    def update_model(self, model, training_data: DataFrame, new_data: DataFrame):
+        # warm-start Stan from the previous fit's parameters
+        init = {name: model.params[name][0][0] for name in ["k", "m", "sigma_obs"]}
+        init.update({name: model.params[name][0] for name in ["delta", "beta"]})
+        warm_model = SharedBackendProphet(**self.hyperparameters())
+        warm_model.fit(prophet_frame(training_data), init=init)
+        return warm_model
+
+    def model_counters(self, model) -> dict:
+        # the pystan backend of prophet 1.0 does not report optimizer iterations
+        return {"prophet_changepoints": len(model.changepoints), "prophet_history_rows": len(model.history)}
+
+    def interval_label(self) -> str:
+        return f"{self.hyperparameters()['interval_width']:.0%} uncertainty interval"
+
+    def predict_model(self, model, forecast_horizon: int) -> DataFrame:
+        # only the future dates are predicted; the in-sample history was discarded anyway.
+        # uncertainty_samples is a predict-time setting, so registry models fitted with another count still apply
+        model.uncertainty_samples = self.uncertainty_samples
+        # future dates step by the timeframe's bar; daily bars keep Prophet's default
+        frequency = TIMEFRAMES[self.timeframe]["prophet_frequency"] if self.timeframe is not None else None
+        future = model.make_future_dataframe(periods=forecast_horizon, freq=frequency or "D", include_history=False)
+        last_n = model.predict(future)
+
+        last_n["forecast"] = last_n["yhat"]
+        if self.uncertainty_samples:
+            last_n["forecast_lower"] = last_n["yhat_lower"]
+            last_n["forecast_upper"] = last_n["yhat_upper"]
+        else:
+            last_n["forecast_lower"] = last_n["forecast_upper"] = last_n["yhat"]
+        last_n["error"] = (last_n["forecast_upper"] - last_n["forecast_lower"]).abs() / 2
+        return last_n
 
     def forecast(self, forecast_horizon: int = 96):
         super().forecast(forecast_horizon)
 
-        print("Running Prophet forecast for Currency-pair: {} using forecast horizon: {}", self.currency_pair.upper(),
-              forecast_horizon)
-        print("Dataset: ", self.currency_pair.upper())
-        print(self.training_data.head(5))
-        print(".....\t.........\t...")
-        print(self.training_data.tail(5))
+        logger.info("Running Prophet forecast for Currency-pair: %s using forecast horizon: %s",
+                    self.currency_pair.upper(), forecast_horizon)
+        logger.debug("Dataset: %s\n%s\n.....\t.........\t...\n%s", self.currency_pair.upper(),
+                     self.training_data.head(5), self.training_data.tail(5))
 
-        # model = Prophet(interval_width=0.99, mcmc_samples=60)
-        model = Prophet(interval_width=0.99)
-        model.fit(self.training_data)
-
-        future = model.make_future_dataframe(periods=forecast_horizon)
-        future.tail()
-
-        _forecast = model.predict(future)
-        last_n = _forecast.tail(forecast_horizon)
-        last_n.to_csv(f"output/{self.currency_pair}__{self.model_name.lower()}__{forecast_horizon}__forecasts.csv")
-
-        # last_n = _forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]].tail(n)
-        print(last_n)
-        self.forecasts = last_n["yhat"]
-        self.forecasts_upper = last_n["yhat_upper"]
-        self.forecasts_lower = last_n["yhat_lower"]
-        self.errors = [(abs(upper - lower) / 2) for upper, lower in zip(self.forecasts_upper, self.forecasts_lower)]
-        self.forecasts_raw = last_n
+        model = self.fit(self.training_data)
+
+        last_n = self.predict(model, forecast_horizon)
+        self.write_artifact("forecasts", last_n, forecast_horizon)
+
+        logger.debug("%s", last_n)
+        self.collate(last_n)
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
+
+from source.common.decomposition import DecompositionStage
+
+
+def frame(size: int, seed: int = 0) -> DataFrame:
+    closes = 1.1 + np.cumsum(np.random.default_rng(seed).normal(0, 0.003, size))
+    return DataFrame({"date": pd.bdate_range("2021-03-01", periods=size), "close": closes})
+
+
+def test_windows_of_one_pair_are_cached_under_the_pair():
+    DecompositionStage.clear()
+    try:
+        full = frame(300)
+        windows = {("eur_usd", 200): full.head(200), ("eur_usd", 250): full.head(250), "eur_gbp": frame(250, 1)}
+        batched = DecompositionStage.decompose_many(windows, period=5)
+        assert set(batched) == set(windows) and DecompositionStage.misses == 3
+
+        # a job decomposing one of the windows by pair finds it in the cache
+        single = DecompositionStage.decompose("eur_usd", full.head(250), period=5)
+        assert DecompositionStage.hits == 1
+        assert_frame_equal(single, batched[("eur_usd", 250)])
+    finally:
+        DecompositionStage.clear()
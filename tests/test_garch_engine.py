@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from pandas import DataFrame
+
+from source.garch.base import ModelParams
+from source.garch.engine import GarchEngine, GarchFit
+
+
+def fitted(params: ModelParams, coefficients: list, size: int = 300, seed: int = 0) -> GarchFit:
+    # a GarchFit on a simulated series, filtered with known coefficients instead of estimated ones
+    y = 1.2 + np.cumsum(np.random.default_rng(seed).normal(0, 0.005, size))
+    coefficients = np.array(coefficients, dtype=np.float64)
+    engine = GarchEngine(params)
+    conditional_mean, residuals, variance = engine.filter(y[:, None], coefficients[None, :])
+    return GarchFit(params, DataFrame({"close": y}), coefficients, conditional_mean[:, 0], residuals[:, 0],
+                    variance[:, 0])
+
+
+def test_filter_matches_scalar_recursion():
+    params = ModelParams(ar=2, ma=1, p=1, q=1)
+    fit = fitted(params, [0.01, 0.6, 0.39, 0.2, 1e-6, 0.1, 0.85])
+    constant, ar, ma, omega, alpha, beta = 0.01, [0.6, 0.39], [0.2], 1e-6, [0.1], [0.85]
+    y = fit.data["close"].to_numpy()
+
+    mean, residuals = np.zeros(len(y)), np.zeros(len(y))
+    for t in range(len(y)):
+        mean[t] = constant + sum(ar[i] * y[t - 1 - i] for i in range(2) if t - 1 - i >= 0) + \
+            sum(ma[j] * residuals[t - 1 - j] for j in range(1) if t - 1 - j >= 0)
+        residuals[t] = y[t] - mean[t]
+    variance = np.zeros(len(y))
+    variance[0] = (residuals ** 2).mean()
+    for t in range(1, len(y)):
+        variance[t] = omega + alpha[0] * residuals[t - 1] ** 2 + beta[0] * variance[t - 1]
+
+    np.testing.assert_allclose(fit.Ey["close"], mean, rtol=1e-12)
+    np.testing.assert_allclose(fit.et["close"], residuals, atol=1e-12)
+    np.testing.assert_allclose(fit.ht["closeVol"], variance, rtol=1e-10)
+
+
+def test_predict_matches_closed_form():
+    # ARMA(1, 1)-GARCH(1, 1): the mean and variance forecasts decay geometrically to their unconditional levels
+    constant, phi, theta, omega, alpha, beta = 0.02, 0.98, 0.3, 2e-6, 0.08, 0.9
+    fit = fitted(ModelParams(ar=1, ma=1, p=1, q=1), [constant, phi, theta, omega, alpha, beta])
+    y, residuals, variance = fit.data["close"].to_numpy(), fit.et["close"].to_numpy(), fit.ht["closeVol"].to_numpy()
+    steps = np.arange(1, 31)
+
+    first_mean = constant + phi * y[-1] + theta * residuals[-1]
+    level = constant / (1 - phi)
+    first_variance = omega + alpha * residuals[-1] ** 2 + beta * variance[-1]
+    unconditional = omega / (1 - alpha - beta)
+
+    mean, variance_forecast = fit.predict(len(steps))
+    np.testing.assert_allclose(mean, level + phi ** (steps - 1) * (first_mean - level), rtol=1e-12)
+    np.testing.assert_allclose(variance_forecast,
+                               unconditional + (alpha + beta) ** (steps - 1) * (first_variance - unconditional),
+                               rtol=1e-10)
+
+
+def test_predict_matches_higher_order_recursion():
+    params = ModelParams(ar=2, ma=2, p=2, q=2)
+    coefficients = [0.01, 0.5, 0.49, 0.2, -0.1, 1e-6, 0.05, 0.03, 0.5, 0.4]
+    fit = fitted(params, coefficients)
+    constant, ar, ma, omega, alpha, beta = coefficients[0], coefficients[1:3], coefficients[3:5], coefficients[5], \
+        coefficients[6:8], coefficients[8:]
+    y, residuals, variance = list(fit.data["close"]), list(fit.et["close"]), list(fit.ht["closeVol"])
+    squared = [value ** 2 for value in residuals]
+
+    expected_mean, expected_variance = [], []
+    for _ in range(10):
+        value = constant + ar[0] * y[-1] + ar[1] * y[-2] + ma[0] * residuals[-1] + ma[1] * residuals[-2]
+        h = omega + alpha[0] * squared[-1] + alpha[1] * squared[-2] + beta[0] * variance[-1] + \
+            beta[1] * variance[-2]
+        # future shocks: zero mean, squared expectation equal to their variance forecast
+        y.append(value)
+        residuals.append(0.0)
+        squared.append(h)
+        variance.append(h)
+        expected_mean.append(value)
+        expected_variance.append(h)
+
+    mean, variance_forecast = fit.predict(10)
+    np.testing.assert_allclose(mean, expected_mean, rtol=1e-12)
+    np.testing.assert_allclose(variance_forecast, expected_variance, rtol=1e-10)
+
+
+def test_predict_rejects_non_positive_steps():
+    fit = fitted(ModelParams(ar=1, ma=0, p=1, q=1), [0.0, 0.9, 1e-6, 0.1, 0.8])
+    with pytest.raises(ValueError):
+        fit.predict(0)
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
+
+from source.common.resampling import TimeframeCache, TimeframeSeries
+
+
+def bars(start: str, periods: int, frequency: pd.Timedelta, seed: int = 0) -> DataFrame:
+    dates = pd.date_range(start, periods=periods, freq=frequency)
+    # FX does not trade at weekends
+    dates = dates[dates.dayofweek < 5]
+    closes = 1.1 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.001, len(dates))))
+    opens = np.concatenate([[1.1], closes[:-1]])
+    return DataFrame({"date": dates, "open": opens, "high": np.maximum(opens, closes) * 1.0005,
+                      "low": np.minimum(opens, closes) * 0.9995, "close": closes,
+                      "percent_change": (closes / opens - 1) * 100})
+
+
+HOUR, DAY = pd.Timedelta(hours=1), pd.Timedelta(days=1)
+
+
+@pytest.mark.parametrize("frequency, timeframes", [(HOUR, ["daily", "weekly"]), (DAY, ["weekly"])])
+@pytest.mark.parametrize("splits", [[100], [37, 205, 206], [1, 2, 3]])
+def test_append_equals_full_rebuild(frequency, timeframes, splits):
+    trading_data = bars("2021-03-01 05:00", 24 * 30 if frequency == HOUR else 400, frequency)
+    series = TimeframeSeries(trading_data.iloc[:splits[0]])
+    for timeframe in timeframes:
+        series.level(timeframe)
+    # chunks that end inside a bin as well as on its boundary
+    for start, end in zip(splits, splits[1:] + [len(trading_data)]):
+        series.append(trading_data.iloc[start:end])
+
+    rebuilt = TimeframeSeries(trading_data)
+    assert series.version == rebuilt.version
+    for timeframe in timeframes:
+        assert_frame_equal(series.level(timeframe), rebuilt.level(timeframe))
+
+
+def test_append_to_empty_series():
+    trading_data = bars("2021-03-01", 300, HOUR)
+    series = TimeframeSeries(trading_data.iloc[:0])
+    series.level("daily")
+    series.append(trading_data)
+    assert_frame_equal(series.level("daily"), TimeframeSeries(trading_data).level("daily"))
+
+
+def test_cache_extends_a_grown_history():
+    trading_data = bars("2021-03-01", 24 * 20, HOUR)
+    TimeframeCache.clear()
+    try:
+        TimeframeCache.level("eur_usd", trading_data.iloc[:200], "daily")
+        entry = TimeframeCache.series["eur_usd"]
+        daily = TimeframeCache.level("eur_usd", trading_data, "daily")
+        # the same entry was extended rather than replaced
+        assert TimeframeCache.series["eur_usd"] is entry
+        assert_frame_equal(daily, TimeframeSeries(trading_data).level("daily"))
+    finally:
+        TimeframeCache.clear()
@@ -0,0 +1,54 @@
+import numpy as np
+
+from source.common.scenarios import ScenarioEngine, ScenarioModel
+
+PATHS = 200000
+
+
+def ar1_moments(constant: float, phi: float, sigma2: float, y0: float, horizon: int) -> tuple:
+    # y[h] = c * sum(phi^i) + phi^h * y0 + sum(phi^i * e[h-i]), i < h
+    powers = phi ** np.arange(horizon)
+    steps = np.arange(1, horizon + 1)
+    mean = constant * np.cumsum(powers) + phi ** steps * y0
+    variance = sigma2 * np.cumsum(powers ** 2)
+    return mean, variance
+
+
+def test_ar1_paths_match_closed_form():
+    constant, phi, sigma2, y0, horizon = 0.05, 0.9, 0.01, 1.3, 12
+    model = ScenarioModel(constant=constant, ar=[phi], omega=sigma2, y=[1.0, 1.1, y0])
+    engine = ScenarioEngine(paths=PATHS, seed=7)
+
+    [(pairs, prices)] = list(engine.simulate_paths({"eur_usd": model}, horizon))
+    mean, variance = ar1_moments(constant, phi, sigma2, y0, horizon)
+
+    assert pairs == ["eur_usd"]
+    # five standard errors of the sample mean and variance of normal paths
+    assert np.all(np.abs(prices[0].mean(axis=1) - mean) < 5 * np.sqrt(variance / PATHS))
+    assert np.all(np.abs(prices[0].var(axis=1) - variance) < 5 * variance * np.sqrt(2 / PATHS))
+
+
+def test_summary_bands_follow_the_paths():
+    constant, phi, sigma2, y0, horizon = 0.0, 0.5, 0.0004, 1.2, 5
+    model = ScenarioModel(constant=constant, ar=[phi], omega=sigma2, y=[y0])
+    result = ScenarioEngine(paths=PATHS, seed=1).simulate({"eur_usd": model}, horizon)["eur_usd"]
+    mean, variance = ar1_moments(constant, phi, sigma2, y0, horizon)
+
+    np.testing.assert_allclose(result.bands["mean"], mean, atol=5 * np.sqrt(variance.max() / PATHS))
+    # the median of a normal path is its mean
+    np.testing.assert_allclose(result.bands["q0.5"], mean, atol=0.01 * np.sqrt(variance.max()) + 1e-4)
+    assert result.paths == PATHS and result.forecast_horizon == horizon
+
+
+def test_paths_do_not_depend_on_batching():
+    models = {pair: ScenarioModel(constant=0.01, ar=[0.95], omega=1e-4, y=[1.0 + index])
+              for index, pair in enumerate(["eur_usd", "eur_gbp", "usd_jpy"])}
+    together = ScenarioEngine(paths=1000, seed=3)
+    one_by_one = ScenarioEngine(paths=1000, seed=3, max_bytes=1)
+
+    batched = {pair: prices for pairs, values in together.simulate_paths(models, 4)
+               for pair, prices in zip(pairs, values)}
+    single = {pair: prices for pairs, values in one_by_one.simulate_paths(models, 4)
+              for pair, prices in zip(pairs, values)}
+    for pair in models:
+        np.testing.assert_array_equal(batched[pair], single[pair])
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import DataFrame
+
+from source.common.output import ArtifactSink
+from source.common.simulator import Simulator
+from source.common.streaming import StreamingForecaster
+
+
+def bars(frequency: pd.Timedelta, size: int = 48) -> DataFrame:
+    closes = 1.1 + np.cumsum(np.random.default_rng(0).normal(0, 0.001, size))
+    return DataFrame({"date": pd.date_range("2021-03-01", periods=size, freq=frequency), "open": closes - 0.0005,
+                      "high": closes + 0.001, "low": closes - 0.001, "close": closes,
+                      "percent_change": np.full(size, 0.1)})
+
+
+@pytest.mark.parametrize("frequency", [pd.Timedelta(hours=1), pd.Timedelta(days=1)])
+def test_window_is_seeded_with_every_bar(frequency):
+    trading_data = bars(frequency)
+    simulator = Simulator(trading_data, "eur_usd", "test", sink=ArtifactSink())
+    window, _ = StreamingForecaster({"eur_usd": simulator}, window=40, period=24).state("eur_usd")
+
+    seeded = window.frame()
+    expected = trading_data.tail(40).reset_index(drop=True)
+    # intraday bars keep their time of day, so no two collapse onto one date
+    assert seeded["date"].nunique() == 40
+    np.testing.assert_array_equal(seeded["date"].to_numpy(), expected["date"].to_numpy())
+    np.testing.assert_array_equal(seeded[["open", "high", "low", "close", "percent_change"]].to_numpy(),
+                                  expected[["open", "high", "low", "close", "percent_change"]].to_numpy())
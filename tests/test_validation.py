@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
+
+from source.common.validation import DataValidator, ValidationReport
+
+ALL_REPAIRS = ["sort", "deduplicate", "ohlc", "clip", "fill"]
+
+
+def clean_frame(size: int = 60, seed: int = 0) -> DataFrame:
+    # business-day bars whose opens, ranges and percent changes all agree with the closes
+    dates = pd.bdate_range("2021-03-01", periods=size)
+    closes = 1.1 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.003, size)))
+    opens = np.concatenate([[1.1], closes[:-1]])
+    return DataFrame({"date": dates, "open": opens, "high": np.maximum(opens, closes) * 1.001,
+                      "low": np.minimum(opens, closes) * 0.999, "close": closes,
+                      "percent_change": (closes / opens - 1) * 100})
+
+
+def issues(frame: DataFrame) -> dict:
+    return {name: count for name, count in DataValidator().check(frame).items() if count}
+
+
+def test_clean_frame_passes_every_check():
+    assert issues(clean_frame()) == {}
+
+
+def test_non_monotonic():
+    frame = clean_frame()
+    frame = frame.iloc[[0, 1, 3, 2] + list(range(4, len(frame)))].reset_index(drop=True)
+    assert issues(frame) == {"non_monotonic": 1}
+
+
+def test_duplicated_dates():
+    frame = clean_frame()
+    frame = pd.concat([frame.iloc[:11], frame.iloc[10:]], ignore_index=True)
+    # the repeated bar also repeats a change against itself
+    assert issues(frame) == {"duplicated_dates": 1, "percent_change_mismatch": 1}
+
+
+def test_weekend_bars():
+    frame = clean_frame()
+    # 2021-03-06 is a Saturday between Friday's and Monday's bars
+    saturday = frame.iloc[[4]].assign(date=pd.Timestamp("2021-03-06"), percent_change=0.0)
+    frame = pd.concat([frame.iloc[:5], saturday, frame.iloc[5:]], ignore_index=True)
+    assert issues(frame) == {"weekend_bars": 1}
+
+
+def test_gaps_and_missing_bars():
+    frame = clean_frame().drop(index=[20, 21]).reset_index(drop=True)
+    found = issues(frame)
+    assert found.pop("gaps") == 1 and found.pop("missing_bars") == 2
+    # the bar after the gap now changes against an older close
+    assert found == {"percent_change_mismatch": 1}
+
+
+def test_high_below_low_and_outside_range():
+    frame = clean_frame()
+    high, low = frame.loc[10, "high"], frame.loc[10, "low"]
+    frame.loc[10, "high"], frame.loc[10, "low"] = low, high
+    frame.loc[20, "high"] = frame.loc[20, "close"] * 0.999
+    assert issues(frame) == {"high_below_low": 1, "outside_range": 1}
+
+
+def test_non_positive():
+    frame = clean_frame()
+    frame.loc[30, "low"] = 0.0
+    assert issues(frame) == {"non_positive": 1}
+
+
+def test_close_and_wick_spikes():
+    frame = clean_frame()
+    # a close that jumps 20% and comes straight back, and a high 20% above its bar
+    frame.loc[15, "close"] *= 1.2
+    frame.loc[15, "high"] = frame.loc[15, "close"]
+    frame.loc[[15, 16], "percent_change"] = (frame["close"] / frame["close"].shift() - 1)[[15, 16]] * 100
+    frame.loc[40, "high"] *= 1.2
+    assert issues(frame) == {"close_spikes": 1, "wick_spikes": 1}
+
+
+def test_percent_change_mismatch():
+    frame = clean_frame()
+    frame.loc[25, "percent_change"] += 0.5
+    assert issues(frame) == {"percent_change_mismatch": 1}
+
+
+def test_sort_and_deduplicate_repairs():
+    clean = clean_frame()
+    correction = clean.iloc[[7]].assign(close=clean.loc[7, "close"] * 1.0001)
+    shuffled = pd.concat([clean.iloc[::-1], correction], ignore_index=True)
+    repaired, changes = DataValidator(["sort", "deduplicate"]).repair(shuffled)
+
+    assert changes["sort"] == len(clean) - 1
+    assert changes["deduplicate"] == 1
+    assert repaired["date"].is_monotonic_increasing and len(repaired) == len(clean)
+    # the row appended last is the correction that wins
+    assert repaired.loc[7, "close"] == correction["close"].iloc[0]
+    assert issues(repaired) == {}
+
+
+def test_ohlc_repair():
+    frame = clean_frame()
+    high, low = frame.loc[10, "high"], frame.loc[10, "low"]
+    frame.loc[10, "high"], frame.loc[10, "low"] = low, high
+    frame.loc[20, "high"] = frame.loc[20, "close"] * 0.999
+    frame.loc[30, "low"] = -1.0
+    repaired, changes = DataValidator(["ohlc"]).repair(frame)
+
+    # two ranges widened to cover the bar, one non-positive bar dropped
+    assert changes["ohlc"] == 3
+    assert len(repaired) == len(frame) - 1
+    assert (repaired["high"] >= repaired[["open", "close", "low"]].max(axis=1)).all()
+    assert (repaired["low"] <= repaired[["open", "close", "high"]].min(axis=1)).all()
+    # the bar after the dropped one changes against the close before it
+    assert changes["percent_change"] == 1
+    assert "percent_change_mismatch" not in issues(repaired)
+
+
+def test_clip_repair():
+    validator = DataValidator(["clip"])
+    frame = clean_frame()
+    original = frame.loc[15, "close"]
+    frame.loc[15, "close"] *= 1.2
+    frame.loc[40, "high"] *= 1.2
+    repaired, changes = validator.repair(frame)
+    _, _, center, scale = validator.spikes(frame[["open", "high", "low", "close"]].to_numpy())
+
+    assert changes["clip"] == 2
+    limit = validator.spike_threshold * scale
+    assert original < repaired.loc[15, "close"] <= frame.loc[14, "close"] * np.exp(center + limit) + 1e-12
+    body = repaired.loc[40, ["open", "close"]].max()
+    assert repaired.loc[40, "high"] == pytest.approx(min(frame.loc[40, "high"], body * np.exp(limit)))
+    # both changes around the clipped close follow it
+    assert changes["percent_change"] == 2
+    assert "percent_change_mismatch" not in issues(repaired)
+
+
+def test_fill_repair():
+    clean = clean_frame()
+    frame = clean.drop(index=[20, 21]).reset_index(drop=True)
+    repaired, changes = DataValidator(["fill"]).repair(frame)
+
+    assert changes["fill"] == 2
+    assert_frame_equal(repaired[["date"]], clean[["date"]], check_dtype=False)
+    # flat bars at the previous close
+    assert (repaired.loc[20:21, ["open", "high", "low", "close"]] == clean.loc[19, "close"]).all().all()
+    assert (repaired.loc[20:21, "percent_change"] == 0).all()
+    assert issues(repaired) == {}
+
+
+def test_repairs_leave_clean_frame_unchanged():
+    frame = clean_frame()
+    repaired, changes = DataValidator(ALL_REPAIRS).repair(frame)
+    assert not any(changes.values())
+    assert_frame_equal(repaired, frame, check_dtype=False, check_freq=False)
+
+
+def test_unknown_repair_is_rejected():
+    with pytest.raises(ValueError):
+        DataValidator(["interpolate"])
+
+
+def test_validate_reports_checks_and_repairs():
+    frame = clean_frame()
+    frame = pd.concat([frame.iloc[:11], frame.iloc[10:]], ignore_index=True)
+    repaired, report = DataValidator().validate(frame, "input/eur_usd_trading_data.csv")
+
+    assert not report.clean
+    assert (report.rows, report.rows_out) == (len(frame), len(frame) - 1)
+    assert report.checks["duplicated_dates"] == 1 and report.repairs["deduplicate"] == 1
+    assert ValidationReport.from_dict(report.to_dict()).to_dict() == report.to_dict()
+    assert DataValidator().validate(repaired)[1].clean